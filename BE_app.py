@@ -1,117 +1,204 @@
-from flask import Flask, request, jsonify
+from flask import (Blueprint, Flask, Response, current_app, g, request, jsonify, make_response, send_file,
+                   stream_with_context)
 from flask_cors import CORS
 import os
 from pathlib import Path
-from datetime import datetime
-from PIL import Image
-import traceback
+from datetime import datetime, timezone
+import hashlib
+import io
 import json
+import pstats
+import uuid
+import base64
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
 
-# Import triedy pre analýzu zo skriptu renemaPhotos.py
-from renemaPhotos import RoofAnalysisServer
+# Moduly spracovania obrázkov (renemaPhotos, registration, roof_analysis – cv2, skimage,
+# matplotlib) sa importujú až v endpointoch, ktoré ich potrebujú, aby bol štart workera
+# rýchly; kontrolu robí benchmarks/check_startup.py
+from results_store import (AGGREGATE_FIELDS, AGGREGATE_PERIODS, MEASUREMENT_FIELDS, RESULTS_DB_NAME,
+                           ResultsStore, migrate_json_results)
+from aggregates import aggregate_params, aggregates_columnar, refresh_aggregates
+from heatmap_store import HeatMapStore
+from heatmap_render import RENDER_CACHE_DIR_NAME, HeatMapRenderer, RenderParams
+from analysis_jobs import FINISHED_STATES, JobConflictError, JobManager, JobStore
+from log_store import LogStore, SqliteLogStore, current_request_id
+from photo_rename import rename_photos
+from file_lock import ANALYSIS_LOCK_NAME, FileLock
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY as METRICS
 
-# Import triedy pre analýzu osvetlenia.
-# Uistite sa, že súbor s touto triedou sa volá platne (napr. roof_analysis.py, nie roof-analysis.py)
-from roof_analysis import PhotoAnalyzer
 
+def default_config() -> Dict:
+    """Konfigurácia z premenných prostredia ROOF_* (create_app ju môže prepísať)"""
+    return {
+        # Adresár s výsledkami analýzy (SQLite úložisko a heat mapy)
+        "DATA_DIR": Path(os.environ.get("ROOF_DATA_DIR", "data")),
+        # Stav zdieľaný medzi workermi (úlohy, logy); predvolene <DATA_DIR>/state
+        "STATE_DIR": os.environ.get("ROOF_STATE_DIR"),
+        # Zdieľať stav úloh a logy medzi procesmi (viac workerov WSGI servera)
+        "SHARED_STATE": os.environ.get("ROOF_SHARED_STATE", "1") != "0",
+        # Adresáre, v ktorých smú byť photos_dir/data_dir z požiadaviek (prázdne = bez obmedzenia)
+        "ALLOWED_ROOTS": [p for p in os.environ.get("ROOF_ALLOWED_ROOTS", "").split(os.pathsep) if p],
+        "JOB_WORKERS": int(os.environ.get("ROOF_JOB_WORKERS", 2)),
+        "LOG_CAPACITY": int(os.environ.get("ROOF_LOG_CAPACITY", 10000)),
+        "EXIF_WORKERS": int(os.environ.get("ROOF_EXIF_WORKERS", 8)),
+    }
 
-app = Flask(__name__)
-CORS(app)  # Povolenie CORS pre všetky routy
+class AppState:
+    """
+    Stav jednej inštancie aplikácie (v každom procese workera vlastný)
 
-class LogCollector:
-    def __init__(self):
-        self.logs = []
+    Úlohy a logy sú pri SHARED_STATE v SQLite databázach v STATE_DIR, takže
+    ich vidia všetky procesy; v pamäti ostávajú len cache (vykreslené heat
+    mapy, odpovede /api/illumination), ktoré sa zneplatňujú podľa verzie
+    dát v úložisku, a preto sú správne aj pri zápisoch z iných procesov.
+    """
 
-    def add_log(self, message):
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        log_entry = f"{timestamp}: {message}"
-        self.logs.append(log_entry)
-        print(log_entry)  # Pre debug účely vypíšeme log aj do konzoly
-        
-    def get_logs(self):
-        return self.logs
+    def __init__(self, config: Dict):
+        self.data_dir = Path(config["DATA_DIR"])
+        state_dir = Path(config["STATE_DIR"] or self.data_dir / "state")
+        # Vykresľovanie heat máp s pamäťovou a diskovou cache
+        self.heat_map_renderer = HeatMapRenderer(cache_dir=self.data_dir / "heat_maps" / RENDER_CACHE_DIR_NAME)
+        # Ohraničený zásobník štruktúrovaných logov (kurzorové stránkovanie cez /api/logs)
+        if config["SHARED_STATE"]:
+            self.log_store = SqliteLogStore(state_dir / "logs.sqlite3", capacity=config["LOG_CAPACITY"])
+            job_store = JobStore(state_dir / "jobs.sqlite3")
+        else:
+            self.log_store = LogStore(capacity=config["LOG_CAPACITY"])
+            job_store = None
+        # Analýzy bežia na pozadí – /api/analyze vráti ID úlohy okamžite
+        self.job_manager = JobManager(max_workers=config["JOB_WORKERS"], log=self.log_store.add,
+                                      job_store=job_store)
+        # Cache naparsovaných odpovedí /api/illumination – kľúčom je revízia úložiska,
+        # takže po každom zápise nových meraní sa záznamy automaticky zneplatnia
+        self.illumination_cache = OrderedDict()
+        self.illumination_cache_lock = threading.Lock()
+        # Úložisko heat máp pre každé vlákno workera (spojenie sa neotvára pri každej požiadavke)
+        self._heat_map_stores = threading.local()
 
-    def clear_logs(self):
-        self.logs = []
+    def heat_map_store(self) -> HeatMapStore:
+        """
+        Úložisko heat máp aktuálneho vlákna
 
-log_collector = LogCollector()
+        Otvára sa lenivo a v každom procese zvlášť, aby spojenie nezdedili
+        potomkovia pre-fork servera. Zápisy iných procesov (analýza, GC) sú
+        viditeľné, lebo každé čítanie indexu je samostatná transakcia.
+        """
+        local = self._heat_map_stores
+        if getattr(local, "store", None) is None or local.pid != os.getpid():
+            local.store, local.pid = HeatMapStore(self.data_dir / "heat_maps"), os.getpid()
+        return local.store
 
-def rename_photos(directory):
-    directory = Path(directory)
-    renamed_count = 0
-    skipped_count = 0
-    error_count = 0
-    
-    log_collector.add_log(f"Začínam premenovanie fotografií v adresári: {directory}")
-    
-    for file_path in directory.glob("*.jp*g"):
-        try:
-            img = Image.open(file_path)
-            exif_data = img._getexif()
-            if exif_data:
-                date_time_str = exif_data.get(306)
-                if date_time_str:
-                    dt = datetime.strptime(date_time_str, "%Y:%m:%d %H:%M:%S")
-                    new_name = dt.strftime("%Y-%m-%d-%H-%M") + file_path.suffix.lower()
-                    new_path = file_path.parent / new_name
-                    
-                    if new_path != file_path:
-                        os.rename(file_path, new_path)
-                        log_collector.add_log(f"Premenovaný súbor: {file_path.name} -> {new_name}")
-                        renamed_count += 1
-                    else:
-                        log_collector.add_log(f"Preskočený súbor (už má správny názov): {file_path.name}")
-                        skipped_count += 1
-                else:
-                    log_collector.add_log(f"Chýba časová pečiatka v EXIF dátach: {file_path.name}")
-                    error_count += 1
-            else:
-                log_collector.add_log(f"Chýbajú EXIF dáta: {file_path.name}")
-                error_count += 1
-                
-        except Exception as e:
-            error_msg = f"Chyba pri spracovaní {file_path.name}: {str(e)}"
-            log_collector.add_log(error_msg)
-            error_count += 1
-
-    summary = f"Dokončené premenovanie: {renamed_count} premenovaných, {skipped_count} preskočených, {error_count} chýb"
-    log_collector.add_log(summary)
-    return summary
-
-@app.route("/api/heatmap/<filename>", methods=["GET"])
+def state() -> AppState:
+    """Stav aktuálnej aplikácie"""
+    return current_app.extensions["roof"]
+
+api = Blueprint("roof", __name__)
+
+def create_app(config: Optional[Dict] = None) -> Flask:
+    """
+    Vytvorí Flask aplikáciu (application factory)
+
+    Konfigurácia je default_config() prepísaná hodnotami z config. Pre beh
+    s viacerými procesmi pozri wsgi.py.
+    """
+    app = Flask(__name__)
+    app.config.update(default_config())
+    app.config.update(config or {})
+    CORS(app, expose_headers=["ETag", "Last-Modified"])  # Povolenie CORS pre všetky routy
+    app.extensions["roof"] = AppState(app.config)
+    app.register_blueprint(api)
+    return app
+
+def path_allowed(path) -> bool:
+    """Či cesta z požiadavky leží v niektorom z ALLOWED_ROOTS"""
+    roots = current_app.config["ALLOWED_ROOTS"]
+    if not roots:
+        return True
+    resolved = Path(path).resolve()
+    return any(resolved == root or root in resolved.parents for root in (Path(r).resolve() for r in roots))
+
+def format_logs(records):
+    """Textová podoba záznamov logu pre odpovede API"""
+    return [record.text for record in records]
+
+# Latencia endpointov (pri streamovaných odpovediach čas do odoslania hlavičiek)
+HTTP_REQUEST_SECONDS = METRICS.histogram(
+    "roof_http_request_duration_seconds", "Latencia HTTP požiadaviek v sekundách",
+    ("endpoint", "method", "status"))
+ILLUMINATION_CACHE_TOTAL = METRICS.counter(
+    "roof_illumination_cache_requests_total", "Prístupy do cache odpovedí /api/illumination", ("result",))
+
+@api.before_app_request
+def assign_request_id():
+    """Každá požiadavka dostane ID, ktorým sa označia jej záznamy v logu"""
+    g.request_started = time.perf_counter()
+    g.request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    g.request_id_token = current_request_id.set(g.request_id)
+
+@api.after_app_request
+def add_request_id_header(response):
+    if "request_id" in g:
+        response.headers["X-Request-ID"] = g.request_id
+    if "request_started" in g:
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, endpoint=endpoint,
+                                     method=request.method, status=str(response.status_code))
+    return response
+
+@api.teardown_app_request
+def reset_request_id(exc=None):
+    token = g.pop("request_id_token", None)
+    if token is not None:
+        current_request_id.reset(token)
+
+@api.route("/api/heatmap/<filename>", methods=["GET"])
 def get_heatmap(filename):
-    heatmaps_dir = Path(r"D:\napady\analýza strechy\analyses")
-    file_path = heatmaps_dir / filename
-    if not file_path.exists():
-        return jsonify({"error": "Heat map file not found"}), 404
+    """
+    Vráti heat mapu vykreslenú ako PNG/WebP.
+
+    Query parametre: cmap (hot|gray), size (max. rozmer v px), tile (riadok,stĺpec),
+    tile_size, format (png|webp). Odpoveď obsahuje ETag a Last-Modified, takže
+    klient môže posielať podmienené požiadavky a dostať 304.
+    """
+    try:
+        params = RenderParams.from_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
+    store = state().heat_map_store()
     try:
-        # Predpokladáme, že súbor má príponu .npy
-        if file_path.suffix.lower() != ".npy":
-            return jsonify({"error": "Unsupported file type"}), 400
-
-        # Načítame heat mapu zo súboru
-        heatmap = np.load(file_path)
-        # Vytvoríme obrázok z heat mapy pomocou matplotlib
-        fig, ax = plt.subplots()
-        # Zobrazíme heat mapu – môžete prispôsobiť cmap a ďalšie parametre
-        cax = ax.imshow(heatmap, cmap="hot")
-        ax.axis('off')
-        buf = BytesIO()
-        plt.savefig(buf, format="png", bbox_inches="tight", pad_inches=0)
-        plt.close(fig)
-        buf.seek(0)
-        response = make_response(buf.getvalue())
-        response.mimetype = 'image/png'
+        version = store.frame_version(filename)
+        if version is None:
+            return jsonify({"error": "Heat map file not found"}), 404
+        frame_version, mtime = version
+        etag = state().heat_map_renderer.etag(frame_version, params)
+        last_modified = datetime.fromtimestamp(int(mtime), tz=timezone.utc)
+
+        # Podmienená požiadavka – obrázok sa vôbec nevykresľuje
+        not_modified = (etag in request.if_none_match if request.if_none_match
+                        else request.if_modified_since is not None
+                        and last_modified <= request.if_modified_since)
+        if not_modified:
+            response = make_response("", 304)
+        else:
+            response = make_response(state().heat_map_renderer.render(store, filename, params,
+                                                                        frame_version=frame_version))
+            response.mimetype = params.mimetype
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.public = True
+        response.cache_control.no_cache = True
         return response
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        app.logger.error(str(e))
+        current_app.logger.error(str(e))
         return jsonify({"error": str(e)}), 500
 
-if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0", port=5000)
-
-@app.route("/api/rename", methods=["POST"])
+@api.route("/api/rename", methods=["POST"])
 def api_rename():
     data = request.get_json()
     photos_dir = data.get("photos_dir")
@@ -119,124 +206,505 @@ def api_rename():
     if not photos_dir:
         return jsonify({"error": "Chýba parameter photos_dir"}), 400
     
+    if not path_allowed(photos_dir):
+        return jsonify({"error": "Adresár je mimo povolených adresárov"}), 403
+
     if not os.path.isdir(photos_dir):
         return jsonify({"error": "Adresár s fotkami sa nenašiel"}), 404
 
+    log_store = state().log_store
     try:
-        summary = rename_photos(photos_dir)
+        summary = rename_photos(photos_dir, log=log_store.add, workers=current_app.config["EXIF_WORKERS"])
         return jsonify({
             "status": "Fotografie boli úspešne premenované",
             "detail": summary,
-            "logs": log_collector.get_logs()
+            "logs": format_logs(log_store.query(request_id=g.request_id, limit=1000)[0])
         })
     except Exception as e:
         error_msg = str(e)
-        log_collector.add_log(f"Kritická chyba: {error_msg}")
+        log_store.add(f"Kritická chyba: {error_msg}")
         return jsonify({
             "error": error_msg,
-            "logs": log_collector.get_logs()
+            "logs": format_logs(log_store.query(request_id=g.request_id, limit=1000)[0])
         }), 500
 
-@app.route("/api/illumination", methods=["GET"])
+def open_results_store(data_dir):
+    """
+    Otvorí SQLite úložisko výsledkov; staré JSON výsledky sa pri prvom prístupe prevedú.
+    Vráti None, ak v adresári nie sú žiadne výsledky.
+    """
+    data_dir = Path(data_dir)
+    if not (data_dir / RESULTS_DB_NAME).exists() and not (data_dir / "analyses").exists():
+        return None
+    store = ResultsStore.for_data_dir(data_dir)
+    if store.get_info('migrated_json') is None:
+        # Jednorazová migrácia zapisuje, preto len pod zámkom analýzy; ak ho drží
+        # bežiaca analýza, jej RoofAnalysisServer staré výsledky už previedol
+        lock = FileLock(data_dir / ANALYSIS_LOCK_NAME)
+        if lock.acquire(blocking=False):
+            try:
+                migrate_json_results(data_dir, store)
+                refresh_aggregates(store)
+            finally:
+                lock.release()
+    return store
+
+# Najviac toľko odpovedí /api/illumination v cache
+ILLUMINATION_CACHE_SIZE = 64
+
+def encode_cursor(row):
+    token = json.dumps([row["section"], row["datetime"], row["id"]], ensure_ascii=False)
+    return base64.urlsafe_b64encode(token.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor):
+    try:
+        section, dt, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return section, dt, int(row_id)
+    except Exception:
+        raise ValueError("Neplatný kurzor")
+
+def parse_illumination_query(args):
+    """
+    Spracuje query parametre /api/illumination.
+
+    Raises:
+        ValueError: Pri neplatných parametroch
+    """
+    fields = args.get("fields")
+    fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    unknown = [f for f in fields or [] if f not in MEASUREMENT_FIELDS]
+    if unknown:
+        raise ValueError(f"Neznáme polia: {', '.join(unknown)}")
+
+    for name in ("start", "end"):
+        if args.get(name):
+            datetime.fromisoformat(args[name])
+    for name in ("time_from", "time_to"):
+        if args.get(name):
+            datetime.strptime(args[name], "%H:%M")
+
+    sections = args.getlist("section")
+    if len(sections) == 1 and "," in sections[0]:
+        sections = sections[0].split(",")
+
+    limit = args.get("limit")
+    limit = int(limit) if limit else None
+    if limit is not None and not 1 <= limit <= 10000:
+        raise ValueError("Parameter limit musí byť v rozsahu 1 až 10000")
+
+    return {
+        "filters": {
+            "sections": sections or None,
+            "start": args.get("start"),
+            "end": args.get("end"),
+            "time_from": args.get("time_from"),
+            "time_to": args.get("time_to"),
+        },
+        "fields": fields,
+        "limit": limit,
+        "after": decode_cursor(args["cursor"]) if args.get("cursor") else None,
+        "format": args.get("format", "json"),
+    }
+
+def select_fields(row, fields):
+    """Ponechá v meraní len vyžiadané polia (sekcia a dátum ostávajú vždy)"""
+    if fields is None:
+        return {k: v for k, v in row.items() if k != "id"}
+    selected = {"section": row["section"], "date": row["date"]}
+    selected.update((f, row[f]) for f in fields)
+    return selected
+
+@api.route("/api/illumination", methods=["GET"])
 def api_illumination():
     """
-    REST API endpoint pre získanie analýzy osvetlenia zo súborov uložených v adresári 'analyses'.
-    Predpokladá sa, že analyzované dáta sú uložené vo formáte JSON.
+    REST API endpoint pre získanie analýzy osvetlenia z SQLite úložiska výsledkov.
+
+    Query parametre: section (opakovateľný alebo zoznam oddelený čiarkou),
+    start/end (ISO dátum alebo dátum a čas), time_from/time_to (HH:MM),
+    fields (zoznam polí), limit + cursor (stránkovanie), format (json|ndjson).
+
+    Bez limitu a formátu má odpoveď pôvodný tvar {sekcia: {dátum: [merania]}};
+    s limitom vráti {"measurements": [...], "next_cursor": ...};
+    format=ndjson streamuje jedno meranie na riadok; s limitom je posledným
+    riadkom {"next_cursor": ...}.
     """
-    # Získanie cesty k adresáru s analyzami
-    analyses_dir = Path("D:/napady/analýza strechy/analyses")
-    if not analyses_dir.exists():
+    try:
+        query = parse_illumination_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    store = open_results_store(state().data_dir)
+    if store is None:
         return jsonify({"error": "Adresář s analýzami sa nenašiel"}), 404
 
-    report = {}
+    if query["format"] == "ndjson":
+        def generate():
+            last_row, count = None, 0
+            for row in store.query_measurements(after=query["after"], limit=query["limit"],
+                                                **query["filters"]):
+                last_row, count = row, count + 1
+                yield json.dumps(select_fields(row, query["fields"]), ensure_ascii=False) + "\n"
+            if query["limit"] is not None:
+                # Posledný riadok stránky nesie kurzor ďalšej stránky (null na konci dát)
+                has_more = count == query["limit"]
+                yield json.dumps({"next_cursor": encode_cursor(last_row) if has_more else None}) + "\n"
+        response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+        # Úložisko sa zatvorí aj vtedy, keď klient odpoveď nikdy neprečíta
+        response.call_on_close(store.close)
+        return response
+
+    app_state = state()
     try:
-        # Pre každý JSON súbor v adresári načítajte dáta
-        for json_file in analyses_dir.glob("*_analysis.json"):
-            with open(json_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                section_name = data.get("name", json_file.stem)
-                # Predpokladáme, že dáta majú štruktúru s kľúčom "dates"
-                report[section_name] = data["dates"]
+        cache_key = (str(store.db_path), store.get_revision(), request.query_string)
+        with app_state.illumination_cache_lock:
+            body = app_state.illumination_cache.get(cache_key)
+            if body is not None:
+                app_state.illumination_cache.move_to_end(cache_key)
+        ILLUMINATION_CACHE_TOTAL.inc(result="miss" if body is None else "hit")
+
+        if body is None:
+            if query["limit"] is None and query["after"] is None:
+                report = store.load_all_sections(**query["filters"])
+                if query["fields"] is not None:
+                    report = {section: {date: [{f: r[f] for f in query["fields"]} for r in records]
+                                        for date, records in dates.items()}
+                              for section, dates in report.items()}
+            else:
+                rows = list(store.query_measurements(after=query["after"], limit=query["limit"],
+                                                     **query["filters"]))
+                has_more = query["limit"] is not None and len(rows) == query["limit"]
+                report = {
+                    "measurements": [select_fields(row, query["fields"]) for row in rows],
+                    "next_cursor": encode_cursor(rows[-1]) if has_more else None
+                }
+            body = json.dumps(report, ensure_ascii=False)
+            with app_state.illumination_cache_lock:
+                app_state.illumination_cache[cache_key] = body
+                while len(app_state.illumination_cache) > ILLUMINATION_CACHE_SIZE:
+                    app_state.illumination_cache.popitem(last=False)
+
+        return Response(body, mimetype="application/json")
+    except Exception as e:
+        current_app.logger.error(str(e))
+        return jsonify({"error": str(e)}), 500
+    finally:
+        store.close()
+
+@api.route("/api/illumination/regions", methods=["GET"])
+def api_region_illumination():
+    """
+    Štatistiky oblastí záujmu (regions.json) zo SQLite úložiska.
+    Query parametre: section, region, start, end. Odpoveď: {sekcia: {oblasť: [merania]}}.
+    """
+    store = open_results_store(state().data_dir)
+    if store is None:
+        return jsonify({"error": "Adresář s analýzami sa nenašiel"}), 404
+    try:
+        report = {}
+        for row in store.iter_region_measurements(request.args.get("section"), request.args.get("region"),
+                                                  request.args.get("start"), request.args.get("end")):
+            section_name = row.pop("section")
+            region = row.pop("region")
+            report.setdefault(section_name, {}).setdefault(region, []).append(row)
         return jsonify(report)
     except Exception as e:
-        app.logger.error(str(e))
+        current_app.logger.error(str(e))
+        return jsonify({"error": str(e)}), 500
+    finally:
+        store.close()
+
+@api.route("/api/illumination/aggregates", methods=["GET"])
+def api_illumination_aggregates():
+    """
+    Predpočítané agregáty osvetlenia v stĺpcovom tvare (kilobajty namiesto celej histórie).
+
+    Query parametre: period (hour|day|month, predvolene day), section (opakovateľný
+    alebo zoznam oddelený čiarkou), start/end (ISO dátum), fields (zoznam stĺpcov).
+    Odpoveď: {"period", "sun_threshold", "sections": {sekcia: {"bucket": [...], pole: [...]}}}.
+    Podporuje ETag podľa revízie úložiska.
+    """
+    period = request.args.get("period", "day")
+    if period not in AGGREGATE_PERIODS:
+        return jsonify({"error": f"Neplatné obdobie: {period}"}), 400
+    fields = request.args.get("fields")
+    fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    unknown = [f for f in fields or [] if f not in AGGREGATE_FIELDS]
+    if unknown:
+        return jsonify({"error": f"Neznáme polia: {', '.join(unknown)}"}), 400
+    sections = request.args.getlist("section")
+    if len(sections) == 1 and "," in sections[0]:
+        sections = sections[0].split(",")
+
+    store = open_results_store(state().data_dir)
+    if store is None:
+        return jsonify({"error": "Adresář s analýzami sa nenašiel"}), 404
+    try:
+        # Len čítanie – agregáty prepočítava analýza pod zámkom adresára s dátami
+        query_token = hashlib.blake2b(request.query_string, digest_size=6).hexdigest()
+        etag = f'"agg-{store.get_revision()}-{query_token}"'
+        if etag in request.if_none_match:
+            response = make_response("", 304)
+            response.headers["ETag"] = etag
+            return response
+        response = jsonify({
+            "period": period,
+            "sun_threshold": aggregate_params(store)["sun_threshold"],
+            "sections": aggregates_columnar(store, period, sections or None, request.args.get("start"),
+                                            request.args.get("end"), fields)
+        })
+        response.headers["ETag"] = etag
+        return response
+    except Exception as e:
+        current_app.logger.error(str(e))
+        return jsonify({"error": str(e)}), 500
+    finally:
+        store.close()
+
+@api.route("/api/timeseries", methods=["GET"])
+def api_timeseries():
+    """
+    Priebeh heat mapy počas dňa zo zarovnanej kocky snímok sekcie.
+
+    Query parametre: section, date (povinné) a jedno z: x a y (pixel referenčnej
+    snímky), region (oblasť z regions.json) alebo bbox=x0,y0,x1,y1.
+    Odpoveď: {"section", "date", "times": [...], "values": [...]} – null tam,
+    kde bod po zarovnaní leží mimo snímky.
+    """
+    section_name = request.args.get("section")
+    date_str = request.args.get("date")
+    if not section_name or not date_str:
+        return jsonify({"error": "Chýba parameter section alebo date"}), 400
+    store = open_results_store(state().data_dir)
+    if store is None:
+        return jsonify({"error": "Adresář s analýzami sa nenašiel"}), 404
+    from registration import RegistrationCache
+    registration = RegistrationCache(state().data_dir, store=store)
+    try:
+        if request.args.get("x") is not None and request.args.get("y") is not None:
+            series = registration.pixel_series(section_name, date_str, int(request.args["x"]),
+                                               int(request.args["y"]))
+            series["values"] = [None if v != v else v for v in series["values"]]
+        elif request.args.get("region"):
+            series = registration.region_series(section_name, date_str, region=request.args["region"])
+        elif request.args.get("bbox"):
+            bbox = tuple(int(v) for v in request.args["bbox"].split(","))
+            if len(bbox) != 4:
+                return jsonify({"error": "bbox musí byť x0,y0,x1,y1"}), 400
+            series = registration.region_series(section_name, date_str, bbox=bbox)
+        else:
+            return jsonify({"error": "Chýba x a y, region alebo bbox"}), 400
+        return jsonify({"section": section_name, "date": date_str, **series})
+    except KeyError as e:
+        return jsonify({"error": str(e.args[0] if e.args else e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(str(e))
         return jsonify({"error": str(e)}), 500
+    finally:
+        registration.close()
+        store.close()
+
+# Podporované zmenšenia pri dekódovaní (renemaPhotos.REDUCED_GRAYSCALE_FLAGS a plné rozlíšenie);
+# renemaPhotos sa tu nenačítava, aby štart servera nenačítal OpenCV
+ANALYSIS_SCALES = (1, 2, 4, 8)
 
-@app.route("/api/analyze", methods=["POST"])
+@api.route("/api/analyze", methods=["POST"])
 def api_analyze():
-    data = request.get_json()
+    """
+    Zaradí analýzu fotografií do fronty na pozadí a hneď vráti ID úlohy.
+    Priebeh je dostupný cez /api/analyze/jobs/<id> a SSE stream .../events.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Telo požiadavky musí byť JSON objekt"}), 400
     photos_dir = data.get("photos_dir")
     data_dir = data.get("data_dir")
     force = data.get("force", False)
+    profile = bool(data.get("profile", False))
+    try:
+        workers = int(data.get("workers", 1))
+        analysis_scale = int(data.get("analysis_scale", 1))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Parametre workers a analysis_scale musia byť celé čísla"}), 400
 
     if not photos_dir or not data_dir:
         return jsonify({"error": "Chýba parameter photos_dir alebo data_dir"}), 400
+    if workers < 1:
+        return jsonify({"error": "Parameter workers musí byť aspoň 1"}), 400
+    if analysis_scale not in ANALYSIS_SCALES:
+        return jsonify({"error": f"Nepodporované zmenšenie rozlíšenia: {analysis_scale} "
+                                 f"(možnosti: {', '.join(map(str, ANALYSIS_SCALES))})"}), 400
     
+    if not path_allowed(photos_dir) or not path_allowed(data_dir):
+        return jsonify({"error": "Adresár je mimo povolených adresárov"}), 403
+
     if not os.path.isdir(photos_dir):
         return jsonify({"error": "Adresár s fotkami sa nenašiel"}), 404
 
-    # Vytvorenie data_dir, ak neexistuje
-    os.makedirs(data_dir, exist_ok=True)
-    
+    log_store = state().log_store
     try:
-        log_collector.add_log(f"Začínam analýzu fotografií...")
-        log_collector.add_log(f"Zdrojový adresár: {photos_dir}")
-        log_collector.add_log(f"Cieľový adresár: {data_dir}")
-        if force:
-            log_collector.add_log("Režim vynútenej analýzy - všetky súbory budú analyzované znova")
-        
-        # Inicializácia servera pre analýzu
-        server = RoofAnalysisServer(data_dir)
-        
-        # Spustenie analýzy
-        server.analyze_and_store(photos_dir, force_reanalysis=force)
-        
-        # Získanie sumáru
-        summary = server.get_analysis_summary()
-        
-        # Logovanie výsledkov
-        log_collector.add_log("Analýza dokončená")
-        for section_name, section_data in summary.items():
-            log_collector.add_log(f"Sekcia {section_name}:")
-            log_collector.add_log(f"  - Analyzované dni: {', '.join(section_data['dates'])}")
-            log_collector.add_log(f"  - Celkový počet meraní: {section_data['total_measurements']}")
-        
-        return jsonify({
-            "status": "Analýza bola úspešne dokončená",
-            "summary": summary,
-            "logs": log_collector.get_logs()
-        })
-        
-    except Exception as e:
-        error_msg = str(e)
-        log_collector.add_log(f"Kritická chyba: {error_msg}")
-        log_collector.add_log(f"Stack trace: {traceback.format_exc()}")
-        return jsonify({
-            "error": error_msg,
-            "logs": log_collector.get_logs()
-        }), 500
+        job = state().job_manager.submit(photos_dir, data_dir, force=force, workers=workers,
+                                         analysis_scale=analysis_scale, profile=profile)
+    except JobConflictError as e:
+        return jsonify({"error": str(e), "job_id": e.job_id}), 409
+
+    log_store.add(f"Začínam analýzu fotografií (úloha {job.id})...", job_id=job.id)
+    log_store.add(f"Zdrojový adresár: {photos_dir}", job_id=job.id)
+    log_store.add(f"Cieľový adresár: {data_dir}", job_id=job.id)
+    if force:
+        log_store.add("Režim vynútenej analýzy - všetky súbory budú analyzované znova", job_id=job.id)
+    if workers > 1:
+        log_store.add(f"Paralelná analýza: {workers} procesov", job_id=job.id)
+
+    return jsonify({
+        "status": "Analýza bola zaradená do fronty",
+        "job_id": job.id,
+        "status_url": f"/api/analyze/jobs/{job.id}",
+        "events_url": f"/api/analyze/jobs/{job.id}/events",
+        "logs": format_logs(log_store.query(job_id=job.id, limit=1000)[0])
+    }), 202
+
+@api.route("/api/analyze/jobs", methods=["GET"])
+def api_list_jobs():
+    return jsonify({"jobs": state().job_manager.list_jobs()})
+
+@api.route("/api/analyze/jobs/<job_id>", methods=["GET"])
+def api_job_status(job_id):
+    job = state().job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Úloha sa nenašla"}), 404
+    return jsonify(job.to_dict())
+
+@api.route("/api/analyze/jobs/<job_id>", methods=["DELETE"])
+def api_cancel_job(job_id):
+    job = state().job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Úloha sa nenašla"}), 404
+    return jsonify(job.to_dict())
+
+@api.route("/api/analyze/jobs/<job_id>/profile", methods=["GET"])
+def api_job_profile(job_id):
+    """
+    Profil úlohy spustenej s "profile": true – textový prehľad najnáročnejších funkcií.
+    Query parametre: sort (cumulative|tottime|calls), limit, format=raw stiahne .prof súbor.
+    """
+    job = state().job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Úloha sa nenašla"}), 404
+    if not job.profile_file or not os.path.exists(job.profile_file):
+        return jsonify({"error": "Úloha nemá uložený profil"}), 404
+
+    if request.args.get("format") == "raw":
+        return send_file(job.profile_file, mimetype="application/octet-stream",
+                         as_attachment=True, download_name=f"{job_id}.prof")
+
+    sort = request.args.get("sort", "cumulative")
+    if sort not in ("cumulative", "tottime", "calls"):
+        return jsonify({"error": "Neplatný parameter sort"}), 400
+    output = io.StringIO()
+    stats = pstats.Stats(job.profile_file, stream=output)
+    stats.sort_stats(sort).print_stats(int(request.args.get("limit", 50)))
+    return Response(output.getvalue(), mimetype="text/plain")
+
+@api.route("/api/analyze/jobs/<job_id>/events", methods=["GET"])
+def api_job_events(job_id):
+    """Server-Sent Events stream priebehu úlohy; končí po jej dokončení"""
+    job_manager = state().job_manager
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Úloha sa nenašla"}), 404
+
+    def generate():
+        state = job.to_dict()
+        yield f"data: {json.dumps(state, ensure_ascii=False)}\n\n"
+        while state['status'] not in FINISHED_STATES:
+            new_state = job_manager.wait_for_update(job_id, state['version'])
+            if new_state is None:
+                break
+            if new_state['version'] == state['version']:
+                # Udržiavací komentár proti timeoutu proxy
+                yield ": keep-alive\n\n"
+                continue
+            state = new_state
+            yield f"data: {json.dumps(state, ensure_ascii=False)}\n\n"
+
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
     
-@app.route("/api/summary", methods=["GET"])
+@api.route("/api/summary", methods=["GET"])
 def api_summary():
     # Predpokladajme, že metóda get_analysis_summary() vracia súhrn
     try:
-        from renemaPhotos import RoofAnalysisServer
-        # Uveďte cestu, kde sú uložené analýzy (môže byť rovnaká ako v api/analyze)
-        data_dir = "D:/napady/analýza strechy"
-        server = RoofAnalysisServer(data_dir)
-        summary = server.get_analysis_summary()
-        return jsonify(summary)
+        store = open_results_store(state().data_dir)
+        if store is None:
+            return jsonify({})
+        try:
+            return jsonify(store.summary())
+        finally:
+            store.close()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/api/logs", methods=["GET"])
+HEAT_MAP_RENDER_EVENTS = METRICS.gauge(
+    "roof_heatmap_render_events", "Počet vykreslení a zásahov cache heat máp od štartu procesu", ("kind",))
+ILLUMINATION_CACHE_ENTRIES = METRICS.gauge(
+    "roof_illumination_cache_entries", "Počet odpovedí v cache /api/illumination")
+ANALYSIS_JOBS = METRICS.gauge("roof_analysis_jobs", "Počet úloh analýzy podľa stavu", ("status",))
+
+def collect_app_metrics(app_state: AppState):
+    """Doplní metriky zo stavu aplikácie tesne pred vykreslením /metrics"""
+    for kind, count in app_state.heat_map_renderer.stats.items():
+        HEAT_MAP_RENDER_EVENTS.set(count, kind=kind)
+    ILLUMINATION_CACHE_ENTRIES.set(len(app_state.illumination_cache))
+    states = {status: 0 for status in ("queued", "running") + FINISHED_STATES}
+    for job in app_state.job_manager.list_jobs():
+        states[job["status"]] = states.get(job["status"], 0) + 1
+    for status, count in states.items():
+        ANALYSIS_JOBS.set(count, status=status)
+
+
+@api.route("/metrics", methods=["GET"])
+def metrics():
+    """Metriky procesu vo formáte Prometheus (časy fáz analýzy, priepustnosť, latencia endpointov)"""
+    # Stav aplikácie sa doplní priamo tu – globálny register nedrží referencie na inštancie aplikácie
+    collect_app_metrics(state())
+    return Response(METRICS.render(), content_type=METRICS_CONTENT_TYPE)
+
+@api.route("/api/logs", methods=["GET"])
 def get_logs():
-    return jsonify({"logs": log_collector.get_logs()})
+    """
+    Vráti záznamy logu novšie ako kurzor.
+
+    Query parametre: after (kurzor z predchádzajúcej odpovede), limit,
+    job_id, request_id, level (minimálna úroveň).
+    """
+    try:
+        after = int(request.args.get("after", 0))
+        # Počet záznamov obmedzí úložisko na 1..1000, neznámu úroveň odmietne s ValueError
+        limit = int(request.args.get("limit", 200))
+        records, next_cursor = state().log_store.query(
+            after=after,
+            limit=limit,
+            job_id=request.args.get("job_id"),
+            request_id=request.args.get("request_id"),
+            level=request.args.get("level")
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "logs": format_logs(records),
+        "records": [record.to_dict() for record in records],
+        "next_cursor": next_cursor
+    })
 
-@app.route("/api/logs", methods=["DELETE"])
+@api.route("/api/logs", methods=["DELETE"])
 def clear_logs():
-    log_collector.clear_logs()
+    state().log_store.clear()
     return jsonify({"status": "Logy boli vymazané"})
 
 if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0", port=5000)
\ No newline at end of file
+    # Vývojový server; pre viac procesov napr. gunicorn -w 4 -b 0.0.0.0:5000 wsgi:app
+    create_app().run(debug=True, host="0.0.0.0", port=5000)
\ No newline at end of file
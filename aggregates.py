@@ -0,0 +1,176 @@
+import json
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from results_store import ResultsStore
+
+# Jas (0–255), od ktorého sa meranie považuje za priame slnko
+# (pri doterajších meraniach je jas zatienenej strechy okolo 105–120, osvetlenej 130–150)
+DEFAULT_SUN_THRESHOLD = 130.0
+# Najdlhší interval medzi snímkami, ktorý sa ešte započíta do slnečných hodín
+DEFAULT_MAX_GAP_MINUTES = 60.0
+
+PERCENTILES = (10, 50, 90)
+
+
+def summarize_values(values: Sequence[float]) -> Dict[str, Optional[float]]:
+    """Priemer, minimum, maximum a percentily (p10, p50, p90) hodnôt"""
+    array = np.asarray([v for v in values if v is not None], dtype=np.float64)
+    if array.size == 0:
+        return {'mean': None, 'min': None, 'max': None,
+                **{f'p{p}': None for p in PERCENTILES}}
+    percentiles = np.percentile(array, PERCENTILES)
+    return {
+        'mean': float(array.mean()),
+        'min': float(array.min()),
+        'max': float(array.max()),
+        **{f'p{p}': float(value) for p, value in zip(PERCENTILES, percentiles)}
+    }
+
+
+def interval_hours(times: Sequence[datetime], max_gap_minutes: float = DEFAULT_MAX_GAP_MINUTES) -> List[float]:
+    """
+    Dĺžka intervalu (v hodinách), ktorý reprezentuje každé meranie jedného dňa
+
+    Meranie platí do nasledujúcej snímky, najviac max_gap_minutes. Posledné
+    meranie dňa dostane medián intervalov (tiež obmedzený).
+    """
+    if len(times) < 2:
+        return [0.0] * len(times)
+    gaps = [min((b - a).total_seconds() / 60, max_gap_minutes) for a, b in zip(times, times[1:])]
+    gaps.append(min(float(np.median(gaps)), max_gap_minutes))
+    return [gap / 60 for gap in gaps]
+
+
+def group_statistics(items: Iterable, key: Callable, value: Callable) -> Dict[str, Dict]:
+    """Štatistiky hodnôt zoskupených podľa kľúča (napr. hodiny dňa alebo mesiaca)"""
+    groups: Dict[str, List[float]] = {}
+    for item in items:
+        groups.setdefault(key(item), []).append(value(item))
+    return {group: dict(summarize_values(values), count=len(values))
+            for group, values in sorted(groups.items())}
+
+
+def _aggregate_row(section_name: str, period: str, bucket: str, rows: List[Dict],
+                   sun_hours: float) -> Dict:
+    row = {'section': section_name, 'period': period, 'bucket': bucket, 'count': len(rows),
+           'sun_hours': sun_hours}
+    for prefix, field in (('brightness', 'average_brightness'), ('shadow', 'shadow_percentage')):
+        for name, value in summarize_values([r[field] for r in rows]).items():
+            row[f'{prefix}_{name}'] = value
+    return row
+
+
+def aggregate_day(section_name: str, rows: List[Dict], sun_threshold: float = DEFAULT_SUN_THRESHOLD,
+                  max_gap_minutes: float = DEFAULT_MAX_GAP_MINUTES) -> List[Dict]:
+    """
+    Hodinové a denný agregát meraní jedného dňa sekcie
+
+    Slnečné hodiny sú súčet intervalov meraní s jasom aspoň sun_threshold.
+    """
+    rows = sorted(rows, key=lambda r: r['datetime'])
+    times = [datetime.fromisoformat(r['datetime']) for r in rows]
+    durations = interval_hours(times, max_gap_minutes)
+    sunny = [d if r['average_brightness'] is not None and r['average_brightness'] >= sun_threshold else 0.0
+             for r, d in zip(rows, durations)]
+
+    hours: Dict[str, Tuple[List[Dict], float]] = {}
+    for row, sun in zip(rows, sunny):
+        bucket_rows, bucket_sun = hours.get(row['datetime'][:13], ([], 0.0))
+        bucket_rows.append(row)
+        hours[row['datetime'][:13]] = (bucket_rows, bucket_sun + sun)
+
+    result = [_aggregate_row(section_name, 'hour', bucket, bucket_rows, bucket_sun)
+              for bucket, (bucket_rows, bucket_sun) in sorted(hours.items())]
+    result.append(_aggregate_row(section_name, 'day', rows[0]['date'], rows, sum(sunny)))
+    return result
+
+
+def aggregate_params(store: ResultsStore) -> Dict[str, float]:
+    """Parametre, s ktorými sú uložené agregáty vypočítané"""
+    stored = store.get_info('aggregate_params')
+    params = {'sun_threshold': DEFAULT_SUN_THRESHOLD, 'max_gap_minutes': DEFAULT_MAX_GAP_MINUTES}
+    if stored:
+        params.update(json.loads(stored))
+    return params
+
+
+def refresh_aggregates(store: ResultsStore, sun_threshold: Optional[float] = None,
+                       max_gap_minutes: Optional[float] = None) -> int:
+    """
+    Prepočíta agregáty dní, ktorých merania sa zmenili od posledného prepočtu
+
+    Zmenené dni zaznamenáva ResultsStore.upsert_measurements do fronty, takže
+    sa prepočítajú len hodinové a denné agregáty týchto dní a mesačné
+    agregáty ich mesiacov – nie celá história. Pri zmene parametrov
+    (prahu slnka) sa prepočítajú všetky dni.
+
+    Zapisuje do úložiska, preto sa volá len pod zámkom analýzy
+    (RoofAnalysisServer), nie z endpointov, ktoré dáta len čítajú.
+
+    Args:
+        store: Úložisko výsledkov
+        sun_threshold: Nový prah jasu pre slnečné hodiny (None = ponechať uložený)
+        max_gap_minutes: Nový najdlhší započítaný interval (None = ponechať uložený)
+
+    Returns:
+        Počet prepočítaných dní
+    """
+    current = aggregate_params(store)
+    if sun_threshold is None:
+        sun_threshold = current['sun_threshold']
+    if max_gap_minutes is None:
+        max_gap_minutes = current['max_gap_minutes']
+    params = json.dumps({'sun_threshold': sun_threshold, 'max_gap_minutes': max_gap_minutes})
+    if store.get_info('aggregate_params') != params:
+        store.enqueue_all_aggregate_days()
+        store.set_info('aggregate_params', params)
+
+    pending = store.pending_aggregate_days()
+    if not pending:
+        return 0
+
+    rows = []
+    months = {}
+    for section_name, date_str, _ in pending:
+        day_rows = list(store.query_measurements([section_name], date_str, date_str))
+        if day_rows:
+            rows.extend(aggregate_day(section_name, day_rows, sun_threshold, max_gap_minutes))
+        months.setdefault((section_name, date_str[:7]), None)
+
+    # Mesačné agregáty z meraní celého mesiaca; slnečné hodiny sú súčtom denných
+    day_sun_hours = {(r['section'], r['bucket']): r['sun_hours'] for r in rows if r['period'] == 'day'}
+    for section_name, month in months:
+        month_rows = list(store.query_measurements([section_name], f"{month}-01", f"{month}-31"))
+        if not month_rows:
+            continue
+        sun_hours = 0.0
+        for date_str in sorted({r['date'] for r in month_rows}):
+            if (section_name, date_str) not in day_sun_hours:
+                stored = next(store.query_aggregates('day', [section_name], date_str, date_str), None)
+                day_sun_hours[(section_name, date_str)] = stored['sun_hours'] if stored else 0.0
+            sun_hours += day_sun_hours[(section_name, date_str)] or 0.0
+        rows.append(_aggregate_row(section_name, 'month', month, month_rows, sun_hours))
+
+    store.replace_aggregates(rows, pending)
+    return len(pending)
+
+
+def aggregates_columnar(store: ResultsStore, period: str, sections: Optional[List[str]] = None,
+                        start: Optional[str] = None, end: Optional[str] = None,
+                        fields: Optional[Sequence[str]] = None) -> Dict[str, Dict[str, List]]:
+    """
+    Agregáty v stĺpcovom tvare {sekcia: {'bucket': [...], pole: [...]}}
+
+    Stĺpcový tvar je kompaktný – názvy polí sa neopakujú pri každom riadku.
+    """
+    result: Dict[str, Dict[str, List]] = {}
+    for row in store.query_aggregates(period, sections, start, end):
+        columns = result.setdefault(row['section'], {})
+        columns.setdefault('bucket', []).append(row['bucket'])
+        for field in fields or [f for f in row if f not in ('section', 'bucket')]:
+            value = row[field]
+            columns.setdefault(field, []).append(round(value, 3) if isinstance(value, float) else value)
+    return result
@@ -0,0 +1,410 @@
+import cProfile
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+
+# Stavy úlohy
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class JobConflictError(Exception):
+    """Pre daný data_dir už beží iná analýza"""
+
+    def __init__(self, job_id: str):
+        super().__init__(f"Pre tento adresár s dátami už beží analýza {job_id}")
+        self.job_id = job_id
+
+
+@dataclass
+class AnalysisJob:
+    """Analýza fotografií spustená na pozadí"""
+    photos_dir: str
+    data_dir: str
+    force: bool = False
+    workers: int = 1
+    analysis_scale: int = 1
+    # Zapne cProfile pre hlavný proces analýzy; výstup sa uloží do <data_dir>/profiles/<id>.prof
+    profile: bool = False
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    progress: Dict = field(default_factory=dict)
+    result: Optional[Dict] = None
+    summary: Optional[Dict] = None
+    error: Optional[str] = None
+    profile_file: Optional[str] = None
+    # Číslo verzie stavu – zvyšuje sa pri každej zmene (pre SSE)
+    version: int = 0
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @classmethod
+    def from_dict(cls, state: Dict) -> 'AnalysisJob':
+        """Úloha z uloženého stavu (napr. úloha bežiaca v inom procese)"""
+        names = {name for name in cls.__dataclass_fields__ if name != 'cancel_event'}
+        return cls(**{name: value for name, value in state.items() if name in names})
+
+    def to_dict(self) -> Dict:
+        """Stav úlohy pre API vrátane priepustnosti a odhadu zostávajúceho času"""
+        files_total = self.progress.get('files_total', 0)
+        files_done = self.progress.get('files_done', 0)
+        throughput = None
+        eta_seconds = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+            if elapsed > 0 and files_done:
+                throughput = files_done / elapsed
+                if self.status == RUNNING:
+                    eta_seconds = (files_total - files_done) / throughput
+        return {
+            'id': self.id,
+            'status': self.status,
+            'photos_dir': self.photos_dir,
+            'data_dir': self.data_dir,
+            'force': self.force,
+            'workers': self.workers,
+            'analysis_scale': self.analysis_scale,
+            'profile': self.profile,
+            'profile_file': self.profile_file,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'progress': dict(self.progress),
+            'throughput': throughput,
+            'eta_seconds': eta_seconds,
+            'result': self.result,
+            'summary': self.summary,
+            'error': self.error,
+            'version': self.version
+        }
+
+
+def _process_alive(pid: Optional[int], host: Optional[str]) -> bool:
+    """Či proces úlohy ešte beží (procesy na iných strojoch sa považujú za živé)"""
+    if pid is None or host != socket.gethostname() or os.name == 'nt':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """
+    Stav úloh zdieľaný medzi procesmi webového servera (SQLite v režime WAL)
+
+    Úloha beží v procese, ktorý ju prijal, ale jej stav, žiadosť o zrušenie
+    a obsadenie data_dir sú v databáze – ľubovoľný worker tak vráti stav
+    úlohy a druhá analýza toho istého adresára sa odmietne aj vtedy, keď
+    požiadavka príde do iného procesu. Úlohy procesov, ktoré medzičasom
+    skončili, sa pri ďalšom zaradení označia ako neúspešné. Spojenie sa
+    otvára lenivo v každom procese zvlášť (pre-fork server).
+    """
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False,
+                                   isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, dir_key TEXT NOT NULL, "
+                         "status TEXT NOT NULL, state TEXT NOT NULL, cancel_requested INTEGER NOT NULL "
+                         "DEFAULT 0, pid INTEGER, host TEXT, created_at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_dir ON jobs (dir_key, status)")
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def claim(self, job: AnalysisJob, dir_key: str):
+        """
+        Zaregistruje novú úlohu a obsadí jej data_dir (atomicky medzi procesmi)
+
+        Raises:
+            JobConflictError: Ak pre data_dir existuje nedokončená úloha živého procesu
+        """
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(f"SELECT id, state, pid, host FROM jobs WHERE dir_key = ? "
+                                    f"AND status IN ('{QUEUED}', '{RUNNING}')", (dir_key,)).fetchall()
+                for row in rows:
+                    if _process_alive(row['pid'], row['host']):
+                        raise JobConflictError(row['id'])
+                    state = json.loads(row['state'])
+                    state.update(status=FAILED, error="Proces úlohy skončil", finished_at=time.time(),
+                                 version=state.get('version', 0) + 1)
+                    conn.execute("UPDATE jobs SET status = ?, state = ? WHERE id = ?",
+                                 (FAILED, json.dumps(state), row['id']))
+                conn.execute("INSERT INTO jobs (id, dir_key, status, state, pid, host, created_at) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (job.id, dir_key, job.status, json.dumps(job.to_dict()), os.getpid(),
+                              socket.gethostname(), job.created_at))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def save(self, job: AnalysisJob) -> bool:
+        """Uloží stav úlohy; vráti True, ak niektorý proces požiadal o jej zrušenie"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("UPDATE jobs SET status = ?, state = ? WHERE id = ?",
+                         (job.status, json.dumps(job.to_dict()), job.id))
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job.id,)).fetchone()
+        return bool(row and row['cancel_requested'])
+
+    def load(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._connection().execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row['state']) if row else None
+
+    def list_jobs(self) -> List[Dict]:
+        with self._lock:
+            rows = self._connection().execute("SELECT state FROM jobs ORDER BY created_at").fetchall()
+        return [json.loads(row['state']) for row in rows]
+
+    def request_cancel(self, job_id: str) -> Optional[Dict]:
+        """Označí úlohu na zrušenie – proces, v ktorom beží, ju zastaví po aktuálnej dávke"""
+        with self._lock:
+            self._connection().execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+        return self.load(job_id)
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._connection().execute("SELECT cancel_requested FROM jobs WHERE id = ?",
+                                             (job_id,)).fetchone()
+        return bool(row and row['cancel_requested'])
+
+    def prune(self, max_finished_jobs: int):
+        """Odstráni najstaršie dokončené úlohy nad limit"""
+        finished = ', '.join(f"'{status}'" for status in FINISHED_STATES)
+        with self._lock:
+            self._connection().execute(
+                f"DELETE FROM jobs WHERE status IN ({finished}) AND id NOT IN (SELECT id FROM jobs "
+                f"WHERE status IN ({finished}) ORDER BY created_at DESC LIMIT ?)", (max_finished_jobs,))
+
+
+class JobManager:
+    """
+    Fronta analýz bežiacich na pozadí v lokálnom poole vlákien
+
+    Pre jeden data_dir beží najviac jedna analýza naraz. Priebeh sa dá
+    sledovať cez get() alebo čakaním na zmenu stavu (wait_for_update).
+    S job_store je stav úloh zdieľaný medzi procesmi (viac workerov
+    webového servera) – úlohy iných procesov sa dajú sledovať aj zrušiť.
+    """
+
+    # Ako často sa pri čakaní na zmenu kontroluje stav úlohy iného procesu
+    REMOTE_POLL_SECONDS = 0.5
+
+    def __init__(self, max_workers: int = 2, max_finished_jobs: int = 100,
+                 log: Optional[Callable[..., None]] = None, job_store: Optional[JobStore] = None):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis-job')
+        self._jobs: Dict[str, AnalysisJob] = {}
+        self._active_dirs: Dict[str, str] = {}
+        self._condition = threading.Condition()
+        self.max_finished_jobs = max_finished_jobs
+        self.log = log or (lambda message, **_: print(message))
+        self.job_store = job_store
+
+    @staticmethod
+    def _dir_key(data_dir: str) -> str:
+        return os.path.normcase(os.path.realpath(data_dir))
+
+    def submit(self, photos_dir: str, data_dir: str, force: bool = False, workers: int = 1,
+               analysis_scale: int = 1, profile: bool = False) -> AnalysisJob:
+        """
+        Zaradí analýzu do fronty a hneď vráti úlohu
+
+        Raises:
+            JobConflictError: Ak pre rovnaký data_dir už existuje nedokončená úloha
+        """
+        job = AnalysisJob(photos_dir=photos_dir, data_dir=data_dir, force=force, workers=workers,
+                          analysis_scale=analysis_scale, profile=profile)
+        dir_key = self._dir_key(data_dir)
+        with self._condition:
+            if dir_key in self._active_dirs:
+                raise JobConflictError(self._active_dirs[dir_key])
+            if self.job_store is not None:
+                self.job_store.claim(job, dir_key)
+            self._active_dirs[dir_key] = job.id
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        with self._condition:
+            job = self._jobs.get(job_id)
+        if job is None and self.job_store is not None:
+            state = self.job_store.load(job_id)
+            return AnalysisJob.from_dict(state) if state else None
+        return job
+
+    def list_jobs(self) -> List[Dict]:
+        with self._condition:
+            local = {job.id: job.to_dict() for job in self._jobs.values()}
+        if self.job_store is not None:
+            # Stav vlastných úloh je v pamäti aktuálnejší ako v databáze
+            return [local.get(state['id'], state) for state in self.job_store.list_jobs()]
+        return sorted(local.values(), key=lambda state: state['created_at'])
+
+    def cancel(self, job_id: str) -> Optional[AnalysisJob]:
+        """Požiada o zrušenie úlohy; bežiaca analýza skončí po aktuálnej dávke"""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None and self.job_store is not None:
+                state = self.job_store.load(job_id)
+                if state is not None and state['status'] not in FINISHED_STATES:
+                    state = self.job_store.request_cancel(job_id)
+                return AnalysisJob.from_dict(state) if state else None
+            if job is None or job.status in FINISHED_STATES:
+                return job
+            job.cancel_event.set()
+            if job.status == QUEUED:
+                self._finish(job, CANCELLED)
+            return job
+
+    def wait_for_update(self, job_id: str, version: int, timeout: float = 15.0) -> Optional[Dict]:
+        """
+        Počká, kým sa stav úlohy zmení oproti danej verzii
+
+        Returns:
+            Aktuálny stav úlohy (aj po uplynutí timeoutu) alebo None, ak úloha neexistuje
+        """
+        with self._condition:
+            if job_id in self._jobs or self.job_store is None:
+                self._condition.wait_for(
+                    lambda: job_id not in self._jobs or self._jobs[job_id].version != version,
+                    timeout=timeout)
+                job = self._jobs.get(job_id)
+                return job.to_dict() if job else None
+
+        # Úloha iného procesu – zmeny sa zisťujú z databázy
+        deadline = time.monotonic() + timeout
+        while True:
+            state = self.job_store.load(job_id)
+            if state is None or state['version'] != version or time.monotonic() >= deadline:
+                return AnalysisJob.from_dict(state).to_dict() if state else None
+            time.sleep(self.REMOTE_POLL_SECONDS)
+
+    def shutdown(self, wait: bool = True):
+        with self._condition:
+            for job in self._jobs.values():
+                job.cancel_event.set()
+        self._executor.shutdown(wait=wait)
+
+    def _update(self, job: AnalysisJob, **changes):
+        with self._condition:
+            for name, value in changes.items():
+                setattr(job, name, value)
+            job.version += 1
+            if self.job_store is not None and self.job_store.save(job):
+                job.cancel_event.set()
+            self._condition.notify_all()
+
+    def _finish(self, job: AnalysisJob, status: str, **changes):
+        """Ukončí úlohu a uvoľní jej data_dir"""
+        with self._condition:
+            self._active_dirs.pop(self._dir_key(job.data_dir), None)
+            self._update(job, status=status, finished_at=time.time(), **changes)
+
+    def _prune(self):
+        """Odstráni najstaršie dokončené úlohy nad limit"""
+        finished = sorted((j for j in self._jobs.values() if j.status in FINISHED_STATES),
+                          key=lambda j: j.created_at)
+        for job in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job.id]
+        if self.job_store is not None:
+            self.job_store.prune(self.max_finished_jobs)
+
+    def _save_profile(self, job: AnalysisJob, profiler: cProfile.Profile):
+        """Uloží profil úlohy; pri paralelnej analýze obsahuje len hlavný proces"""
+        try:
+            profile_dir = Path(job.data_dir) / "profiles"
+            profile_dir.mkdir(parents=True, exist_ok=True)
+            profile_file = (profile_dir / f"{job.id}.prof").resolve()
+            profiler.dump_stats(str(profile_file))
+            self._update(job, profile_file=str(profile_file))
+            self.log(f"Úloha {job.id}: profil uložený do {profile_file}", job_id=job.id)
+        except OSError as e:
+            self.log(f"Úloha {job.id}: profil sa nepodarilo uložiť: {e}", level='WARNING', job_id=job.id)
+
+    def _run(self, job: AnalysisJob):
+        if self.job_store is not None and self.job_store.cancel_requested(job.id):
+            job.cancel_event.set()
+            with self._condition:
+                if job.status == QUEUED:
+                    self._finish(job, CANCELLED)
+        if job.cancel_event.is_set():
+            return
+
+        # Analýza (cv2, numpy) sa načíta až pri prvej úlohe, nie pri štarte servera
+        from renemaPhotos import AnalysisCancelled, RoofAnalysisServer
+
+        self._update(job, status=RUNNING, started_at=time.time())
+        self.log(f"Úloha {job.id}: začínam analýzu {job.photos_dir} -> {job.data_dir}", job_id=job.id)
+        server = None
+        profiler = cProfile.Profile() if job.profile else None
+        try:
+            os.makedirs(job.data_dir, exist_ok=True)
+            server = RoofAnalysisServer(job.data_dir, analysis_scale=job.analysis_scale)
+            if profiler is not None:
+                profiler.enable()
+            try:
+                result = server.analyze_and_store(
+                    job.photos_dir,
+                    force_reanalysis=job.force,
+                    workers=job.workers,
+                    progress_callback=lambda progress: self._update(job, progress=progress),
+                    cancel_event=job.cancel_event
+                )
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                    self._save_profile(job, profiler)
+            summary = server.get_analysis_summary()
+            self._finish(job, COMPLETED, result=result, summary=summary)
+            self.log(f"Úloha {job.id}: analýza dokončená ({result['files_analyzed']} analyzovaných, "
+                     f"{result['files_skipped']} preskočených)", job_id=job.id)
+            for section_name, section_data in summary.items():
+                self.log(f"Sekcia {section_name}:", job_id=job.id)
+                self.log(f"  - Analyzované dni: {', '.join(section_data['dates'])}", job_id=job.id)
+                self.log(f"  - Celkový počet meraní: {section_data['total_measurements']}", job_id=job.id)
+        except AnalysisCancelled:
+            self._finish(job, CANCELLED)
+            self.log(f"Úloha {job.id}: analýza bola zrušená", job_id=job.id)
+        except Exception as e:
+            self._finish(job, FAILED, error=str(e))
+            self.log(f"Úloha {job.id}: kritická chyba: {e}", level='ERROR', job_id=job.id)
+            self.log(f"Stack trace: {traceback.format_exc()}", level='ERROR', job_id=job.id)
+        finally:
+            if server is not None:
+                server.close()
@@ -0,0 +1,122 @@
+import time
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+# Zhoda s pôvodnou cestou (np.mean/np.std, skimage.exposure.equalize_hist):
+#  - priemer a smerodajná odchýlka z histogramu sa líšia len zaokrúhlením
+#    pri sčítaní (relatívne < 1e-12, overené voči np.mean/np.std),
+#  - ekvalizácia cez LUT je bitovo zhodná s equalize_hist pre uint8 obrázky
+#    (skimage pre celočíselné obrázky tiež používa kumulatívny histogram
+#    hodnôt, interpolácia medzi stredmi košov je tu identita),
+#  - kvantizovaná heat mapa je bitovo zhodná s encode_heat_map(equalize_hist(...)),
+#  - percento tieňa používa ten istý cv2.adaptiveThreshold, teda je zhodné.
+METRIC_RTOL = 1e-12
+
+_QUANT_DTYPES = {'uint8': np.uint8, 'uint16': np.uint16}
+_LEVELS = np.arange(256, dtype=np.float64)
+
+
+def frame_histograms(stack: np.ndarray) -> np.ndarray:
+    """Histogram jasu každej snímky (N, 256) – jeden prechod cez pixely snímky"""
+    return np.stack([np.bincount(frame.ravel(), minlength=256) for frame in stack])
+
+
+def brightness_statistics(histograms: np.ndarray):
+    """Priemer a smerodajná odchýlka jasu všetkých snímok z ich histogramov"""
+    counts = histograms.sum(axis=1).astype(np.float64)
+    means = histograms @ _LEVELS / counts
+    deviations = _LEVELS[None, :] - means[:, None]
+    variances = (histograms * deviations * deviations).sum(axis=1) / counts
+    return means, np.sqrt(variances)
+
+
+def equalization_luts(histograms: np.ndarray, dtype: Optional[str] = None) -> np.ndarray:
+    """
+    Tabuľky (N, 256) na ekvalizáciu histogramu
+
+    Args:
+        histograms: Histogramy snímok (N, 256)
+        dtype: None vráti hodnoty 0..1 (float64) ako equalize_hist,
+            'uint8'/'uint16' vráti rovno kvantizované hodnoty heat mapy
+    """
+    cumulative = histograms.cumsum(axis=1)
+    cdf = cumulative / cumulative[:, -1:].astype(np.float64)
+    if dtype is None:
+        return cdf
+    quant_dtype = _QUANT_DTYPES[dtype]
+    return np.rint(cdf * np.iinfo(quant_dtype).max).astype(quant_dtype)
+
+
+def shadow_mask(gray: np.ndarray) -> np.ndarray:
+    """Maska tieňa (adaptívne prahovanie) jednej snímky"""
+    shadow_map = cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+        cv2.THRESH_BINARY, 11, 2
+    )
+    return shadow_map == 0
+
+
+def analyze_stack(stack: np.ndarray, heat_map_dtype: Optional[str] = None,
+                  heat_maps: bool = True, shadow_masks: bool = False,
+                  timings: Optional[Dict[str, float]] = None) -> Dict[str, np.ndarray]:
+    """
+    Analyzuje zásobník jasových snímok (N, H, W) uint8 naraz
+
+    Priemer a odchýlka jasu sa počítajú z histogramu snímky, ekvalizácia
+    histogramu je vyhľadanie v celočíselnej tabuľke namiesto výpočtu
+    v plávajúcej čiarke. Výsledky zodpovedajú RoofAnalysisServer._analyze_single_image
+    (tolerancia pozri METRIC_RTOL).
+
+    Args:
+        stack: Jasové snímky rovnakého rozmeru (N, H, W) uint8
+        heat_map_dtype: None = heat mapy 0..1 (float64), 'uint8'/'uint16' = kvantizované
+        heat_maps: Či vrátiť heat mapy (pri veľkých zásobníkoch zaberajú najviac pamäte)
+        shadow_masks: Či vrátiť aj boolovské masky tieňa (N, H, W)
+        timings: Voliteľný slovník, do ktorého sa pripočítajú časy fáz
+            (histogram, threshold, equalize) v sekundách
+
+    Returns:
+        Slovník polí: average_brightness, brightness_variation, shadow_percentage (N,),
+        histograms (N, 256) a voliteľne heat_map a shadow_mask (N, H, W)
+    """
+    stack = np.asarray(stack)
+    if stack.ndim == 2:
+        stack = stack[None]
+    if stack.dtype != np.uint8 or stack.ndim != 3:
+        raise ValueError("Očakáva sa zásobník jasových snímok (N, H, W) typu uint8")
+
+    started = time.perf_counter()
+    histograms = frame_histograms(stack)
+    means, deviations = brightness_statistics(histograms)
+    histogram_done = time.perf_counter()
+
+    pixels = stack.shape[1] * stack.shape[2]
+    shadow_percentage = np.empty(len(stack), dtype=np.float64)
+    masks = np.empty(stack.shape, dtype=bool) if shadow_masks else None
+    for i, frame in enumerate(stack):
+        mask = shadow_mask(frame)
+        shadow_percentage[i] = np.count_nonzero(mask) / pixels * 100
+        if masks is not None:
+            masks[i] = mask
+    threshold_done = time.perf_counter()
+
+    result = {
+        'average_brightness': means,
+        'brightness_variation': deviations,
+        'shadow_percentage': shadow_percentage,
+        'histograms': histograms
+    }
+    if heat_maps:
+        luts = equalization_luts(histograms, heat_map_dtype)
+        result['heat_map'] = np.stack([lut[frame] for lut, frame in zip(luts, stack)])
+    if masks is not None:
+        result['shadow_mask'] = masks
+
+    if timings is not None:
+        for stage, seconds in (('histogram', histogram_done - started),
+                               ('threshold', threshold_done - histogram_done),
+                               ('equalize', time.perf_counter() - threshold_done)):
+            timings[stage] = timings.get(stage, 0.0) + seconds
+    return result
@@ -0,0 +1,101 @@
+"""
+Kontrola štatistík oblastí záujmu pri prekrývajúcich sa polygónoch
+
+Porovná region_statistics a PhotoAnalyzer s výpočtom cez samostatnú masku
+pre každú oblasť (pôvodný spôsob) na syntetickom obrázku, kde je jedna
+oblasť celá vnútri inej, dve sa čiastočne prekrývajú a jedna je mimo
+ostatných. Pri nezhode skončí s kódom 1, takže sa dá spustiť v CI:
+
+    python benchmarks/check_regions.py
+"""
+import argparse
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from regions import RegionSet, region_statistics  # noqa: E402
+from roof_analysis import PhotoAnalyzer  # noqa: E402
+
+# Oblasť A je celá vnútri B, C čiastočne prekrýva B, D je samostatná
+OVERLAPPING_SECTIONS = {
+    'A': [(40, 40), (80, 40), (80, 80), (40, 80)],
+    'B': [(20, 20), (140, 20), (140, 120), (20, 120)],
+    'C': [(100, 60), (180, 60), (180, 150), (100, 150)],
+    'D': [(200, 10), (230, 10), (230, 40), (200, 40)]
+}
+
+TOLERANCE = 1e-6
+
+
+def synthetic_image(seed: int = 0) -> np.ndarray:
+    """BGR obrázok s jasnejšou vnútornou oblasťou, aby sa priemery A a B líšili"""
+    rng = np.random.default_rng(seed)
+    image = rng.integers(0, 120, size=(160, 240, 3), dtype=np.uint8)
+    image[40:81, 40:81] += 100
+    return image
+
+
+def reference_statistics(polygon: List, gray: np.ndarray, shadow_mask: np.ndarray) -> Optional[Dict]:
+    """Štatistiky jednej oblasti cez jej vlastnú masku"""
+    mask = np.zeros(gray.shape, dtype=np.uint8)
+    cv2.fillPoly(mask, [np.array(polygon, dtype=np.int32)], 1)
+    values = gray[mask > 0].astype(np.float64)
+    if not values.size:
+        return None
+    return {'pixel_count': int(values.size), 'average_brightness': float(values.mean()),
+            'brightness_variation': float(values.std()),
+            'shadow_percentage': float(shadow_mask[mask > 0].mean() * 100)}
+
+
+def check_regions(seed: int = 0) -> List[str]:
+    """Vráti zoznam nezhôd (prázdny, ak sú štatistiky správne)"""
+    image = synthetic_image(seed)
+    gray = image.max(axis=2)
+    shadow_mask = gray < 60
+    problems = []
+
+    regions = RegionSet(names=list(OVERLAPPING_SECTIONS), polygons=list(OVERLAPPING_SECTIONS.values()))
+    for stats in region_statistics(regions, gray, shadow_mask):
+        expected = reference_statistics(OVERLAPPING_SECTIONS[stats['region']], gray, shadow_mask)
+        for field, value in expected.items():
+            if stats[field] is None or abs(stats[field] - value) > TOLERANCE:
+                problems.append(f"region_statistics {stats['region']}.{field}: {stats[field]} (očakávané {value})")
+
+    analyzer = PhotoAnalyzer(".")
+    for name, polygon in OVERLAPPING_SECTIONS.items():
+        analyzer.define_roof_section(name, polygon)
+    illuminations = analyzer._analyze_all_sections(image)
+    for name, polygon in OVERLAPPING_SECTIONS.items():
+        expected = reference_statistics(polygon, gray, shadow_mask)['average_brightness']
+        if illuminations[name] is None or abs(illuminations[name] - expected) > TOLERANCE:
+            problems.append(f"PhotoAnalyzer {name}: {illuminations[name]} (očakávané {expected})")
+
+    layers = regions.label_layers(gray.shape)
+    if len(layers) != 2:
+        problems.append(f"Očakávané 2 vrstvy štítkov, vzniklo {len(layers)}")
+    disjoint = RegionSet(names=['A', 'C', 'D'], polygons=[OVERLAPPING_SECTIONS[n] for n in ('A', 'C', 'D')])
+    if len(disjoint.label_layers(gray.shape)) != 1:
+        problems.append("Neprekrývajúce sa oblasti majú byť v jedinej vrstve")
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Kontrola štatistík prekrývajúcich sa oblastí")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    problems = check_regions(args.seed)
+    for problem in problems:
+        print(f"CHYBA: {problem}", file=sys.stderr)
+    if not problems:
+        print("Štatistiky oblastí zodpovedajú samostatným maskám aj pri prekrývaní", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
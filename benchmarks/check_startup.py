@@ -0,0 +1,129 @@
+"""
+Kontrola rýchleho štartu backendu
+
+Zmeria čas importu BE_app v čistom interpreteri a overí, že ľahké
+endpointy (logy, merania, agregáty, súhrn, metriky, zoznam úloh) nenačítajú
+knižnice spracovania obrázkov a grafov. Pri prekročení rozpočtu alebo
+načítaní ťažkého modulu skončí s kódom 1, takže sa dá spustiť v CI:
+
+    python benchmarks/check_startup.py --budget 0.5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Moduly, ktoré sa smú načítať až pri spracovaní obrázkov alebo kreslení grafov
+HEAVY_MODULES = ('cv2', 'skimage', 'matplotlib', 'PIL')
+
+# Endpointy, ktoré obrázky nespracúvajú
+LIGHT_ENDPOINTS = (
+    '/api/logs',
+    '/api/illumination',
+    '/api/illumination/regions',
+    '/api/illumination/aggregates',
+    '/api/summary',
+    '/api/analyze/jobs',
+    '/metrics'
+)
+
+# Rozpočet na import BE_app (medián), sekundy
+IMPORT_BUDGET_SECONDS = 0.5
+
+_CHILD_CODE = """
+import json, sys, time
+started = time.perf_counter()
+import BE_app
+import_seconds = time.perf_counter() - started
+heavy = {heavy!r}
+report = {{'import_seconds': import_seconds,
+          'heavy_after_import': sorted(m for m in heavy if m in sys.modules),
+          'endpoints': {{}}}}
+if {check_endpoints!r}:
+    from results_store import ResultsStore
+    ResultsStore.for_data_dir({data_dir!r}).close()
+    app = BE_app.create_app({{'DATA_DIR': {data_dir!r}, 'SHARED_STATE': False}})
+    app.extensions['roof'].log_store.echo = False
+    client = app.test_client()
+    for url in {endpoints!r}:
+        response = client.get(url)
+        response.get_data()
+        report['endpoints'][url] = {{'status': response.status_code,
+                                    'heavy': sorted(m for m in heavy if m in sys.modules)}}
+print(json.dumps(report))
+"""
+
+
+def run_child(data_dir: Path, check_endpoints: bool) -> Dict:
+    """Spustí kontrolu v novom interpreteri (čisté sys.modules)"""
+    code = _CHILD_CODE.format(heavy=HEAVY_MODULES, endpoints=LIGHT_ENDPOINTS, data_dir=str(data_dir),
+                              check_endpoints=check_endpoints)
+    completed = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True,
+                               text=True, timeout=120)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Kontrolný proces zlyhal:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def measure_startup(repeat: int = 5) -> Dict:
+    """
+    Čas importu BE_app (opakované merania v nových procesoch) a ťažké
+    moduly načítané po importe a po volaní ľahkých endpointov
+    """
+    with tempfile.TemporaryDirectory(prefix="roof-startup-") as tmp:
+        runs = [run_child(Path(tmp), check_endpoints=False)['import_seconds'] for _ in range(repeat)]
+        report = run_child(Path(tmp), check_endpoints=True)
+    return {
+        'import_seconds': {
+            'runs': [round(run, 6) for run in runs],
+            'min': round(min(runs), 6),
+            'median': round(statistics.median(runs), 6)
+        },
+        'heavy_after_import': report['heavy_after_import'],
+        'endpoints': report['endpoints']
+    }
+
+
+def check_startup(budget: float = IMPORT_BUDGET_SECONDS, repeat: int = 5) -> List[str]:
+    """
+    Vráti zoznam porušení (prázdny, ak je štart v poriadku)
+    """
+    result = measure_startup(repeat)
+    problems = []
+    median = result['import_seconds']['median']
+    if median > budget:
+        problems.append(f"Import BE_app trvá {median:.3f} s (rozpočet {budget:.3f} s)")
+    if result['heavy_after_import']:
+        problems.append(f"Import BE_app načíta {', '.join(result['heavy_after_import'])}")
+    for url, endpoint in result['endpoints'].items():
+        if endpoint['status'] >= 500:
+            problems.append(f"{url}: HTTP {endpoint['status']}")
+        if endpoint['heavy']:
+            problems.append(f"{url} načíta {', '.join(endpoint['heavy'])}")
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Kontrola času štartu a lenivých importov backendu")
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET_SECONDS,
+                        help="Najdlhší povolený medián importu BE_app v sekundách")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    problems = check_startup(args.budget, args.repeat)
+    for problem in problems:
+        print(f"CHYBA: {problem}", file=sys.stderr)
+    if not problems:
+        print("Štart backendu je v rozpočte a ľahké endpointy nenačítajú ťažké knižnice", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
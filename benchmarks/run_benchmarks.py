@@ -0,0 +1,248 @@
+"""
+Benchmarky analýzy fotografií, premenovania a Flask endpointov
+
+Vygeneruje syntetický dataset (synthetic_dataset.py), zmeria jednotlivé
+fázy a výsledky zapíše ako JSON, aby sa dali porovnávať medzi verziami:
+
+    python benchmarks/run_benchmarks.py --sections 2 --days 3 --output bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from synthetic_dataset import generate_dataset, generate_unrenamed_copy  # noqa: E402
+
+
+def summarize(runs: List[float], items: Optional[int] = None) -> Dict:
+    """Súhrn opakovaných meraní (sekundy); pri známom počte položiek aj priepustnosť"""
+    result = {
+        'runs': [round(run, 6) for run in runs],
+        'min': round(min(runs), 6),
+        'median': round(statistics.median(runs), 6),
+        'mean': round(statistics.fmean(runs), 6)
+    }
+    if items:
+        result['items'] = items
+        result['items_per_second'] = round(items / statistics.median(runs), 3)
+    return result
+
+
+def measure(fn: Callable[[], object], repeat: int, setup: Optional[Callable[[], None]] = None,
+            quiet: bool = True) -> List[float]:
+    """Zmeria fn repeat-krát; setup sa volá pred každým meraním a nezapočítava sa"""
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        output = io.StringIO() if quiet else None
+        with contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext():
+            started = time.perf_counter()
+            fn()
+            runs.append(time.perf_counter() - started)
+    return runs
+
+
+def bench_pipeline(photos_dir: Path, work_dir: Path, files: int, repeat: int, workers: int,
+                   analysis_scale: int, quiet: bool) -> Dict:
+    """analyze_and_store: studený beh, teplý inkrementálny beh a vynútená analýza"""
+    from renemaPhotos import RoofAnalysisServer
+
+    data_dir = work_dir / "data"
+
+    def fresh_data_dir():
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    def run(force: bool = False):
+        server = RoofAnalysisServer(str(data_dir), analysis_scale=analysis_scale)
+        try:
+            server.analyze_and_store(str(photos_dir), force_reanalysis=force, workers=workers)
+        finally:
+            server.close()
+
+    return {
+        'analyze_cold': summarize(measure(run, repeat, setup=fresh_data_dir, quiet=quiet), files),
+        'analyze_warm': summarize(measure(run, repeat, quiet=quiet), files),
+        'analyze_forced': summarize(measure(lambda: run(force=True), repeat, quiet=quiet), files)
+    }
+
+
+def bench_rename(photos_dir: Path, work_dir: Path, repeat: int, limit: Optional[int], quiet: bool) -> Dict:
+    """rename_photos na kópii fotografií s názvami z fotoaparátu"""
+    from photo_rename import rename_photos
+
+    rename_dir = work_dir / "rename"
+    counts = []
+
+    def setup():
+        counts.append(generate_unrenamed_copy(photos_dir, rename_dir, limit))
+
+    runs = measure(lambda: rename_photos(rename_dir, log=lambda message, **_: None), repeat,
+                   setup=setup, quiet=quiet)
+    return {'rename_photos': summarize(runs, counts[-1] if counts else None)}
+
+
+def bench_endpoints(data_dir: Path, repeat: int, quiet: bool) -> Dict:
+    """Flask endpointy cez testovacieho klienta nad výsledkami studeného behu"""
+    import BE_app
+    from heatmap_render import HeatMapRenderer
+    from heatmap_store import HeatMapStore
+
+    app = BE_app.create_app({"DATA_DIR": data_dir, "SHARED_STATE": False})
+    app_state = app.extensions["roof"]
+    app_state.log_store.echo = False
+    client = app.test_client()
+
+    store = HeatMapStore(data_dir / "heat_maps")
+    try:
+        sections = sorted({section for section, _ in store.conn.execute("SELECT section, date FROM frames")})
+        heat_map_key = store.conn.execute("SELECT key FROM frames ORDER BY key LIMIT 1").fetchone()[0]
+    finally:
+        store.close()
+
+    def get(url: str, expected: int = 200, headers: Optional[Dict] = None):
+        response = client.get(url, headers=headers or {})
+        if response.status_code != expected:
+            raise RuntimeError(f"{url}: HTTP {response.status_code}")
+        response.get_data()
+        return response
+
+    def reset_renderer():
+        app_state.heat_map_renderer = HeatMapRenderer(cache_dir=None)
+        app_state.illumination_cache.clear()
+
+    etag = get(f"/api/heatmap/{heat_map_key}").headers["ETag"]
+    endpoints = {
+        'illumination_full': ("/api/illumination", reset_renderer),
+        'illumination_cached': ("/api/illumination", None),
+        'illumination_page': ("/api/illumination?limit=500", reset_renderer),
+        'illumination_section_ndjson': (f"/api/illumination?format=ndjson&section={sections[0]}", None),
+        'summary': ("/api/summary", None),
+        'heatmap_render': (f"/api/heatmap/{heat_map_key}", reset_renderer),
+        'heatmap_cached': (f"/api/heatmap/{heat_map_key}", None),
+        'heatmap_tile': (f"/api/heatmap/{heat_map_key}?tile=0,0&tile_size=128", reset_renderer)
+    }
+    results = {}
+    for name, (url, setup) in endpoints.items():
+        results[f"api_{name}"] = summarize(measure(lambda: get(url), repeat, setup=setup, quiet=quiet))
+    results['api_heatmap_not_modified'] = summarize(measure(
+        lambda: get(f"/api/heatmap/{heat_map_key}", 304, {"If-None-Match": etag}), repeat, quiet=quiet))
+    return results
+
+
+def bench_startup(repeat: int) -> Dict:
+    """Čas importu BE_app v novom procese a ťažké moduly načítané ľahkými endpointmi"""
+    from check_startup import measure_startup
+
+    startup = measure_startup(repeat)
+    heavy = set(startup['heavy_after_import'])
+    for endpoint in startup['endpoints'].values():
+        heavy.update(endpoint['heavy'])
+    return {
+        'startup_import': summarize(startup['import_seconds']['runs']),
+        'startup_heavy_modules': sorted(heavy)
+    }
+
+
+def environment_info() -> Dict:
+    """Verzie a prostredie, aby boli výsledky porovnateľné"""
+    import cv2
+    import numpy as np
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> Dict:
+    parser = argparse.ArgumentParser(description="Benchmarky analýzy fotografií strechy")
+    parser.add_argument("--sections", type=int, default=2)
+    parser.add_argument("--days", type=int, default=2)
+    parser.add_argument("--interval", type=int, default=30, help="Interval snímok v minútach")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--analysis-scale", type=int, default=1)
+    parser.add_argument("--rename-limit", type=int, default=None,
+                        help="Najviac toľko fotografií v benchmarku premenovania")
+    parser.add_argument("--only", nargs="+", choices=["pipeline", "rename", "api", "startup"],
+                        default=["pipeline", "rename", "api", "startup"])
+    parser.add_argument("--work-dir", help="Pracovný adresár (predvolene dočasný, po behu sa zmaže)")
+    parser.add_argument("--output", help="Súbor pre JSON výsledky (predvolene štandardný výstup)")
+    parser.add_argument("--verbose", action="store_true", help="Nepotláčať výpisy analýzy")
+    args = parser.parse_args(argv)
+
+    work_dir = Path(args.work_dir) if args.work_dir else Path(tempfile.mkdtemp(prefix="roof-bench-"))
+    work_dir.mkdir(parents=True, exist_ok=True)
+    quiet = not args.verbose
+    try:
+        photos_dir = work_dir / "photos"
+        shutil.rmtree(photos_dir, ignore_errors=True)
+        started = time.perf_counter()
+        dataset = generate_dataset(photos_dir, args.sections, args.days, args.interval,
+                                   args.width, args.height)
+        dataset['generate_seconds'] = round(time.perf_counter() - started, 3)
+        print(f"Dataset: {dataset['files']} fotografií {args.width}x{args.height}", file=sys.stderr)
+
+        results = {}
+        if "pipeline" in args.only or "api" in args.only:
+            print("Meriam analyze_and_store...", file=sys.stderr)
+            results.update(bench_pipeline(photos_dir, work_dir, dataset['files'], args.repeat,
+                                          args.workers, args.analysis_scale, quiet))
+        if "rename" in args.only:
+            print("Meriam rename_photos...", file=sys.stderr)
+            results.update(bench_rename(photos_dir, work_dir, args.repeat, args.rename_limit, quiet))
+        if "api" in args.only:
+            print("Meriam Flask endpointy...", file=sys.stderr)
+            results.update(bench_endpoints(work_dir / "data", args.repeat, quiet))
+        if "startup" in args.only:
+            print("Meriam štart backendu...", file=sys.stderr)
+            results.update(bench_startup(args.repeat))
+
+        report = {
+            'environment': environment_info(),
+            'parameters': {k: v for k, v in vars(args).items() if k not in ('output', 'work_dir')},
+            'dataset': dataset,
+            'results': results
+        }
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding='utf-8')
+        print(f"Výsledky zapísané do {args.output}", file=sys.stderr)
+    else:
+        print(output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Generátor syntetických fotografií strechy pre benchmarky
+
+Vytvorí strom <sekcia>/<dátum>/RRRR-MM-DD-HH-MM.jpg s EXIF časom snímky,
+teda rovnaký tvar, aký majú skutočné dáta po premenovaní. Obrázky sú
+deterministické (pevný seed) – jas a tieň sa menia podľa dennej doby.
+"""
+import argparse
+import math
+import shutil
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+SECTION_NAMES = [
+    "Východo-juhovýchodná strana (109°)",
+    "Západo-severozápadná strana (291°)",
+    "Juhozápadná strana (210°)",
+    "Severovýchodná strana (30°)"
+]
+
+EXIF_DATETIME_FORMAT = "%Y:%m:%d %H:%M:%S"
+PHOTO_NAME_FORMAT = "%Y-%m-%d-%H-%M"
+
+
+def section_names(count: int) -> List[str]:
+    """Názvy sekcií – prvé zodpovedajú skutočným, ďalšie sa očíslujú"""
+    return [SECTION_NAMES[i] if i < len(SECTION_NAMES) else f"Sekcia {i + 1}" for i in range(count)]
+
+
+def capture_times(start_date: str, days: int, interval_minutes: int,
+                  day_start: int = 6, day_end: int = 20) -> List[datetime]:
+    """Časy snímok medzi day_start a day_end hodinou počas daných dní"""
+    first_day = datetime.fromisoformat(start_date)
+    times = []
+    for day in range(days):
+        current = first_day + timedelta(days=day, hours=day_start)
+        end = first_day + timedelta(days=day, hours=day_end)
+        while current < end:
+            times.append(current)
+            current += timedelta(minutes=interval_minutes)
+    return times
+
+
+def synthetic_frame(width: int, height: int, when: datetime, seed: int) -> np.ndarray:
+    """
+    RGB snímka strechy – škridlový vzor, denný priebeh jasu a tieň
+    posúvajúci sa so slnkom
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+
+    # Škridle: pravidelné rady s jemným šumom
+    tiles = 0.5 + 0.15 * np.sin(x / max(width, 1) * 60) * np.sin(y / max(height, 1) * 25)
+    tiles += rng.normal(0, 0.04, (height, width)).astype(np.float32)
+
+    # Denný priebeh jasu (maximum na poludnie)
+    hour = when.hour + when.minute / 60
+    daylight = max(0.08, math.sin(math.pi * (hour - 6) / 14))
+
+    # Tieň komína, ktorý sa posúva s polohou slnka
+    shadow_x = width * (0.2 + 0.6 * (hour - 6) / 14)
+    shadow = np.where(np.abs(x - shadow_x) < width * 0.08, 0.45, 1.0).astype(np.float32)
+
+    luminance = np.clip(tiles * daylight * shadow * 1.6, 0, 1)
+    rgb = np.stack([luminance * 0.95, luminance * 0.6, luminance * 0.45], axis=-1)
+    return (rgb * 255).astype(np.uint8)
+
+
+def save_photo(path: Path, frame: np.ndarray, when: datetime, quality: int = 90):
+    """Uloží JPEG s EXIF časom snímky (DateTime aj DateTimeOriginal)"""
+    exif = Image.Exif()
+    exif[0x0132] = when.strftime(EXIF_DATETIME_FORMAT)
+    exif.get_ifd(0x8769)[0x9003] = when.strftime(EXIF_DATETIME_FORMAT)
+    Image.fromarray(frame).save(path, quality=quality, exif=exif)
+
+
+def generate_dataset(root: Path, sections: int = 2, days: int = 2, interval_minutes: int = 30,
+                     width: int = 640, height: int = 480, start_date: str = "2025-06-01",
+                     seed: int = 0) -> Dict:
+    """
+    Vygeneruje strom fotografií <sekcia>/<dátum>/RRRR-MM-DD-HH-MM.jpg
+
+    Returns:
+        Popis datasetu (počty súborov, rozlíšenie, veľkosť na disku)
+    """
+    root = Path(root)
+    times = capture_times(start_date, days, interval_minutes)
+    files = 0
+    total_bytes = 0
+    for section_index, section_name in enumerate(section_names(sections)):
+        for index, when in enumerate(times):
+            day_dir = root / section_name / when.date().isoformat()
+            day_dir.mkdir(parents=True, exist_ok=True)
+            path = day_dir / (when.strftime(PHOTO_NAME_FORMAT) + ".jpg")
+            frame = synthetic_frame(width, height, when, seed + section_index * 100003 + index)
+            save_photo(path, frame, when)
+            files += 1
+            total_bytes += path.stat().st_size
+    return {
+        'root': str(root),
+        'sections': sections,
+        'days': days,
+        'interval_minutes': interval_minutes,
+        'width': width,
+        'height': height,
+        'files': files,
+        'bytes': total_bytes
+    }
+
+
+def generate_unrenamed_copy(source: Path, target: Path, limit: Optional[int] = None) -> int:
+    """
+    Skopíruje fotografie do jedného adresára pod náhodnými názvami (ako z fotoaparátu)
+    – vstup pre benchmark premenovania podľa EXIF
+    """
+    target = Path(target)
+    if target.exists():
+        shutil.rmtree(target)
+    target.mkdir(parents=True)
+    photos = sorted(Path(source).rglob("*.jpg"))[:limit]
+    for index, photo in enumerate(photos):
+        shutil.copyfile(photo, target / f"IMG_{index:05d}.jpg")
+    return len(photos)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generátor syntetických fotografií strechy")
+    parser.add_argument("root", help="Cieľový adresár")
+    parser.add_argument("--sections", type=int, default=2)
+    parser.add_argument("--days", type=int, default=2)
+    parser.add_argument("--interval", type=int, default=30, help="Interval snímok v minútach")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--start-date", default="2025-06-01")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    info = generate_dataset(Path(args.root), args.sections, args.days, args.interval,
+                            args.width, args.height, args.start_date, args.seed)
+    print(f"Vygenerovaných {info['files']} fotografií ({info['bytes'] / 1e6:.1f} MB) v {info['root']}")
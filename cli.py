@@ -0,0 +1,193 @@
+"""
+Príkazový riadok pre dávkové spracovanie archívu fotografií
+
+    python cli.py rename /data/Photos/sekcia1 /data/Photos/sekcia2
+    python cli.py analyze /data/Photos /data/AnalysisData --workers 8
+    python cli.py summary /data/AnalysisData
+    python cli.py export /data/AnalysisData --full
+
+Rozdelenie archívu medzi viac hostiteľov – každý analyzuje svoj shard
+do vlastného adresára s dátami, výsledky sa potom zlúčia:
+
+    host0$ python cli.py analyze /mnt/Photos /data/shard0 --shard 0/2 --shard-by date
+    host1$ python cli.py analyze /mnt/Photos /data/shard1 --shard 1/2 --shard-by date
+    python cli.py merge /data/AnalysisData /data/shard0 /data/shard1
+
+Priradenie fotografie shardu závisí len od cesty relatívnej k adresáru
+fotografií (alebo od jej obsahu), takže hostitelia sa zhodnú aj pri
+rôznych bodoch pripojenia archívu.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+# Možnosti --shard-by (sharding.SHARD_KEYS); sharding sa načíta až v príkazoch, ktoré ho používajú
+SHARD_BY_CHOICES = ("section", "date", "hash")
+
+
+def _print_json(result):
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+def _open_server(args, **options):
+    # Načíta OpenCV – len pre príkazy, ktoré analyzujú alebo zapisujú výsledky
+    from renemaPhotos import RoofAnalysisServer
+
+    return RoofAnalysisServer(args.data_dir, **options)
+
+
+def cmd_analyze(args) -> int:
+    from prefetch import DEFAULT_READS_IN_FLIGHT
+    from sharding import ShardFilter
+
+    shard = ShardFilter.parse(args.shard, args.shard_by) if args.shard else None
+    server = _open_server(args, analysis_scale=args.scale,
+                          reads_in_flight=args.reads_in_flight or DEFAULT_READS_IN_FLIGHT)
+    try:
+        result = server.analyze_and_store(args.photos_dir, force_reanalysis=args.force, workers=args.workers,
+                                          batch_size=args.batch_size, shard=shard)
+    finally:
+        server.close()
+    _print_json(result)
+    return 0
+
+
+def cmd_rename(args) -> int:
+    from photo_rename import rename_photos
+
+    for directory in args.directories:
+        if not Path(directory).is_dir():
+            print(f"Adresár neexistuje: {directory}", file=sys.stderr)
+            return 1
+        rename_photos(directory, workers=args.workers)
+    return 0
+
+
+def cmd_summary(args) -> int:
+    from results_store import ResultsStore
+
+    if not (Path(args.data_dir) / "results.sqlite3").exists():
+        print(f"V {args.data_dir} nie sú výsledky analýzy", file=sys.stderr)
+        return 1
+    store = ResultsStore.for_data_dir(args.data_dir)
+    try:
+        summary = store.summary()
+    finally:
+        store.close()
+    if args.json:
+        _print_json(summary)
+        return 0
+    print("Prehľad analýz:")
+    for section_name, data in summary.items():
+        print(f"\nSekcia: {section_name}")
+        print(f"Počet analyzovaných dní: {len(data['dates'])}")
+        print(f"Celkový počet meraní: {data['total_measurements']}")
+        if data['dates']:
+            print(f"Obdobie: {data['dates'][0]} – {data['dates'][-1]}")
+    return 0
+
+
+def cmd_export(args) -> int:
+    server = _open_server(args)
+    try:
+        result = server.export_columnar(full=args.full, parquet=args.parquet)
+    finally:
+        server.close()
+    _print_json(result)
+    return 0
+
+
+def cmd_gc(args) -> int:
+    server = _open_server(args)
+    try:
+        if args.max_cache_bytes is not None:
+            server.result_cache.max_bytes = args.max_cache_bytes
+        result = server.collect_garbage(dry_run=args.dry_run, min_dead_ratio=args.min_dead_ratio)
+    finally:
+        server.close()
+    _print_json(result)
+    return 0
+
+
+def cmd_merge(args) -> int:
+    target = Path(args.data_dir).resolve()
+    if any(Path(shard_dir).resolve() == target for shard_dir in args.shard_dirs):
+        print("Cieľový adresár nemôže byť zároveň shardom", file=sys.stderr)
+        return 1
+    server = _open_server(args)
+    try:
+        result = server.merge_shards(args.shard_dirs)
+    finally:
+        server.close()
+    _print_json(result)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Analýza osvetlenia strechy z archívu fotografií")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    analyze = commands.add_parser("analyze", help="Inkrementálne analyzovať fotografie")
+    analyze.add_argument("photos_dir", help="Adresár s fotografiami (podadresár = sekcia)")
+    analyze.add_argument("data_dir", help="Adresár s výsledkami analýzy")
+    analyze.add_argument("--workers", type=int, default=1, help="Počet procesov analýzy")
+    analyze.add_argument("--force", action="store_true", help="Analyzovať znova aj nezmenené fotografie")
+    analyze.add_argument("--scale", type=int, default=1, choices=(1, 2, 4, 8),
+                         help="Zmenšenie rozlíšenia pri dekódovaní")
+    analyze.add_argument("--batch-size", type=int, default=32, help="Počet fotografií v jednej dávke")
+    analyze.add_argument("--reads-in-flight", type=int,
+                         help="Počet súčasných čítaní (vyšší pri sieťovom disku)")
+    analyze.add_argument("--shard", metavar="i/N", help="Analyzovať len i-tý z N shardov (od 0)")
+    analyze.add_argument("--shard-by", choices=SHARD_BY_CHOICES, default="section",
+                         help="Delenie na shardy: podľa sekcie, dňa alebo obsahu fotografie")
+    analyze.set_defaults(handler=cmd_analyze)
+
+    rename = commands.add_parser("rename", help="Premenovať fotografie podľa času z EXIF")
+    rename.add_argument("directories", nargs="+", help="Adresáre s fotografiami")
+    rename.add_argument("--workers", type=int, default=8, help="Počet vlákien pre čítanie EXIF")
+    rename.set_defaults(handler=cmd_rename)
+
+    summary = commands.add_parser("summary", help="Prehľad analyzovaných sekcií a dní")
+    summary.add_argument("data_dir", help="Adresár s výsledkami analýzy")
+    summary.add_argument("--json", action="store_true", help="Výstup vo formáte JSON")
+    summary.set_defaults(handler=cmd_summary)
+
+    export = commands.add_parser("export", help="Stĺpcový export meraní (NumPy, voliteľne Parquet)")
+    export.add_argument("data_dir", help="Adresár s výsledkami analýzy")
+    export.add_argument("--full", action="store_true", help="Zapísať celý export znova")
+    export.add_argument("--parquet", action=argparse.BooleanOptionalAction, default=None,
+                        help="Zapísať aj measurements.parquet (predvolene, ak je nainštalovaný pyarrow)")
+    export.set_defaults(handler=cmd_export)
+
+    gc = commands.add_parser("gc", help="Údržba cache výsledkov a heat máp")
+    gc.add_argument("data_dir", help="Adresár s výsledkami analýzy")
+    gc.add_argument("--dry-run", action="store_true", help="Len vypísať, čo by sa odstránilo")
+    gc.add_argument("--min-dead-ratio", type=float, default=0.25,
+                    help="Podiel nepoužitých dát, od ktorého sa kontajner zhutní")
+    gc.add_argument("--max-cache-bytes", type=int, help="Zmenšiť cache výsledkov na túto veľkosť")
+    gc.set_defaults(handler=cmd_gc)
+
+    merge = commands.add_parser("merge", help="Zlúčiť výsledky shardov do jedného adresára s dátami")
+    merge.add_argument("data_dir", help="Cieľový adresár s výsledkami analýzy")
+    merge.add_argument("shard_dirs", nargs="+", help="Adresáre s výsledkami shardov")
+    merge.set_defaults(handler=cmd_merge)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, "shard", None):
+        from sharding import parse_shard
+
+        try:
+            parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
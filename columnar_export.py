@@ -0,0 +1,258 @@
+import argparse
+import json
+import os
+import time
+from itertools import chain
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from results_store import ResultsStore
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pyarrow je voliteľný, bez neho sa zapíše len pole NumPy
+    pyarrow = None
+
+COLUMNAR_DIR_NAME = "columnar"
+MEASUREMENTS_FILE = "measurements.npy"
+PARQUET_FILE = "measurements.parquet"
+STATE_FILE = "export.json"
+
+# Zvýšiť pri zmene MEASUREMENT_DTYPE – starý export sa potom zapíše celý znova
+SCHEMA_VERSION = 1
+
+# Riadok exportu: čas ako datetime64, metriky float32, sekcia a fotografia ako
+# kódy kategórií (názvy sú v export.json, poradie kódov sa nikdy nemení)
+MEASUREMENT_DTYPE = np.dtype([
+    ('id', '<i8'),
+    ('datetime', '<M8[s]'),
+    ('section', '<u2'),
+    ('image_name', '<u4'),
+    ('average_brightness', '<f4'),
+    ('brightness_variation', '<f4'),
+    ('shadow_percentage', '<f4')
+])
+
+_METRIC_FIELDS = ('average_brightness', 'brightness_variation', 'shadow_percentage')
+
+
+class ColumnarMeasurements:
+    """
+    Merania zo stĺpcového exportu, namapované do pamäte
+
+    Riadky sú zoradené podľa sekcie, času a id, takže výber sekcie
+    a časového rozsahu je len rez poľom (bez kopírovania dát).
+    """
+
+    def __init__(self, array: np.ndarray, sections: List[str], image_names: List[str]):
+        self.array = array
+        self.sections = sections
+        self.image_names = image_names
+
+    def __len__(self) -> int:
+        return len(self.array)
+
+    def section_code(self, section_name: str) -> int:
+        try:
+            return self.sections.index(section_name)
+        except ValueError:
+            raise KeyError(f"Sekcia {section_name} nie je v exporte")
+
+    def select(self, section_name: Optional[str] = None, start: Optional[str] = None,
+               end: Optional[str] = None) -> np.ndarray:
+        """
+        Rez meraní sekcie v časovom rozsahu (pohľad do namapovaného súboru)
+
+        Args:
+            section_name: Sekcia (None = všetky; časový rozsah sa potom neuplatní)
+            start: Začiatok (ISO dátum alebo dátum a čas, vrátane)
+            end: Koniec (ISO dátum alebo dátum a čas, vrátane; samotný dátum zahŕňa celý deň)
+        """
+        if section_name is None:
+            return self.array
+        code = self.section_code(section_name)
+        codes = self.array['section']
+        rows = self.array[np.searchsorted(codes, code, 'left'):np.searchsorted(codes, code, 'right')]
+        times = rows['datetime']
+        first = np.searchsorted(times, np.datetime64(start, 's'), 'left') if start else 0
+        if end:
+            stop = (np.datetime64(end, 's') if 'T' in end
+                    else np.datetime64(end, 'D') + np.timedelta64(1, 'D'))
+            last = np.searchsorted(times, stop, 'right' if 'T' in end else 'left')
+        else:
+            last = len(rows)
+        return rows[first:last]
+
+    def labels(self, rows: np.ndarray, column: str = 'section') -> np.ndarray:
+        """Názvy kategórií (sekcie alebo fotografie) pre kódy vybraných riadkov"""
+        categories = self.sections if column == 'section' else self.image_names
+        return np.asarray(categories, dtype=object)[rows[column]]
+
+
+def _load_state(output_dir: Path) -> Optional[Dict]:
+    try:
+        with open(output_dir / STATE_FILE, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return state if state.get('schema_version') == SCHEMA_VERSION else None
+
+
+def _write_atomic(path: Path, write):
+    """Zapíše súbor cez dočasný súbor, fsync a premenovanie"""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def _to_array(rows: Iterable[Dict], sections: List[str], image_names: List[str]) -> np.ndarray:
+    """Prevedie riadky meraní na štruktúrované pole (nové kategórie pripíše na koniec zoznamov)"""
+    section_codes = {name: code for code, name in enumerate(sections)}
+    image_codes = {name: code for code, name in enumerate(image_names)}
+    columns: Dict[str, List] = {name: [] for name in MEASUREMENT_DTYPE.names}
+    for row in rows:
+        for categories, codes, field in ((sections, section_codes, 'section'),
+                                         (image_names, image_codes, 'image_name')):
+            code = codes.get(row[field])
+            if code is None:
+                code = codes[row[field]] = len(categories)
+                categories.append(row[field])
+            columns[field].append(code)
+        columns['id'].append(row['id'])
+        columns['datetime'].append(row['datetime'])
+        for field in _METRIC_FIELDS:
+            value = row[field]
+            columns[field].append(np.nan if value is None else value)
+
+    array = np.empty(len(columns['id']), dtype=MEASUREMENT_DTYPE)
+    for name in MEASUREMENT_DTYPE.names:
+        array[name] = np.asarray(columns[name], dtype=MEASUREMENT_DTYPE[name])
+    return array
+
+
+def _write_parquet(path: Path, array: np.ndarray, sections: List[str], image_names: List[str]):
+    """Skomprimovaný Parquet súbor so slovníkovo kódovanými stĺpcami sekcie a fotografie"""
+    columns = {
+        'id': pyarrow.array(array['id']),
+        'datetime': pyarrow.array(array['datetime'], type=pyarrow.timestamp('s')),
+        'section': pyarrow.DictionaryArray.from_arrays(
+            pyarrow.array(array['section'].astype(np.int32)), pyarrow.array(sections, pyarrow.string())),
+        'image_name': pyarrow.DictionaryArray.from_arrays(
+            pyarrow.array(array['image_name'].astype(np.int32)), pyarrow.array(image_names, pyarrow.string()))
+    }
+    for field in _METRIC_FIELDS:
+        columns[field] = pyarrow.array(array[field], from_pandas=True)
+    table = pyarrow.table(columns)
+    _write_atomic(path, lambda f: pyarrow.parquet.write_table(table, f, compression='zstd'))
+
+
+def export_columnar(store: ResultsStore, output_dir, full: bool = False,
+                    parquet: Optional[bool] = None) -> Dict:
+    """
+    Zapíše alebo inkrementálne obnoví stĺpcový export meraní
+
+    Pri existujúcom exporte sa z databázy načítajú len dni, ktorých merania
+    sa od posledného exportu zmenili (fronta export_queue v ResultsStore);
+    ich riadky nahradia staré a pole sa zapíše atomicky. Čitatelia so
+    starým namapovaným súborom pokračujú bez prerušenia.
+
+    Poradie zápisu je bezpečné pri páde: najprv kategórie (zoznamy sa len
+    predlžujú), potom pole, nakoniec sa vyprázdni fronta – nedokončený
+    export sa pri ďalšom behu zopakuje. Volá sa pod zámkom analýzy
+    (RoofAnalysisServer.export_columnar).
+
+    Args:
+        store: Úložisko výsledkov
+        output_dir: Adresár exportu (<data_dir>/columnar)
+        full: Zapísať celý export znova
+        parquet: Zapísať aj measurements.parquet (None = ak je nainštalovaný pyarrow)
+
+    Returns:
+        Počet obnovených a všetkých riadkov, či šlo o úplný export a či vznikol Parquet
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if parquet is None:
+        parquet = pyarrow is not None
+    elif parquet and pyarrow is None:
+        raise RuntimeError("Export do Parquet vyžaduje balík pyarrow")
+
+    array_path = output_dir / MEASUREMENTS_FILE
+    state = _load_state(output_dir)
+    # Kódy kategórií ostávajú stabilné aj pri úplnom exporte (nové sa len pripájajú)
+    sections, image_names = (state['sections'], state['image_names']) if state is not None else ([], [])
+    existing = (np.load(array_path, mmap_mode='r')
+                if not full and state is not None and array_path.exists() else None)
+    if existing is not None:
+        days: Optional[List[Tuple[str, str]]] = store.pending_export_days()
+        parquet_outdated = parquet != (output_dir / PARQUET_FILE).exists()
+        if not days and not parquet_outdated:
+            return {'rows_updated': 0, 'rows': len(existing), 'full': False, 'parquet': parquet}
+        rows = chain.from_iterable(store.query_measurements([section_name], date_str, date_str)
+                                   for section_name, date_str in days)
+    else:
+        days = None
+        rows = store.query_measurements()
+
+    fresh = _to_array(rows, sections, image_names)
+    if existing is not None:
+        combined = np.concatenate([existing[~np.isin(existing['id'], fresh['id'])], fresh])
+        del existing
+    else:
+        combined = fresh
+    combined = combined[np.lexsort((combined['id'], combined['datetime'], combined['section']))]
+
+    state = {'schema_version': SCHEMA_VERSION, 'exported_at': time.time(), 'rows': len(combined),
+             'revision': store.get_revision(), 'sections': sections, 'image_names': image_names}
+    _write_atomic(output_dir / STATE_FILE, lambda f: f.write(json.dumps(state, ensure_ascii=False).encode('utf-8')))
+    _write_atomic(array_path, lambda f: np.save(f, combined))
+    if parquet:
+        _write_parquet(output_dir / PARQUET_FILE, combined, sections, image_names)
+    elif (output_dir / PARQUET_FILE).exists():
+        # Starší Parquet by už nezodpovedal poľu NumPy
+        (output_dir / PARQUET_FILE).unlink()
+    store.clear_export_days(days)
+    return {'rows_updated': len(fresh), 'rows': len(combined), 'full': days is None, 'parquet': parquet}
+
+
+def load_columnar(data_dir) -> ColumnarMeasurements:
+    """
+    Otvorí stĺpcový export meraní (pole je namapované do pamäte, len na čítanie)
+
+    Raises:
+        FileNotFoundError: Ak export neexistuje
+    """
+    output_dir = Path(data_dir) / COLUMNAR_DIR_NAME
+    state = _load_state(output_dir)
+    if state is None:
+        raise FileNotFoundError(f"Stĺpcový export v {output_dir} neexistuje")
+    array = np.load(output_dir / MEASUREMENTS_FILE, mmap_mode='r')
+    return ColumnarMeasurements(array, state['sections'], state['image_names'])
+
+
+if __name__ == "__main__":
+    from renemaPhotos import RoofAnalysisServer
+
+    parser = argparse.ArgumentParser(description="Stĺpcový export meraní (NumPy, voliteľne Parquet)")
+    parser.add_argument("data_dir", help="Adresár s výsledkami analýzy")
+    parser.add_argument("--full", action="store_true", help="Zapísať celý export znova")
+    parser.add_argument("--parquet", action=argparse.BooleanOptionalAction, default=None,
+                        help="Zapísať aj measurements.parquet (predvolene, ak je nainštalovaný pyarrow)")
+    args = parser.parse_args()
+
+    server = RoofAnalysisServer(args.data_dir)
+    try:
+        result = server.export_columnar(full=args.full, parquet=args.parquet)
+    finally:
+        server.close()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
@@ -0,0 +1,155 @@
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
+
+# EXIF tagy s časovými pečiatkami
+TAG_DATETIME = 0x0132            # IFD0 DateTime (PIL tag 306)
+TAG_EXIF_IFD_POINTER = 0x8769
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_DATETIME_DIGITIZED = 0x9004
+
+_TAG_NAMES = {
+    TAG_DATETIME: 'DateTime',
+    TAG_DATETIME_ORIGINAL: 'DateTimeOriginal',
+    TAG_DATETIME_DIGITIZED: 'DateTimeDigitized'
+}
+
+_ASCII = 2
+_LONG = 4
+
+# Markery bez dĺžky (SOI, EOI, RSTn, TEM)
+_STANDALONE_MARKERS = {0xD8, 0xD9, 0x01} | set(range(0xD0, 0xD8))
+_SOS = 0xDA
+_APP1 = 0xE1
+
+
+def _read_exact(f: BinaryIO, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("Neočakávaný koniec súboru")
+    return data
+
+
+def _find_exif_segment(f: BinaryIO) -> Optional[bytes]:
+    """
+    Prejde markery JPEG hlavičky a vráti obsah APP1 segmentu s EXIF dátami
+
+    Číta iba hlavičky segmentov; obrazové dáta (za SOS) sa nečítajú vôbec.
+    """
+    if _read_exact(f, 2) != b'\xff\xd8':
+        raise ValueError("Súbor nie je JPEG")
+
+    while True:
+        byte = _read_exact(f, 1)
+        if byte != b'\xff':
+            raise ValueError("Poškodená štruktúra JPEG")
+        marker = _read_exact(f, 1)[0]
+        while marker == 0xFF:  # výplňové bajty
+            marker = _read_exact(f, 1)[0]
+        if marker in _STANDALONE_MARKERS:
+            continue
+        if marker == _SOS or marker == 0xD9:
+            return None
+
+        length = struct.unpack('>H', _read_exact(f, 2))[0]
+        if length < 2:
+            raise ValueError("Poškodená dĺžka segmentu JPEG")
+        if marker == _APP1:
+            payload = _read_exact(f, length - 2)
+            if payload.startswith(b'Exif\x00\x00'):
+                return payload[6:]
+        else:
+            f.seek(length - 2, 1)
+
+
+def _parse_ifd(tiff: bytes, offset: int, endian: str) -> Dict[int, Union[str, int]]:
+    """Načíta z IFD len tagy s časovými pečiatkami a ukazovateľ na EXIF IFD"""
+    if offset + 2 > len(tiff):
+        raise ValueError("Neplatný ukazovateľ IFD")
+    count = struct.unpack_from(f'{endian}H', tiff, offset)[0]
+    values = {}
+    for i in range(count):
+        entry = offset + 2 + i * 12
+        if entry + 12 > len(tiff):
+            break
+        tag, value_type, value_count = struct.unpack_from(f'{endian}HHI', tiff, entry)
+        if tag == TAG_EXIF_IFD_POINTER and value_type == _LONG:
+            values[tag] = struct.unpack_from(f'{endian}I', tiff, entry + 8)[0]
+        elif tag in _TAG_NAMES and value_type == _ASCII:
+            if value_count <= 4:
+                raw = tiff[entry + 8:entry + 8 + value_count]
+            else:
+                value_offset = struct.unpack_from(f'{endian}I', tiff, entry + 8)[0]
+                raw = tiff[value_offset:value_offset + value_count]
+            values[tag] = raw.split(b'\x00', 1)[0].decode('ascii', errors='replace').strip()
+    return values
+
+
+def parse_exif_datetimes(exif: bytes) -> Dict[str, str]:
+    """Vyberie časové pečiatky z TIFF štruktúry EXIF segmentu"""
+    byte_order = exif[:2]
+    if byte_order == b'II':
+        endian = '<'
+    elif byte_order == b'MM':
+        endian = '>'
+    else:
+        raise ValueError("Neplatné poradie bajtov v EXIF")
+    magic, ifd0_offset = struct.unpack_from(f'{endian}HI', exif, 2)
+    if magic != 42:
+        raise ValueError("Neplatná TIFF hlavička v EXIF")
+
+    found = _parse_ifd(exif, ifd0_offset, endian)
+    exif_ifd_offset = found.pop(TAG_EXIF_IFD_POINTER, None)
+    if exif_ifd_offset is not None:
+        exif_values = _parse_ifd(exif, exif_ifd_offset, endian)
+        exif_values.pop(TAG_EXIF_IFD_POINTER, None)
+        for tag, value in exif_values.items():
+            found.setdefault(tag, value)
+    return {_TAG_NAMES[tag]: value for tag, value in found.items()}
+
+
+def read_exif_datetimes(file_path: Path) -> Optional[Dict[str, str]]:
+    """
+    Prečíta časové pečiatky (DateTime, DateTimeOriginal, DateTimeDigitized) z JPEG súboru
+
+    Číta len hlavičku súboru po APP1 segment – nedekóduje obrázok a
+    nevytvára kompletný slovník EXIF tagov.
+
+    Returns:
+        Slovník nájdených pečiatok (môže byť prázdny) alebo None, ak súbor nemá EXIF dáta
+
+    Raises:
+        ValueError: Ak súbor nie je platný JPEG alebo je EXIF poškodený
+    """
+    with open(file_path, 'rb') as f:
+        exif = _find_exif_segment(f)
+    if exif is None:
+        return None
+    try:
+        return parse_exif_datetimes(exif)
+    except struct.error:
+        raise ValueError("Poškodené EXIF dáta")
+
+
+def read_exif_datetimes_batch(paths: List[Path], max_workers: int = 8
+                              ) -> List[Tuple[Path, Optional[Dict[str, str]], Optional[Exception]]]:
+    """
+    Prečíta časové pečiatky mnohých súborov paralelne vo vláknach
+
+    Vhodné pre sieťové disky, kde prevažuje čakanie na I/O. Výsledky sú
+    v poradí vstupných ciest.
+
+    Returns:
+        Trojice (cesta, pečiatky alebo None, výnimka alebo None)
+    """
+    def read(path: Path):
+        try:
+            return path, read_exif_datetimes(path), None
+        except Exception as e:
+            return path, None, e
+
+    if max_workers <= 1:
+        return [read(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(read, paths))
@@ -0,0 +1,175 @@
+import hashlib
+import os
+from pathlib import Path, PurePosixPath, PureWindowsPath
+from typing import Dict, Optional, Set
+
+try:
+    import xxhash
+except ImportError:  # xxhash je voliteľný, inak sa použije blake2b zo štandardnej knižnice
+    xxhash = None
+
+# Veľkosť bloku pri streamovanom hashovaní (1 MB namiesto pôvodných 4 KB)
+HASH_BUFFER_SIZE = 1024 * 1024
+
+DEFAULT_HASH_ALGORITHM = 'xxh3_128' if xxhash is not None else 'blake2b'
+
+
+def _new_hasher(algorithm: str):
+    """Vytvorí hasher pre daný algoritmus"""
+    if algorithm == 'xxh3_128':
+        if xxhash is None:
+            raise ValueError("Algoritmus xxh3_128 vyžaduje balík xxhash")
+        return xxhash.xxh3_128()
+    if algorithm == 'blake2b':
+        return hashlib.blake2b(digest_size=16)
+    if algorithm == 'md5':
+        return hashlib.md5()
+    raise ValueError(f"Nepodporovaný hashovací algoritmus: {algorithm}")
+
+
+def split_hash(value: str):
+    """Rozdelí uložený hash vo formáte 'algoritmus:hex' (staré záznamy sú čisté MD5)"""
+    if ':' in value:
+        algorithm, digest = value.split(':', 1)
+        return algorithm, digest
+    return 'md5', value
+
+
+def hash_bytes(data: bytes, algorithm: str = DEFAULT_HASH_ALGORITHM) -> str:
+    """Vypočíta hash obsahu v pamäti vo formáte 'algoritmus:hex'"""
+    hasher = _new_hasher(algorithm)
+    hasher.update(data)
+    return f"{algorithm}:{hasher.hexdigest()}"
+
+
+def hash_file(file_path: Path, algorithm: str = DEFAULT_HASH_ALGORITHM) -> str:
+    """Vypočíta hash súboru streamovaním po veľkých blokoch"""
+    hasher = _new_hasher(algorithm)
+    buffer = bytearray(HASH_BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(file_path, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            hasher.update(view[:n])
+    return f"{algorithm}:{hasher.hexdigest()}"
+
+
+def file_fingerprint(file_path: Path, stat: Optional[os.stat_result] = None) -> Dict:
+    """Získa odtlačok súboru (veľkosť, mtime v ns a hash) s jediným volaním stat"""
+    if stat is None:
+        stat = os.stat(file_path)
+    return {
+        'hash': hash_file(file_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns
+    }
+
+
+class FileFingerprintIndex:
+    """
+    Index odtlačkov analyzovaných súborov
+
+    Záznamy sú kľúčované cestou relatívnou k adresáru s fotografiami
+    (vo formáte POSIX), takže index nezávisí od disku ani operačného systému.
+    Zmena sa zisťuje najprv podľa veľkosti a mtime; hash sa počíta len vtedy,
+    keď sa mtime líši pri rovnakej veľkosti.
+    """
+
+    def __init__(self, entries: Dict[str, Dict]):
+        """
+        Args:
+            entries: Slovník záznamov (zdieľaný s metadátami, do ktorých sa ukladá)
+        """
+        self.entries = entries
+        self.hashes_computed = 0
+        # Zmenené a odstránené kľúče od posledného uloženia
+        self.dirty: Set[str] = set()
+        self.removed: Set[str] = set()
+
+    @staticmethod
+    def relative_key(file_path: Path, photos_dir: Path) -> str:
+        """Vráti kľúč záznamu – cestu relatívnu k adresáru s fotografiami"""
+        return Path(file_path).relative_to(photos_dir).as_posix()
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self.entries.get(key)
+
+    def update(self, key: str, fingerprint: Dict):
+        """Uloží odtlačok súboru"""
+        self.entries[key] = fingerprint
+        self.dirty.add(key)
+        self.removed.discard(key)
+
+    def mark_saved(self):
+        """Označí všetky zmeny ako uložené"""
+        self.dirty.clear()
+        self.removed.clear()
+
+    def needs_analysis(self, key: str, file_path: Path) -> bool:
+        """Určí, či sa súbor zmenil od poslednej analýzy"""
+        stored = self.entries.get(key)
+        if stored is None:
+            return True
+
+        stat = os.stat(file_path)
+        if stat.st_size != stored['size']:
+            return True
+        if stat.st_mtime_ns == stored.get('mtime_ns'):
+            return False
+
+        # Rovnaká veľkosť, iný mtime – rozhodne obsah. Porovnáva sa tým istým
+        # algoritmom, akým bol hash uložený (staré záznamy používajú MD5).
+        algorithm, stored_digest = split_hash(stored['hash'])
+        _, current_digest = split_hash(hash_file(file_path, algorithm))
+        self.hashes_computed += 1
+        if current_digest != stored_digest:
+            return True
+
+        # Obsah sa nezmenil (napr. kópia alebo touch) – obnovíme mtime a hash
+        stored['mtime_ns'] = stat.st_mtime_ns
+        stored.pop('mtime', None)
+        if algorithm != DEFAULT_HASH_ALGORITHM:
+            stored['hash'] = hash_file(file_path)
+        self.dirty.add(key)
+        return False
+
+    def migrate_absolute_keys(self, photos_dir: Path) -> int:
+        """
+        Prevedie staré záznamy s absolútnymi cestami na relatívne kľúče
+
+        Cesta sa najprv skúsi vyjadriť relatívne k photos_dir; ak adresár
+        medzitým zmenil umiestnenie (napr. Windows disk -> Linux share),
+        použije sa časť cesty za posledným výskytom názvu adresára s fotkami.
+
+        Returns:
+            Počet prevedených záznamov
+        """
+        photos_dir = Path(photos_dir)
+        migrated = 0
+        for key in list(self.entries):
+            path_type = PureWindowsPath if '\\' in key or PureWindowsPath(key).drive else PurePosixPath
+            legacy_path = path_type(key)
+            if not legacy_path.is_absolute():
+                continue
+
+            relative = None
+            try:
+                relative = legacy_path.relative_to(path_type(photos_dir))
+            except ValueError:
+                parts = legacy_path.parts
+                if photos_dir.name in parts:
+                    index = len(parts) - 1 - parts[::-1].index(photos_dir.name)
+                    relative = PurePosixPath(*parts[index + 1:]) if index + 1 < len(parts) else None
+            if relative is None:
+                continue
+
+            entry = self.entries.pop(key)
+            self.dirty.discard(key)
+            self.removed.add(key)
+            if 'mtime' in entry and 'mtime_ns' not in entry:
+                entry['mtime_ns'] = int(round(entry.pop('mtime') * 1e9))
+            self.update(PurePosixPath(*relative.parts).as_posix(), entry)
+            migrated += 1
+        return migrated
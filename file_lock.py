@@ -0,0 +1,97 @@
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# Zámok adresára s dátami – analýzu (zápis meraní a heat máp) smie naraz robiť len jeden proces
+ANALYSIS_LOCK_NAME = ".analysis.lock"
+
+
+class LockTimeout(Exception):
+    """Zámok sa nepodarilo získať v danom čase"""
+
+
+class FileLock:
+    """
+    Výlučný zámok medzi procesmi nad súborom (flock, na Windows msvcrt.locking)
+
+    Zámok drží otvorený deskriptor – ak proces skončí (aj pádom), systém
+    zámok uvoľní, takže nezostávajú visiace zámky. Na Linuxe sa zámok
+    vylučuje aj medzi dvoma inštanciami v jednom procese.
+    """
+
+    def __init__(self, path, poll_interval: float = 0.1):
+        self.path = Path(path)
+        self.poll_interval = poll_interval
+        self._fd: Optional[int] = None
+
+    @property
+    def locked(self) -> bool:
+        return self._fd is not None
+
+    def _try_lock(self, fd: int) -> bool:
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self, blocking: bool = True, timeout: Optional[float] = None) -> bool:
+        """
+        Získa zámok
+
+        Args:
+            blocking: Čakať, kým zámok uvoľní iný proces
+            timeout: Najdlhšie čakanie v sekundách (None = bez obmedzenia)
+
+        Returns:
+            True, ak bol zámok získaný; False pri blocking=False a obsadenom zámku
+
+        Raises:
+            LockTimeout: Ak sa zámok nepodarilo získať do uplynutia timeoutu
+        """
+        if self._fd is not None:
+            raise RuntimeError(f"Zámok {self.path} je už získaný")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._try_lock(fd):
+            if not blocking:
+                os.close(fd)
+                return False
+            if deadline is not None and time.monotonic() >= deadline:
+                os.close(fd)
+                raise LockTimeout(f"Zámok {self.path} sa nepodarilo získať za {timeout} s")
+            time.sleep(self.poll_interval)
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self) -> 'FileLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
@@ -0,0 +1,301 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from heatmap_store import HeatMapStore
+
+# Kontrolné body farebných máp (x, hodnota) pre kanály R, G, B – zhodné s matplotlib
+_COLORMAP_SEGMENTS = {
+    'hot': (
+        ((0.0, 0.0416), (0.365079, 1.0), (1.0, 1.0)),
+        ((0.0, 0.0), (0.365079, 0.0), (0.746032, 1.0), (1.0, 1.0)),
+        ((0.0, 0.0), (0.746032, 0.0), (1.0, 1.0)),
+    ),
+    'gray': (
+        ((0.0, 0.0), (1.0, 1.0)),
+        ((0.0, 0.0), (1.0, 1.0)),
+        ((0.0, 0.0), (1.0, 1.0)),
+    ),
+}
+
+_MIMETYPES = {'png': 'image/png', 'webp': 'image/webp'}
+
+DEFAULT_TILE_SIZE = 256
+
+# Podadresár úložiska heat máp s diskovou cache vykreslených obrázkov
+RENDER_CACHE_DIR_NAME = "render_cache"
+
+# Najväčšia veľkosť diskovej cache vykreslených obrázkov (pri prekročení sa mažú najdlhšie nepoužité)
+DEFAULT_RENDER_CACHE_BYTES = int(os.environ.get("ROOF_RENDER_CACHE_BYTES", 256 * 1024 * 1024))
+
+
+def build_colormap_lut(name: str) -> np.ndarray:
+    """Vytvorí tabuľku 256x3 (BGR, uint8) pre farebnú mapu"""
+    if name not in _COLORMAP_SEGMENTS:
+        raise ValueError(f"Nepodporovaná farebná mapa: {name}")
+    x = np.linspace(0.0, 1.0, 256)
+    channels = []
+    for segments in _COLORMAP_SEGMENTS[name]:
+        xp, fp = zip(*segments)
+        channels.append(np.interp(x, xp, fp))
+    rgb = np.rint(np.stack(channels, axis=1) * 255).astype(np.uint8)
+    # OpenCV kóduje obrázky v poradí BGR
+    return np.ascontiguousarray(rgb[:, ::-1])
+
+
+_LUTS = {name: build_colormap_lut(name) for name in _COLORMAP_SEGMENTS}
+
+
+@dataclass(frozen=True)
+class RenderParams:
+    """Parametre vykreslenia heat mapy"""
+    cmap: str = 'hot'
+    max_size: Optional[int] = None
+    tile: Optional[Tuple[int, int]] = None
+    tile_size: int = DEFAULT_TILE_SIZE
+    fmt: str = 'png'
+
+    @classmethod
+    def from_args(cls, args) -> 'RenderParams':
+        """
+        Vytvorí parametre z query parametrov požiadavky
+
+        Raises:
+            ValueError: Pri neplatných parametroch
+        """
+        cmap = args.get('cmap', 'hot')
+        fmt = args.get('format', 'png').lower()
+        if cmap not in _LUTS:
+            raise ValueError(f"Nepodporovaná farebná mapa: {cmap}")
+        if fmt not in _MIMETYPES:
+            raise ValueError(f"Nepodporovaný formát: {fmt}")
+        max_size = int(args['size']) if args.get('size') else None
+        if max_size is not None and max_size <= 0:
+            raise ValueError("Parameter size musí byť kladný")
+        tile = None
+        if args.get('tile'):
+            row, col = (int(v) for v in args['tile'].split(','))
+            tile = (row, col)
+        tile_size = int(args.get('tile_size', DEFAULT_TILE_SIZE))
+        if tile_size <= 0:
+            raise ValueError("Parameter tile_size musí byť kladný")
+        return cls(cmap=cmap, max_size=max_size, tile=tile, tile_size=tile_size, fmt=fmt)
+
+    @property
+    def mimetype(self) -> str:
+        return _MIMETYPES[self.fmt]
+
+    def cache_token(self) -> str:
+        return f"{self.cmap}|{self.max_size}|{self.tile}|{self.tile_size}|{self.fmt}"
+
+
+def render_heat_map(frame: np.ndarray, params: RenderParams) -> bytes:
+    """
+    Vykreslí heat mapu farebnou mapou cez LUT a zakóduje ju do PNG/WebP
+
+    Nepoužíva matplotlib ani globálny stav, takže je bezpečné volať ju
+    súčasne z viacerých vlákien.
+    """
+    # OpenCV sa načíta až pri prvom vykreslení – import modulu ostáva ľahký pre štart servera
+    import cv2
+
+    if frame.dtype == np.uint16:
+        frame = (frame >> 8).astype(np.uint8)
+    elif frame.dtype != np.uint8:
+        frame = np.rint(np.clip(frame, 0.0, 1.0) * 255).astype(np.uint8)
+
+    if params.max_size is not None:
+        height, width = frame.shape
+        factor = params.max_size / max(height, width)
+        if factor < 1.0:
+            size = (max(1, round(width * factor)), max(1, round(height * factor)))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+    if params.tile is not None:
+        row, col = params.tile
+        top, left = row * params.tile_size, col * params.tile_size
+        if row < 0 or col < 0 or top >= frame.shape[0] or left >= frame.shape[1]:
+            raise ValueError(f"Dlaždica {row},{col} je mimo heat mapy")
+        frame = frame[top:top + params.tile_size, left:left + params.tile_size]
+
+    colored = _LUTS[params.cmap][frame]
+    ok, encoded = cv2.imencode(f".{params.fmt}", colored)
+    if not ok:
+        raise ValueError(f"Nepodarilo sa zakódovať obrázok do formátu {params.fmt}")
+    return encoded.tobytes()
+
+
+def frame_version_tag(frame_version: str) -> str:
+    """Krátky identifikátor verzie snímky – predpona súborov diskovej cache"""
+    return hashlib.blake2b(frame_version.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _cached_files(cache_dir: Path) -> List[os.DirEntry]:
+    try:
+        with os.scandir(cache_dir) as entries:
+            return [entry for entry in entries if entry.is_file() and not entry.name.endswith('.tmp')]
+    except FileNotFoundError:
+        return []
+
+
+def prune_render_cache(cache_dir: Path, live_versions: Iterable[str], dry_run: bool = False) -> Dict:
+    """
+    Odstráni z diskovej cache obrázky snímok, ktoré už v úložisku nie sú
+
+    Po opätovnej analýze má snímka novú verziu (HeatMapStore.frame_version),
+    takže obrázky starej verzie by sa už nikdy nepoužili.
+
+    Args:
+        cache_dir: Adresár diskovej cache (heat_maps/render_cache)
+        live_versions: Verzie snímok, ktoré sú v úložisku
+        dry_run: Len spočítať, čo by sa odstránilo
+
+    Returns:
+        Počet odstránených obrázkov a uvoľnené bajty
+    """
+    live_tags = {frame_version_tag(version) for version in live_versions}
+    removed, freed = 0, 0
+    for entry in _cached_files(Path(cache_dir)):
+        if entry.name.split('-', 1)[0] in live_tags:
+            continue
+        size = entry.stat().st_size
+        if not dry_run:
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                continue
+        removed += 1
+        freed += size
+    return {'renders_removed': removed, 'render_bytes_freed': freed}
+
+
+class HeatMapRenderer:
+    """
+    Vykresľovanie heat máp s LRU pamäťovou a diskovou cache
+
+    Kľúč cache tvorí verzia snímky v úložisku (kontajner a pozícia, resp.
+    veľkosť a mtime starého .npy) spolu s parametrami vykreslenia, takže po
+    opätovnej analýze fotografie sa automaticky použije nový obrázok.
+
+    Disková cache má limit max_disk_bytes; pri prekročení sa zmažú najdlhšie
+    nepoužité obrázky (podľa mtime, ktorý sa pri každom použití obnoví).
+    Súbory majú v názve predponu verzie snímky, takže obrázky starých verzií
+    odstráni result_cache.collect_garbage (prune_render_cache).
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None, max_memory_bytes: int = 64 * 1024 * 1024,
+                 max_disk_bytes: int = DEFAULT_RENDER_CACHE_BYTES):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._memory_bytes = 0
+        # Odhad veľkosti diskovej cache (None = ešte nezistená); presne sa prepočíta pri mazaní
+        self._disk_bytes: Optional[int] = None
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'renders': 0, 'disk_evictions': 0}
+
+    @staticmethod
+    def etag(frame_version: str, params: RenderParams) -> str:
+        """ETag odvodený z verzie snímky a parametrov vykreslenia"""
+        token = f"{frame_version}|{params.cache_token()}".encode('utf-8')
+        return hashlib.blake2b(token, digest_size=16).hexdigest()
+
+    def _cache_file(self, frame_version: str, etag: str, fmt: str) -> Path:
+        return self.cache_dir / f"{frame_version_tag(frame_version)}-{etag}.{fmt}"
+
+    def _store_on_disk(self, cached_file: Path, body: bytes):
+        """Zapíše obrázok do diskovej cache a pri prekročení limitu zmaže najdlhšie nepoužité"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = cached_file.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_file.write_bytes(body)
+        tmp_file.replace(cached_file)
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(entry.stat().st_size for entry in _cached_files(self.cache_dir))
+            else:
+                self._disk_bytes += len(body)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        """Zmaže najdlhšie nepoužité obrázky, kým cache neklesne na 90 % limitu (volá sa pod zámkom)"""
+        files = []
+        for entry in _cached_files(self.cache_dir):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        target = self.max_disk_bytes * 0.9
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.stats['disk_evictions'] += 1
+        self._disk_bytes = total
+
+    def _remember(self, etag: str, body: bytes):
+        with self._lock:
+            if etag in self._memory:
+                self._memory.move_to_end(etag)
+                return
+            self._memory[etag] = body
+            self._memory_bytes += len(body)
+            while self._memory_bytes > self.max_memory_bytes and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def get(self, frame_version: str, etag: str, fmt: str) -> Optional[bytes]:
+        """Vráti vykreslený obrázok z pamäťovej alebo diskovej cache"""
+        with self._lock:
+            body = self._memory.get(etag)
+            if body is not None:
+                self._memory.move_to_end(etag)
+                self.stats['memory_hits'] += 1
+                return body
+
+        if self.cache_dir:
+            cached_file = self._cache_file(frame_version, etag, fmt)
+            try:
+                body = cached_file.read_bytes()
+                # Obnovený mtime chráni často používané obrázky pred vymazaním (LRU)
+                os.utime(cached_file)
+            except FileNotFoundError:
+                body = None
+            if body is not None:
+                self._remember(etag, body)
+                with self._lock:
+                    self.stats['disk_hits'] += 1
+                return body
+        return None
+
+    def render(self, store: HeatMapStore, key: str, params: RenderParams,
+               frame_version: Optional[str] = None) -> bytes:
+        """Vráti vykreslenú heat mapu – z cache alebo novým vykreslením"""
+        if frame_version is None:
+            frame_version = store.frame_version(key)[0]
+        etag = self.etag(frame_version, params)
+        body = self.get(frame_version, etag, params.fmt)
+        if body is not None:
+            return body
+
+        body = render_heat_map(store.load(key, dequantize=False), params)
+        with self._lock:
+            self.stats['renders'] += 1
+        self._remember(etag, body)
+        if self.cache_dir:
+            self._store_on_disk(self._cache_file(frame_version, etag, params.fmt), body)
+        return body
@@ -0,0 +1,382 @@
+import os
+import sqlite3
+import time
+import zlib
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+HEAT_MAP_INDEX_NAME = "index.sqlite3"
+CONTAINER_SUFFIX = ".hmc"
+
+# Úroveň zlib kompresie – nízka úroveň je rýchla a pri uint8 dátach stačí
+COMPRESSION_LEVEL = 3
+
+_QUANT_DTYPES = {'uint8': np.uint8, 'uint16': np.uint16}
+
+# Stĺpce umiestnenia snímky v kontajneri (deskriptor, na ktorý odkazuje aj cache výsledkov)
+FRAME_FIELDS = ('container', 'offset', 'length', 'height', 'width', 'dtype', 'scale')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS frames (
+    key TEXT PRIMARY KEY,
+    section TEXT NOT NULL,
+    date TEXT NOT NULL,
+    container TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    dtype TEXT NOT NULL,
+    scale REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_frames_section_date ON frames (section, date);
+"""
+
+
+@dataclass
+class EncodedHeatMap:
+    """Kvantizovaná a skomprimovaná heat mapa pripravená na zápis do kontajnera"""
+    data: bytes
+    height: int
+    width: int
+    dtype: str
+    scale: float
+
+
+def encode_heat_map(heat_map: np.ndarray, dtype: str = 'uint8') -> EncodedHeatMap:
+    """
+    Kvantizuje heat mapu s hodnotami 0..1 na uint8/uint16 a skomprimuje ju
+
+    Volá sa v procesoch analýzy, aby sa kompresia rozložila na všetky jadrá.
+    Heat mapa, ktorá je už v celočíselnom type, sa ukladá bez zmeny.
+    """
+    if heat_map.dtype.kind in 'ui':
+        quantized = heat_map
+        dtype = heat_map.dtype.name
+        scale = 1.0 / np.iinfo(heat_map.dtype).max
+    else:
+        max_value = np.iinfo(_QUANT_DTYPES[dtype]).max
+        quantized = np.rint(np.clip(heat_map, 0.0, 1.0) * max_value).astype(_QUANT_DTYPES[dtype])
+        scale = 1.0 / max_value
+    data = zlib.compress(np.ascontiguousarray(quantized).tobytes(), COMPRESSION_LEVEL)
+    return EncodedHeatMap(data, quantized.shape[0], quantized.shape[1], dtype, scale)
+
+
+class HeatMapStack(Sequence):
+    """Lenivý zásobník heat máp – snímka sa načíta až pri prístupe k nej"""
+
+    def __init__(self, store: 'HeatMapStore', keys: List[str], dequantize: bool = True):
+        self.store = store
+        self.keys = list(keys)
+        self.dequantize = dequantize
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return HeatMapStack(self.store, self.keys[index], self.dequantize)
+        return self.store.load(self.keys[index], dequantize=self.dequantize)
+
+    def to_array(self) -> np.ndarray:
+        """Načíta všetky snímky do jedného poľa (N, H, W)"""
+        return np.stack([self[i] for i in range(len(self))]) if self.keys else np.empty((0, 0, 0))
+
+
+class HeatMapStore:
+    """
+    Úložisko heat máp v skomprimovaných denných kontajneroch
+
+    Každá dvojica (sekcia, deň) má jeden kontajner <sekcia>/<dátum>.hmc, do
+    ktorého sa snímky iba pripájajú. SQLite index mapuje kľúč heat mapy na
+    kontajner, pozíciu a rozmery, takže jednu snímku je možné načítať bez
+    čítania ostatných. Staré súbory <kľúč>.npy ostávajú čitateľné.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.root / HEAT_MAP_INDEX_NAME), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def checkpoint(self, truncate: bool = False):
+        """Prenesie zápisy indexu z WAL žurnálu do hlavného súboru"""
+        mode = 'TRUNCATE' if truncate else 'PASSIVE'
+        self.conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+
+    @staticmethod
+    def key_for(section_name: str, image_stem: str) -> str:
+        """Kľúč heat mapy (zhodný s poľom heat_map_file v meraniach)"""
+        return f"{section_name}_{image_stem}_heat_map"
+
+    @staticmethod
+    def normalize_key(key: str) -> str:
+        """Odstráni príponu .npy zo starých názvov heat máp"""
+        return key[:-len('.npy')] if key.endswith('.npy') else key
+
+    def _container_path(self, section_name: str, date_str: str) -> Path:
+        return Path(section_name) / f"{date_str}{CONTAINER_SUFFIX}"
+
+    def put_many(self, items: Iterable[Tuple[str, str, str, EncodedHeatMap]]) -> Dict[str, Dict]:
+        """
+        Zapíše heat mapy do denných kontajnerov
+
+        Args:
+            items: Štvorice (kľúč, sekcia, dátum, zakódovaná heat mapa)
+
+        Returns:
+            Deskriptory zapísaných snímok (pozri FRAME_FIELDS) podľa kľúča
+        """
+        by_container: Dict[Path, List] = {}
+        for key, section_name, date_str, encoded in items:
+            container = self._container_path(section_name, date_str)
+            by_container.setdefault(container, []).append((key, section_name, date_str, encoded))
+
+        rows = []
+        for container, frames in by_container.items():
+            path = self.root / container
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'ab') as f:
+                offset = f.tell()
+                for key, section_name, date_str, encoded in frames:
+                    f.write(encoded.data)
+                    rows.append((key, section_name, date_str, container.as_posix(), offset,
+                                 len(encoded.data), encoded.height, encoded.width,
+                                 encoded.dtype, encoded.scale))
+                    offset += len(encoded.data)
+                f.flush()
+                os.fsync(f.fileno())
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO frames (key, section, date, container, offset, length, "
+                "height, width, dtype, scale) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return {row[0]: dict(zip(FRAME_FIELDS, row[3:])) for row in rows}
+
+    def link_many(self, items: Iterable[Tuple[str, str, str, Dict]]):
+        """
+        Zaregistruje kľúče, ktoré odkazujú na už uloženú snímku (bez kopírovania dát)
+
+        Používa sa pri výsledkoch z cache – rovnaká fotografia v inej sekcii
+        alebo na inej ceste zdieľa jednu skomprimovanú heat mapu.
+
+        Args:
+            items: Štvorice (kľúč, sekcia, dátum, deskriptor snímky)
+        """
+        rows = [(key, section_name, date_str, *(frame[field] for field in FRAME_FIELDS))
+                for key, section_name, date_str, frame in items]
+        if not rows:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO frames (key, section, date, container, offset, length, "
+                "height, width, dtype, scale) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def has_frame(self, frame: Dict) -> bool:
+        """Či deskriptor snímky ukazuje do existujúceho kontajnera"""
+        path = self.root / frame['container']
+        try:
+            return path.stat().st_size >= frame['offset'] + frame['length']
+        except OSError:
+            return False
+
+    def put(self, key: str, section_name: str, date_str: str, encoded: EncodedHeatMap):
+        self.put_many([(key, section_name, date_str, encoded)])
+
+    def _frame_row(self, key: str) -> Optional[sqlite3.Row]:
+        return self.conn.execute("SELECT * FROM frames WHERE key = ?", (key,)).fetchone()
+
+    def frame(self, key: str) -> Optional[Dict]:
+        """Deskriptor uloženej snímky (pozri FRAME_FIELDS), None ak nie je v kontajneri"""
+        row = self._frame_row(self.normalize_key(key))
+        return {field: row[field] for field in FRAME_FIELDS} if row is not None else None
+
+    def read_encoded(self, key: str) -> EncodedHeatMap:
+        """
+        Načíta snímku v skomprimovanom tvare (bez dekomprimovania, napr. na kopírovanie)
+
+        Raises:
+            KeyError: Ak snímka nie je v kontajneri
+        """
+        row = self._frame_row(self.normalize_key(key))
+        if row is None:
+            raise KeyError(key)
+        with open(self.root / row['container'], 'rb') as f:
+            f.seek(row['offset'])
+            data = f.read(row['length'])
+        return EncodedHeatMap(data, row['height'], row['width'], row['dtype'], row['scale'])
+
+    def contains(self, key: str) -> bool:
+        key = self.normalize_key(key)
+        return self._frame_row(key) is not None or (self.root / f"{key}.npy").exists()
+
+    def frame_version(self, key: str) -> Optional[Tuple[str, float]]:
+        """
+        Vráti identitu uloženej verzie snímky a čas jej zápisu (pre ETag/Last-Modified)
+
+        Po opätovnej analýze sa snímka pripojí na nové miesto kontajnera,
+        takže sa zmení aj jej verzia. Vráti None, ak heat mapa neexistuje.
+        """
+        key = self.normalize_key(key)
+        row = self._frame_row(key)
+        if row is not None:
+            mtime = (self.root / row['container']).stat().st_mtime
+            return f"{row['container']}@{row['offset']}+{row['length']}", mtime
+        legacy_path = self.root / f"{key}.npy"
+        if legacy_path.exists():
+            stat = legacy_path.stat()
+            return f"{key}.npy@{stat.st_size}:{stat.st_mtime_ns}", stat.st_mtime
+        return None
+
+    def load(self, key: str, dequantize: bool = True) -> np.ndarray:
+        """
+        Načíta jednu heat mapu
+
+        Args:
+            key: Kľúč heat mapy (alebo starý názov súboru .npy)
+            dequantize: Prevedie hodnoty späť na float32 v rozsahu 0..1
+
+        Raises:
+            KeyError: Ak heat mapa neexistuje
+        """
+        key = self.normalize_key(key)
+        row = self._frame_row(key)
+        if row is None:
+            legacy_path = self.root / f"{key}.npy"
+            if legacy_path.exists():
+                return np.load(legacy_path)
+            raise KeyError(key)
+
+        with open(self.root / row['container'], 'rb') as f:
+            f.seek(row['offset'])
+            data = zlib.decompress(f.read(row['length']))
+        frame = np.frombuffer(data, dtype=_QUANT_DTYPES[row['dtype']]).reshape(row['height'], row['width'])
+        if dequantize:
+            return frame.astype(np.float32) * np.float32(row['scale'])
+        return frame
+
+    def keys(self, section_name: Optional[str] = None, date_str: Optional[str] = None) -> List[str]:
+        """Kľúče uložených heat máp (voliteľne pre sekciu a deň), zoradené podľa kľúča"""
+        conditions, params = [], []
+        if section_name is not None:
+            conditions.append("section = ?")
+            params.append(section_name)
+        if date_str is not None:
+            conditions.append("date = ?")
+            params.append(date_str)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.conn.execute(f"SELECT key FROM frames {where} ORDER BY key", params)
+        return [row['key'] for row in rows]
+
+    def delete_keys(self, keys: Iterable[str]) -> int:
+        """
+        Odstráni záznamy heat máp z indexu (a staré súbory .npy)
+
+        Dáta v kontajneroch ostanú, kým ich neuvoľní compact().
+
+        Returns:
+            Počet odstránených heat máp
+        """
+        removed = 0
+        keys = [self.normalize_key(key) for key in keys]
+        with self.conn:
+            for key in keys:
+                removed += self.conn.execute("DELETE FROM frames WHERE key = ?", (key,)).rowcount
+        for key in keys:
+            legacy_path = self.root / f"{key}.npy"
+            if legacy_path.exists():
+                legacy_path.unlink()
+                removed += 1
+        return removed
+
+    def legacy_keys(self) -> List[str]:
+        """Kľúče heat máp uložených v starých súboroch <kľúč>.npy"""
+        return sorted(path.stem for path in self.root.glob('*.npy'))
+
+    def compact(self, extra_frames: Iterable[Dict] = (), min_dead_ratio: float = 0.25,
+                dry_run: bool = False) -> Tuple[Dict, Dict[Tuple[str, int], Tuple[str, int]], List[Path]]:
+        """
+        Uvoľní miesto po snímkach, na ktoré už nič neodkazuje
+
+        Kontajnery bez živých snímok sa zmažú. Kontajner, v ktorom nepoužité
+        snímky tvoria aspoň min_dead_ratio, sa prepíše do nového súboru
+        <dátum>.<generácia>.hmc a index sa v jednej transakcii prepne naň.
+        Pôvodný súbor sa nezmaže hneď – volajúci ho odstráni cez
+        remove_containers() až po prepísaní ostatných odkazov (cache
+        výsledkov), takže pri páde ostane každý odkaz platný.
+
+        Args:
+            extra_frames: Deskriptory snímok mimo indexu, ktoré sa musia zachovať
+            min_dead_ratio: Podiel nepoužitých bajtov, od ktorého sa kontajner prepíše
+            dry_run: Len spočíta, čo by sa uvoľnilo
+
+        Returns:
+            Trojica (štatistika, presuny {(kontajner, offset): (nový kontajner, nový offset)},
+            staré kontajnery na zmazanie)
+        """
+        live: Dict[str, Dict[int, int]] = {}
+        for row in self.conn.execute("SELECT container, offset, length FROM frames"):
+            live.setdefault(row['container'], {})[row['offset']] = row['length']
+        for frame in extra_frames:
+            live.setdefault(frame['container'], {})[frame['offset']] = frame['length']
+
+        stats = {'containers_removed': 0, 'containers_compacted': 0, 'bytes_freed': 0}
+        relocations: Dict[Tuple[str, int], Tuple[str, int]] = {}
+        obsolete: List[Path] = []
+        for path in sorted(self.root.rglob(f'*{CONTAINER_SUFFIX}')):
+            container = path.relative_to(self.root).as_posix()
+            size = path.stat().st_size
+            blobs = live.get(container)
+            if not blobs:
+                stats['containers_removed'] += 1
+                stats['bytes_freed'] += size
+                if not dry_run:
+                    path.unlink()
+                continue
+            live_bytes = sum(blobs.values())
+            if size == 0 or (size - live_bytes) / size < min_dead_ratio:
+                continue
+
+            stats['containers_compacted'] += 1
+            stats['bytes_freed'] += size - live_bytes
+            if dry_run:
+                continue
+            date_str = path.name.split('.', 1)[0]
+            new_path = path.with_name(f"{date_str}.{time.time_ns():x}{CONTAINER_SUFFIX}")
+            new_container = new_path.relative_to(self.root).as_posix()
+            with open(path, 'rb') as src, open(new_path, 'wb') as dst:
+                for offset, length in sorted(blobs.items()):
+                    src.seek(offset)
+                    relocations[(container, offset)] = (new_container, dst.tell())
+                    dst.write(src.read(length))
+                dst.flush()
+                os.fsync(dst.fileno())
+            obsolete.append(path)
+
+        if relocations:
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE frames SET container = ?, offset = ? WHERE container = ? AND offset = ?",
+                    [(new_container, new_offset, container, offset)
+                     for (container, offset), (new_container, new_offset) in relocations.items()])
+        return stats, relocations, obsolete
+
+    def remove_containers(self, paths: Iterable[Path]):
+        """Zmaže kontajnery nahradené zhutnením"""
+        for path in paths:
+            if path.exists():
+                path.unlink()
+
+    def load_stack(self, keys: List[str], dequantize: bool = True) -> HeatMapStack:
+        """Vráti lenivý zásobník heat máp v poradí kľúčov"""
+        return HeatMapStack(self, [self.normalize_key(k) for k in keys], dequantize)
@@ -0,0 +1,231 @@
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+
+# Najviac záznamov vrátených jedným dotazom
+MAX_QUERY_LIMIT = 1000
+
+# ID aktuálnej HTTP požiadavky – záznamy vytvorené počas nej ho dostanú automaticky
+current_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    'current_request_id', default=None)
+
+
+def _query_bounds(level: Optional[str], limit: int) -> Tuple[int, int]:
+    """
+    Index minimálnej úrovne a počet záznamov obmedzený na 1..MAX_QUERY_LIMIT
+
+    Raises:
+        ValueError: Pri neznámej úrovni logu
+    """
+    if level and level not in LEVELS:
+        raise ValueError(f"Neznáma úroveň logu: {level} (možnosti: {', '.join(LEVELS)})")
+    return (LEVELS.index(level) if level else 0), min(max(int(limit), 1), MAX_QUERY_LIMIT)
+
+
+@dataclass(frozen=True)
+class LogRecord:
+    """Štruktúrovaný záznam logu"""
+    seq: int
+    timestamp: float
+    level: str
+    message: str
+    job_id: Optional[str] = None
+    request_id: Optional[str] = None
+
+    @property
+    def text(self) -> str:
+        """Textová podoba záznamu v pôvodnom formáte 'HH:MM:SS: správa'"""
+        return f"{datetime.fromtimestamp(self.timestamp).strftime('%H:%M:%S')}: {self.message}"
+
+    def to_dict(self) -> Dict:
+        return {
+            'seq': self.seq,
+            'timestamp': self.timestamp,
+            'time': datetime.fromtimestamp(self.timestamp).isoformat(timespec='seconds'),
+            'level': self.level,
+            'message': self.message,
+            'job_id': self.job_id,
+            'request_id': self.request_id
+        }
+
+
+class LogStore:
+    """
+    Ohraničený, vláknovo bezpečný zásobník logov (ring buffer)
+
+    Každý záznam má rastúce poradové číslo (seq), ktoré slúži ako kurzor –
+    klient si vyžiada len záznamy novšie ako posledný, ktorý už má.
+    Najstaršie záznamy sa po naplnení kapacity zahadzujú.
+    """
+
+    def __init__(self, capacity: int = 10000, echo: bool = True):
+        self._records: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._next_seq = 1
+        self.echo = echo
+
+    def add(self, message: str, level: str = 'INFO', job_id: Optional[str] = None,
+            request_id: Optional[str] = None) -> LogRecord:
+        """Pridá záznam; bez explicitného request_id sa použije ID aktuálnej požiadavky"""
+        if level not in LEVELS:
+            raise ValueError(f"Neznáma úroveň logu: {level}")
+        if request_id is None:
+            request_id = current_request_id.get()
+        with self._lock:
+            record = LogRecord(self._next_seq, time.time(), level, message, job_id, request_id)
+            self._next_seq += 1
+            self._records.append(record)
+        if self.echo:
+            print(record.text)  # Pre debug účely vypíšeme log aj do konzoly
+        return record
+
+    def add_log(self, message: str, **kwargs) -> LogRecord:
+        """Kompatibilita s pôvodným LogCollector.add_log"""
+        return self.add(message, **kwargs)
+
+    def query(self, after: int = 0, limit: int = 200, job_id: Optional[str] = None,
+              request_id: Optional[str] = None, level: Optional[str] = None) -> Tuple[List[LogRecord], int]:
+        """
+        Vráti záznamy novšie ako kurzor
+
+        Args:
+            after: Poradové číslo posledného záznamu, ktorý klient už má
+            limit: Maximálny počet vrátených záznamov (1..MAX_QUERY_LIMIT)
+            job_id: Len záznamy danej úlohy
+            request_id: Len záznamy danej požiadavky
+            level: Minimálna úroveň záznamov
+
+        Returns:
+            Záznamy a kurzor pre ďalšiu požiadavku
+
+        Raises:
+            ValueError: Pri neznámej úrovni logu
+        """
+        min_level, limit = _query_bounds(level, limit)
+        with self._lock:
+            records = list(self._records)
+            next_cursor = self._next_seq - 1
+
+        # Záznamy sú zoradené podľa seq – preskočíme staršie bez prechádzania všetkých
+        if records and after >= records[0].seq:
+            records = records[after - records[0].seq + 1:]
+
+        result = []
+        for record in records:
+            if job_id is not None and record.job_id != job_id:
+                continue
+            if request_id is not None and record.request_id != request_id:
+                continue
+            if LEVELS.index(record.level) < min_level:
+                continue
+            result.append(record)
+            if len(result) >= limit:
+                next_cursor = record.seq
+                break
+        return result, next_cursor
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+
+class SqliteLogStore:
+    """
+    Zásobník logov zdieľaný medzi procesmi (SQLite v režime WAL)
+
+    Rozhranie je zhodné s LogStore, takže záznamy úlohy bežiacej v jednom
+    workeri sú viditeľné cez /api/logs v ľubovoľnom inom. Kurzorom je
+    poradové číslo riadku. Spojenie sa otvára lenivo v každom procese
+    zvlášť, aby ho pri pre-fork serveri nezdedili potomkovia.
+    """
+
+    # Staré záznamy nad kapacitu sa mažú raz za toľko zápisov
+    PRUNE_EVERY = 500
+
+    def __init__(self, db_path, capacity: int = 10000, echo: bool = True):
+        self.db_path = Path(db_path)
+        self.capacity = capacity
+        self.echo = echo
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._writes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Každý záznam je vlastná transakcia – bez fsync pri každom commite (len pri checkpointe)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS logs (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                         "timestamp REAL NOT NULL, level TEXT NOT NULL, message TEXT NOT NULL, "
+                         "job_id TEXT, request_id TEXT)")
+            conn.execute("CREATE INDEX IF NOT EXISTS logs_job ON logs (job_id, seq)")
+            conn.commit()
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def add(self, message: str, level: str = 'INFO', job_id: Optional[str] = None,
+            request_id: Optional[str] = None) -> LogRecord:
+        """Pridá záznam; bez explicitného request_id sa použije ID aktuálnej požiadavky"""
+        if level not in LEVELS:
+            raise ValueError(f"Neznáma úroveň logu: {level}")
+        if request_id is None:
+            request_id = current_request_id.get()
+        timestamp = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                cursor = conn.execute("INSERT INTO logs (timestamp, level, message, job_id, request_id) "
+                                      "VALUES (?, ?, ?, ?, ?)", (timestamp, level, message, job_id, request_id))
+                seq = cursor.lastrowid
+                self._writes += 1
+                if self._writes % self.PRUNE_EVERY == 0:
+                    conn.execute("DELETE FROM logs WHERE seq <= ?", (seq - self.capacity,))
+        record = LogRecord(seq, timestamp, level, message, job_id, request_id)
+        if self.echo:
+            print(record.text)  # Pre debug účely vypíšeme log aj do konzoly
+        return record
+
+    def add_log(self, message: str, **kwargs) -> LogRecord:
+        """Kompatibilita s pôvodným LogCollector.add_log"""
+        return self.add(message, **kwargs)
+
+    def query(self, after: int = 0, limit: int = 200, job_id: Optional[str] = None,
+              request_id: Optional[str] = None, level: Optional[str] = None) -> Tuple[List[LogRecord], int]:
+        """Vráti záznamy novšie ako kurzor (parametre ako LogStore.query)"""
+        min_level, limit = _query_bounds(level, limit)
+        conditions, params = ["seq > ?"], [after]
+        if job_id is not None:
+            conditions.append("job_id = ?")
+            params.append(job_id)
+        if request_id is not None:
+            conditions.append("request_id = ?")
+            params.append(request_id)
+        if min_level:
+            conditions.append(f"level IN ({', '.join('?' * len(LEVELS[min_level:]))})")
+            params.extend(LEVELS[min_level:])
+        with self._lock:
+            conn = self._connection()
+            last_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM logs").fetchone()[0]
+            rows = conn.execute(f"SELECT seq, timestamp, level, message, job_id, request_id FROM logs "
+                                f"WHERE {' AND '.join(conditions)} AND seq <= ? ORDER BY seq LIMIT ?",
+                                params + [last_seq, limit]).fetchall()
+        records = [LogRecord(*row) for row in rows]
+        next_cursor = records[-1].seq if len(records) >= limit else max(last_seq, after)
+        return records, next_cursor
+
+    def clear(self):
+        with self._lock:
+            with self._connection() as conn:
+                conn.execute("DELETE FROM logs")
@@ -0,0 +1,215 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Predvolené hranice košov histogramu (sekundy) – od desatín milisekundy po minúty
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class _Metric:
+    """Spoločný základ metrík s menovkami (labels)"""
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"Metrika {self.name} očakáva menovky {self.labels}, dostala {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    """Monotónne rastúce počítadlo"""
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError("Počítadlo sa nedá znížiť")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+                for key, value in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    """Hodnota, ktorá môže rásť aj klesať"""
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Histogram(_Metric):
+    """Rozdelenie pozorovaných hodnôt do kumulatívnych košov"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][index] += 1
+                    break
+            state['sum'] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Zmeria trvanie bloku with v sekundách"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return sum(state['counts']) if state else 0
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, state in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state['counts']):
+                cumulative += count
+                labels = _format_labels(self.labels, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Register metrík procesu vo formáte Prometheus (bez externých závislostí)
+
+    Metriky sa registrujú podľa mena – opakovaná registrácia vráti existujúcu
+    metriku, takže moduly ich môžu bezpečne definovať na úrovni modulu.
+    Hodnoty, ktoré sa len zisťujú (napr. veľkosť cache), sa dopĺňajú
+    v collectoroch tesne pred vykreslením.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labels: Sequence[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labels, **kwargs)
+            elif not isinstance(metric, cls) or metric.labels != tuple(labels):
+                raise ValueError(f"Metrika {name} je už registrovaná s iným typom alebo menovkami")
+            return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labels)
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labels)
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labels, buckets=buckets)
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Funkcia volaná pred každým vykreslením (nastaví gauge z aktuálneho stavu)"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Textový formát Prometheus pre endpoint /metrics"""
+        with self._lock:
+            collectors = list(self._collectors)
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        for collector in collectors:
+            collector()
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Predvolený register procesu
+REGISTRY = MetricsRegistry()
+
+# Časy jednotlivých fáz analýzy (čítanie, dekódovanie, hash, histogram, ...)
+STAGE_SECONDS = REGISTRY.histogram(
+    'roof_analysis_stage_seconds', 'Trvanie fáz analýzy fotografií v sekundách', ('stage',))
+IMAGES_TOTAL = REGISTRY.counter(
+    'roof_analysis_images_total', 'Spracované fotografie podľa výsledku', ('result',))
+BYTES_READ_TOTAL = REGISTRY.counter(
+    'roof_analysis_bytes_read_total', 'Prečítané bajty fotografií pri analýze')
+FINGERPRINT_HASHES_TOTAL = REGISTRY.counter(
+    'roof_analysis_fingerprint_hashes_total', 'Počet hashovaní súborov pri kontrole zmien')
+IMAGES_PER_SECOND = REGISTRY.histogram(
+    'roof_analysis_images_per_second', 'Priepustnosť analýzy za dávku (fotografie za sekundu)',
+    buckets=(0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000))
+
+
+def record_stage_timings(timings: Optional[Dict[str, float]]):
+    """Zaznamená časy fáz, ktoré vrátil proces analýzy"""
+    for stage, seconds in (timings or {}).items():
+        STAGE_SECONDS.observe(seconds, stage=stage)
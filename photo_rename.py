@@ -0,0 +1,77 @@
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+
+from exif_reader import read_exif_datetimes_batch
+
+# Názov premenovanej fotografie; pri zhode času sa pridá prípona _2, _3, ...
+PHOTO_NAME_FORMAT = "%Y-%m-%d-%H-%M"
+PHOTO_NAME_RE = re.compile(r"^(\d{4}-\d{2}-\d{2}-\d{2}-\d{2})(?:_(\d+))?$")
+
+def rename_photos(directory, log=None, workers=8):
+    """
+    Premenuje fotografie podľa EXIF času na RRRR-MM-DD-HH-MM.jpg
+
+    EXIF sa číta len z hlavičky súborov (bez dekódovania obrázka) vo viacerých
+    vláknach. Ak má viac fotografií rovnaký čas s presnosťou na minútu,
+    ďalšie dostanú príponu _2, _3, ... namiesto prepísania existujúceho súboru.
+
+    Args:
+        directory: Adresár s fotografiami
+        log: Funkcia pre záznamy logu (predvolene výpis na konzolu)
+        workers: Počet vlákien pre čítanie EXIF
+    """
+    log = log or (lambda message, **_: print(message))
+    directory = Path(directory)
+    renamed_count = 0
+    skipped_count = 0
+    error_count = 0
+    
+    log(f"Začínam premenovanie fotografií v adresári: {directory}")
+    
+    files = sorted(directory.glob("*.jp*g"))
+    for file_path, datetimes, error in read_exif_datetimes_batch(files, max_workers=workers):
+        try:
+            if error is not None:
+                raise error
+            if datetimes is not None:
+                date_time_str = datetimes.get("DateTime")
+                if date_time_str:
+                    dt = datetime.strptime(date_time_str, "%Y:%m:%d %H:%M:%S")
+                    base_name = dt.strftime(PHOTO_NAME_FORMAT)
+                    suffix = file_path.suffix.lower()
+                    
+                    match = PHOTO_NAME_RE.match(file_path.stem)
+                    if match and match.group(1) == base_name and file_path.suffix == suffix:
+                        log(f"Preskočený súbor (už má správny názov): {file_path.name}")
+                        skipped_count += 1
+                        continue
+                    
+                    new_path = file_path.parent / (base_name + suffix)
+                    counter = 1
+                    while new_path.exists() and not new_path.samefile(file_path):
+                        counter += 1
+                        new_path = file_path.parent / f"{base_name}_{counter}{suffix}"
+                    
+                    os.rename(file_path, new_path)
+                    if counter > 1:
+                        log(f"Rovnaký čas ako iná fotografia, pridaná prípona: {new_path.name}",
+                                      level="WARNING")
+                    log(f"Premenovaný súbor: {file_path.name} -> {new_path.name}")
+                    renamed_count += 1
+                else:
+                    log(f"Chýba časová pečiatka v EXIF dátach: {file_path.name}", level="WARNING")
+                    error_count += 1
+            else:
+                log(f"Chýbajú EXIF dáta: {file_path.name}", level="WARNING")
+                error_count += 1
+                
+        except Exception as e:
+            error_msg = f"Chyba pri spracovaní {file_path.name}: {str(e)}"
+            log(error_msg, level="WARNING")
+            error_count += 1
+
+    summary = f"Dokončené premenovanie: {renamed_count} premenovaných, {skipped_count} preskočených, {error_count} chýb"
+    log(summary)
+    return summary
@@ -0,0 +1,316 @@
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from renemaPhotos import RoofAnalysisServer
+
+# Udalosti inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+_EVENT_HEADER = struct.Struct('iIII')
+
+PHOTO_PATTERN = '*.jp*g'
+
+
+class InotifySource:
+    """
+    Rekurzívne sledovanie adresára cez Linux inotify (bez externých knižníc)
+
+    Nové podadresáre sa pridávajú do sledovania automaticky. Pri pretečení
+    fronty jadra nastaví príznak overflow – volajúci potom urobí úplný sken.
+    """
+
+    def __init__(self, root: Path):
+        libc_name = ctypes.util.find_library('c')
+        if sys.platform != 'linux' or not libc_name:
+            raise OSError("inotify nie je na tejto platforme dostupné")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 zlyhalo")
+        self.root = root
+        self._watches: Dict[int, Path] = {}
+        self.overflow = False
+        self._add_tree(root)
+
+    def _add_watch(self, directory: Path):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch zlyhalo: {directory}")
+        self._watches[wd] = directory
+
+    def _add_tree(self, directory: Path) -> List[Path]:
+        """Pridá adresár so všetkými podadresármi; vráti súbory, ktoré v nich už sú"""
+        existing = []
+        self._add_watch(directory)
+        for current, dirs, files in os.walk(directory):
+            current_path = Path(current)
+            for name in dirs:
+                self._add_watch(current_path / name)
+            existing.extend(current_path / name for name in files)
+        return existing
+
+    def read(self, timeout: float) -> Set[Path]:
+        """Počká na udalosti najviac timeout sekúnd a vráti zmenené súbory"""
+        changed: Set[Path] = set()
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return changed
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + name_len].split(b'\0', 1)[0]
+            offset += name_len
+
+            if mask & IN_Q_OVERFLOW:
+                self.overflow = True
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            directory = self._watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = directory / os.fsdecode(name)
+            if mask & IN_ISDIR:
+                # Nový alebo presunutý adresár – súbory v ňom mohli vzniknúť pred pridaním sledovania
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    try:
+                        changed.update(self._add_tree(path))
+                    except OSError:
+                        pass
+                continue
+            changed.add(path)
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingSource:
+    """Záložné sledovanie porovnávaním veľkosti a času zmeny súborov pri každom prechode"""
+
+    def __init__(self, root: Path, interval: float = 5.0):
+        self.root = root
+        self.interval = interval
+        self.overflow = False
+        self._snapshot = self._scan()
+
+    def _scan(self) -> Dict[Path, Tuple[int, int]]:
+        snapshot = {}
+        for current, _, files in os.walk(self.root):
+            for name in files:
+                path = Path(current) / name
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def read(self, timeout: float) -> Set[Path]:
+        time.sleep(min(timeout, self.interval))
+        snapshot = self._scan()
+        changed = {path for path, state in snapshot.items() if self._snapshot.get(path) != state}
+        self._snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+class PhotoWatcher:
+    """
+    Priebežný príjem nových fotografií zo sledovaného adresára
+
+    Zmenené súbory sa najprv „upokoja“ – do analýzy idú až vtedy, keď sa
+    ich veľkosť a čas zmeny nezmenili počas debounce_seconds (kamera alebo
+    kopírovanie ich už dopísali). Analyzujú sa len tieto súbory cez
+    RoofAnalysisServer.analyze_files, takže výsledky sú v API dostupné
+    niekoľko sekúnd po príchode snímky, bez opätovného prechodu celého stromu.
+    """
+
+    def __init__(self, photos_dir: str, data_dir: str, debounce_seconds: float = 2.0,
+                 poll_interval: float = 5.0, use_inotify: Optional[bool] = None,
+                 analysis_scale: int = 1, log: Optional[Callable[..., None]] = None):
+        """
+        Args:
+            photos_dir: Sledovaný adresár s podadresármi sekcií
+            data_dir: Adresár s výsledkami analýzy
+            debounce_seconds: Ako dlho sa súbor nesmie meniť, kým sa analyzuje
+            poll_interval: Interval prechodov v záložnom režime bez inotify
+            use_inotify: None = inotify ak je dostupné, inak polling
+            analysis_scale: Zmenšenie rozlíšenia pri analýze (ako v RoofAnalysisServer)
+            log: Funkcia na zápis správ (predvolene print)
+        """
+        self.photos_dir = Path(photos_dir)
+        self.data_dir = Path(data_dir)
+        self.debounce_seconds = debounce_seconds
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.analysis_scale = analysis_scale
+        self.log = log or (lambda message, **_: print(message))
+        # Súbory čakajúce na upokojenie: cesta -> ((veľkosť, mtime_ns), čas poslednej zmeny)
+        self._pending: Dict[Path, Tuple[Tuple[int, int], float]] = {}
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'files_analyzed': 0, 'files_skipped': 0, 'files_failed': 0, 'rescans': 0}
+
+    def _open_source(self):
+        if self.use_inotify is not False:
+            try:
+                source = InotifySource(self.photos_dir)
+                self.log(f"Sledujem {self.photos_dir} cez inotify")
+                return source
+            except OSError as e:
+                if self.use_inotify:
+                    raise
+                self.log(f"inotify nie je dostupné ({e}), použijem polling", level='WARNING')
+        self.log(f"Sledujem {self.photos_dir} pravidelným prechodom každých {self.poll_interval} s")
+        return PollingSource(self.photos_dir, self.poll_interval)
+
+    def _is_photo(self, path: Path) -> bool:
+        try:
+            relative = path.relative_to(self.photos_dir)
+        except ValueError:
+            return False
+        return len(relative.parts) >= 2 and fnmatch(path.name, PHOTO_PATTERN)
+
+    def _track(self, paths: Set[Path], now: float):
+        """Zaradí zmenené fotografie medzi čakajúce; každá zmena posunie čas upokojenia"""
+        for path in paths:
+            if not self._is_photo(path):
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                self._pending.pop(path, None)
+                continue
+            self._pending[path] = ((stat.st_size, stat.st_mtime_ns), now)
+
+    def _take_settled(self, now: float) -> List[Path]:
+        """Vráti súbory, ktoré sa počas debounce_seconds nezmenili"""
+        settled = []
+        for path, (state, changed_at) in list(self._pending.items()):
+            try:
+                stat = path.stat()
+            except OSError:
+                del self._pending[path]
+                continue
+            current = (stat.st_size, stat.st_mtime_ns)
+            if current != state:
+                self._pending[path] = (current, now)
+            elif stat.st_size > 0 and now - changed_at >= self.debounce_seconds:
+                settled.append(path)
+                del self._pending[path]
+        return sorted(settled)
+
+    def _ingest(self, server: RoofAnalysisServer, paths: List[Path]):
+        started = time.perf_counter()
+        result = server.analyze_files(self.photos_dir, paths)
+        for name, count in result.items():
+            self.stats[name] += count
+        if result['files_analyzed'] or result['files_failed']:
+            self.log(f"Prijaté fotografie: {result['files_analyzed']} analyzovaných, "
+                     f"{result['files_failed']} chybných ({time.perf_counter() - started:.2f} s)")
+
+    def _rescan(self, server: RoofAnalysisServer):
+        """Úplný inkrementálny prechod (pri štarte a po pretečení fronty udalostí)"""
+        self.stats['rescans'] += 1
+        server.analyze_and_store(str(self.photos_dir))
+
+    def run(self, initial_scan: bool = True):
+        """Sleduje adresár, kým sa nezavolá stop(); beží v aktuálnom vlákne"""
+        server = RoofAnalysisServer(str(self.data_dir), analysis_scale=self.analysis_scale)
+        source = self._open_source()
+        try:
+            # Sledovanie sa zapne pred úvodným prechodom, aby sa nestratili súbory prijaté počas neho
+            if initial_scan:
+                self._rescan(server)
+            while not self._stop_event.is_set():
+                timeout = self.debounce_seconds / 2 if self._pending else 1.0
+                changed = source.read(timeout)
+                if source.overflow:
+                    source.overflow = False
+                    self.log("Pretečenie fronty udalostí, robím úplný prechod", level='WARNING')
+                    self._pending.clear()
+                    try:
+                        self._rescan(server)
+                    except Exception as e:
+                        self.log(f"Chyba pri úplnom prechode po pretečení: {e}", level='ERROR')
+                    continue
+
+                now = time.monotonic()
+                self._track(changed, now)
+                settled = self._take_settled(now)
+                if settled:
+                    try:
+                        self._ingest(server, settled)
+                    except Exception as e:
+                        self.log(f"Chyba pri analýze prijatých fotografií: {e}", level='ERROR')
+        finally:
+            source.close()
+            server.close()
+
+    def start(self, initial_scan: bool = True) -> threading.Thread:
+        """Spustí sledovanie vo vlákne na pozadí"""
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, args=(initial_scan,),
+                                        name='photo-watcher', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Priebežná analýza nových fotografií strechy")
+    parser.add_argument("photos_dir", help="Sledovaný adresár s podadresármi sekcií")
+    parser.add_argument("data_dir", help="Adresár s výsledkami analýzy")
+    parser.add_argument("--debounce", type=float, default=2.0,
+                        help="Počet sekúnd bez zmeny, po ktorých sa súbor považuje za dopísaný")
+    parser.add_argument("--poll-interval", type=float, default=5.0)
+    parser.add_argument("--polling", action="store_true", help="Nepoužiť inotify")
+    parser.add_argument("--analysis-scale", type=int, default=1)
+    parser.add_argument("--no-initial-scan", action="store_true")
+    args = parser.parse_args()
+
+    watcher = PhotoWatcher(args.photos_dir, args.data_dir, debounce_seconds=args.debounce,
+                           poll_interval=args.poll_interval,
+                           use_inotify=False if args.polling else None,
+                           analysis_scale=args.analysis_scale)
+    try:
+        watcher.run(initial_scan=not args.no_initial_scan)
+    except KeyboardInterrupt:
+        print("Sledovanie ukončené")
@@ -0,0 +1,124 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Deque, Dict, Iterable, Iterator, Optional
+
+from file_index import hash_bytes
+
+# Počet súčasných čítaní – na sieťovom disku (SMB/NFS) skrýva latenciu jednotlivých požiadaviek
+DEFAULT_READS_IN_FLIGHT = int(os.environ.get("ROOF_READS_IN_FLIGHT", 8))
+# Najviac bajtov prečítaných a ešte nespracovaných – dopredu aj v dávke, ktorú práve analyzuje spotrebiteľ
+DEFAULT_PREFETCH_BYTES = int(os.environ.get("ROOF_PREFETCH_BYTES", 256 * 1024 * 1024))
+
+
+@dataclass
+class PrefetchedFile:
+    """Obsah fotografie prečítaný jediným čítaním (pre hash aj dekódovanie)"""
+    path: Path
+    data: Optional[bytes]
+    size: int
+    mtime_ns: Optional[int]
+    read_seconds: float
+    error: Optional[str] = None
+    # Hash obsahu sa počíta najviac raz – cache výsledkov aj úloha analýzy (aj v inom procese) ho zdieľajú
+    content_hash: Optional[str] = None
+
+    def fingerprint(self) -> Dict:
+        """Odtlačok súboru z prečítaných bajtov (zhodný s file_index.file_fingerprint)"""
+        if self.content_hash is None:
+            self.content_hash = hash_bytes(self.data)
+        return {'hash': self.content_hash, 'size': self.size, 'mtime_ns': self.mtime_ns}
+
+
+def read_file(path: Path) -> PrefetchedFile:
+    """
+    Prečíta celý súbor naraz; veľkosť a mtime zodpovedajú prečítanému obsahu
+
+    Chyba čítania sa nevyhadzuje, ale vráti sa v poli error, aby jedna
+    nečitateľná fotografia nezastavila celý prúd.
+    """
+    path = Path(path)
+    started = time.perf_counter()
+    try:
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            data = f.read()
+    except OSError as e:
+        return PrefetchedFile(path, None, 0, None, time.perf_counter() - started, str(e))
+    return PrefetchedFile(path, data, len(data), stat.st_mtime_ns, time.perf_counter() - started)
+
+
+class FilePrefetcher:
+    """
+    Čítanie fotografií dopredu vo vláknach s obmedzenou pamäťou
+
+    Kým procesy analýzy dekódujú jednu dávku, vlákna už čítajú ďalšie
+    súbory – najviac reads_in_flight naraz. Súbory sa vracajú v poradí
+    vstupu. Nové čítania sa spúšťajú len vtedy, keď prečítané a zatiaľ
+    nespracované súbory (odhad podľa priemernej veľkosti) nepresiahnu
+    max_buffered_bytes – ak analýza nestíha, čítanie počká (backpressure).
+
+    Do limitu sa počítajú aj vrátené súbory, kým ich spotrebiteľ neuvoľní
+    cez release() (napr. po uložení dávky), takže fronta a rozpracovaná
+    dávka spolu limit neprekročia. Aj pri vyčerpanom limite sa číta aspoň
+    reads_in_flight súborov dopredu, aby sa prúd nezastavil.
+    """
+
+    def __init__(self, reads_in_flight: int = DEFAULT_READS_IN_FLIGHT,
+                 max_buffered_bytes: int = DEFAULT_PREFETCH_BYTES):
+        if reads_in_flight < 1:
+            raise ValueError("Počet súčasných čítaní musí byť aspoň 1")
+        self.reads_in_flight = reads_in_flight
+        self.max_buffered_bytes = max_buffered_bytes
+        self._bytes_read = 0
+        self._files_read = 0
+        # Bajty vrátených súborov, ktoré spotrebiteľ ešte neuvoľnil (release)
+        self._held_bytes = 0
+
+    def _queue_limit(self) -> int:
+        """Koľko súborov môže byť prečítaných (alebo rozčítaných) dopredu"""
+        if not self._files_read:
+            return self.reads_in_flight
+        average_size = max(self._bytes_read / self._files_read, 1)
+        available = max(self.max_buffered_bytes - self._held_bytes, 0)
+        return max(self.reads_in_flight, int(available // average_size))
+
+    def release(self, files: Iterable[PrefetchedFile]):
+        """Uvoľní spracované súbory – ich bajty sa prestanú počítať do max_buffered_bytes"""
+        self._held_bytes = max(self._held_bytes - sum(f.size for f in files), 0)
+
+    def iter_files(self, paths: Iterable[Path]) -> Iterator[PrefetchedFile]:
+        """
+        Postupne vracia prečítané súbory v poradí ciest
+
+        Generátor treba dočítať alebo zatvoriť (close()) – pri zatvorení sa
+        zrušia čítania, ktoré sa ešte nezačali. Spracované súbory treba
+        uvoľniť cez release(), inak sa čítanie dopredu obmedzí na
+        reads_in_flight súborov.
+        """
+        executor = ThreadPoolExecutor(max_workers=self.reads_in_flight, thread_name_prefix='prefetch')
+        pending: Deque = deque()
+        paths = iter(paths)
+        exhausted = False
+        self._held_bytes = 0
+        try:
+            while True:
+                while not exhausted and len(pending) < self._queue_limit():
+                    path = next(paths, None)
+                    if path is None:
+                        exhausted = True
+                        break
+                    pending.append(executor.submit(read_file, path))
+                if not pending:
+                    return
+                prefetched = pending.popleft().result()
+                self._bytes_read += prefetched.size
+                self._files_read += 1
+                self._held_bytes += prefetched.size
+                yield prefetched
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            self._held_bytes = 0
@@ -0,0 +1,186 @@
+import hashlib
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+REGIONS_CONFIG_NAME = "regions.json"
+
+# Rasterizované vrstvy štítkov sa uchovávajú pre každý proces zvlášť
+# (kľúč: identita sady polygónov, rozmer obrázka a zmenšenie pri dekódovaní)
+_LABEL_CACHE: Dict[Tuple[str, Tuple[int, int], int], Tuple[np.ndarray, ...]] = {}
+_LABEL_CACHE_MAX = 64
+
+
+@dataclass
+class RegionSet:
+    """
+    Sada oblastí záujmu (polygónov) pre jednu kameru/sekciu
+
+    Súradnice polygónov sú v pixeloch obrázka s rozmerom image_size
+    (šírka, výška). Ak sa analyzuje obrázok iného rozmeru (napr. pri
+    zmenšenom dekódovaní), polygóny sa úmerne preškálujú. Oblasti sa
+    môžu prekrývať – každá sa vyhodnotí vždy na celom svojom polygóne.
+    """
+    names: List[str]
+    polygons: List[List[Tuple[float, float]]]
+    image_size: Optional[Tuple[int, int]] = None
+    key: str = field(init=False)
+
+    def __post_init__(self):
+        token = json.dumps([self.names, self.polygons, self.image_size]).encode('utf-8')
+        self.key = hashlib.blake2b(token, digest_size=12).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _polygon_mask(self, index: int, shape: Tuple[int, int], decode_scale: int) -> np.ndarray:
+        """Maska (uint8, 0/1) celého polygónu oblasti s indexom index, preškálovaného na rozmer shape"""
+        # OpenCV sa načíta až pri rasterizácii – REGIONS_CONFIG_NAME a načítanie konfigurácie ostávajú ľahké
+        import cv2
+
+        height, width = shape
+        scale_x = scale_y = 1.0 / decode_scale
+        if self.image_size is not None:
+            scale_x = width / self.image_size[0]
+            scale_y = height / self.image_size[1]
+        points = np.array([(x * scale_x, y * scale_y) for x, y in self.polygons[index]])
+        mask = np.zeros(shape, dtype=np.uint8)
+        cv2.fillPoly(mask, [np.rint(points).astype(np.int32)], 1)
+        return mask
+
+    def region_mask(self, name: str, shape: Tuple[int, int], decode_scale: int = 1) -> np.ndarray:
+        """
+        Boolovská maska celého polygónu oblasti (bez ohľadu na ostatné oblasti)
+
+        Raises:
+            KeyError: Ak sada oblasť nemá
+        """
+        if name not in self.names:
+            raise KeyError(f"Oblasť {name} nie je definovaná")
+        return self._polygon_mask(self.names.index(name), tuple(shape[:2]), decode_scale).astype(bool)
+
+    def label_layers(self, shape: Tuple[int, int], decode_scale: int = 1) -> Tuple[np.ndarray, ...]:
+        """
+        Vráti vrstvy obrázkov štítkov daného rozmeru – 0 je pozadie, i je i-tá oblasť
+
+        Oblasti, ktoré sa neprekrývajú, zdieľajú jednu vrstvu; oblasť, ktorá
+        by prekryla už zaradenú oblasť, sa zaradí do ďalšej vrstvy. Každá
+        oblasť je tak v práve jednej vrstve celým polygónom a bez prekrývania
+        stačí jediná vrstva. Výsledok sa rasterizuje raz pre každý rozmer
+        a uloží do cache.
+
+        Args:
+            shape: Rozmer analyzovaného obrázka (výška, šírka)
+            decode_scale: Zmenšenie pri dekódovaní – použije sa, ak nie je známe image_size
+        """
+        shape = tuple(shape[:2])
+        cache_key = (self.key, shape, decode_scale)
+        layers = _LABEL_CACHE.get(cache_key)
+        if layers is not None:
+            return layers
+
+        dtype = np.uint8 if len(self.names) < 255 else np.uint16
+        layers = []
+        for index in range(len(self.polygons)):
+            mask = self._polygon_mask(index, shape, decode_scale).astype(bool)
+            layer = next((layer for layer in layers if not layer[mask].any()), None)
+            if layer is None:
+                layer = np.zeros(shape, dtype=dtype)
+                layers.append(layer)
+            layer[mask] = index + 1
+        if not layers:
+            layers.append(np.zeros(shape, dtype=dtype))
+
+        if len(_LABEL_CACHE) >= _LABEL_CACHE_MAX:
+            _LABEL_CACHE.pop(next(iter(_LABEL_CACHE)))
+        for layer in layers:
+            layer.setflags(write=False)
+        layers = tuple(layers)
+        _LABEL_CACHE[cache_key] = layers
+        return layers
+
+
+def region_statistics(regions: RegionSet, gray: np.ndarray,
+                      shadow_mask: Optional[np.ndarray] = None, decode_scale: int = 1) -> List[Dict]:
+    """
+    Vypočíta štatistiky všetkých oblastí vektorizovanými prechodmi
+
+    Namiesto maskovania obrázka pre každú oblasť zvlášť sa použijú vrstvy
+    štítkov (RegionSet.label_layers) a np.bincount – súčty, súčty štvorcov
+    a počty tieňových pixelov sa spočítajú pre všetky oblasti vrstvy naraz.
+    Neprekrývajúce sa oblasti potrebujú jediný prechod.
+
+    Args:
+        regions: Sada oblastí
+        gray: Jasový obrázok (H, W)
+        shadow_mask: Voliteľná boolovská maska tieňa (H, W)
+        decode_scale: Zmenšenie, s ktorým bol obrázok dekódovaný
+
+    Returns:
+        Pre každú oblasť slovník s názvom, počtom pixelov, priemerom a
+        smerodajnou odchýlkou jasu a percentom tieňa
+    """
+    n_bins = len(regions) + 1
+    values = gray.ravel().astype(np.float64)
+    values_sq = values * values
+    shadow_values = shadow_mask.ravel() if shadow_mask is not None else None
+
+    counts = np.zeros(n_bins)
+    sums = np.zeros(n_bins)
+    sums_sq = np.zeros(n_bins)
+    shadows = np.zeros(n_bins) if shadow_values is not None else None
+    # Každá oblasť je v jedinej vrstve, takže súčet cez vrstvy je jej štatistika
+    for layer in regions.label_layers(gray.shape, decode_scale):
+        labels = layer.ravel()
+        counts += np.bincount(labels, minlength=n_bins)
+        sums += np.bincount(labels, weights=values, minlength=n_bins)
+        sums_sq += np.bincount(labels, weights=values_sq, minlength=n_bins)
+        if shadows is not None:
+            shadows += np.bincount(labels, weights=shadow_values, minlength=n_bins)
+
+    stats = []
+    for index, name in enumerate(regions.names, start=1):
+        count = int(counts[index])
+        if count == 0:
+            stats.append({'region': name, 'pixel_count': 0, 'average_brightness': None,
+                          'brightness_variation': None, 'shadow_percentage': None})
+            continue
+        mean = sums[index] / count
+        variance = max(sums_sq[index] / count - mean * mean, 0.0)
+        stats.append({
+            'region': name,
+            'pixel_count': count,
+            'average_brightness': float(mean),
+            'brightness_variation': float(np.sqrt(variance)),
+            'shadow_percentage': float(shadows[index] / count * 100) if shadows is not None else None
+        })
+    return stats
+
+
+def load_region_config(config_file: Path) -> Dict[str, RegionSet]:
+    """
+    Načíta konfiguráciu oblastí pre jednotlivé kamery/sekcie
+
+    Formát súboru:
+        {"<sekcia>": {"image_size": [šírka, výška],
+                      "regions": {"<oblasť>": [[x, y], ...], ...}}}
+    """
+    config_file = Path(config_file)
+    if not config_file.exists():
+        return {}
+    with open(config_file, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    region_sets = {}
+    for section_name, section_config in config.items():
+        regions = section_config.get('regions', {})
+        image_size = section_config.get('image_size')
+        region_sets[section_name] = RegionSet(
+            names=list(regions),
+            polygons=[[tuple(point) for point in polygon] for polygon in regions.values()],
+            image_size=tuple(image_size) if image_size else None
+        )
+    return region_sets
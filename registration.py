@@ -0,0 +1,446 @@
+import json
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from file_lock import FileLock
+from heatmap_store import HeatMapStore
+from regions import REGIONS_CONFIG_NAME, load_region_config
+from results_store import ResultsStore
+
+REGISTRATION_DIR_NAME = "registration"
+REGISTRATION_DB_NAME = "registration.sqlite3"
+
+# Parametre zarovnania snímok
+ORB_FEATURES = 2000
+MAX_MATCHES = 500
+MIN_INLIERS = 12
+RANSAC_THRESHOLD = 3.0
+# Snímka, ktorej rohy by sa posunuli o viac ako túto časť rozmeru, sa nezarovná
+MAX_CORNER_SHIFT = 0.25
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS homographies (
+    key TEXT NOT NULL,
+    reference TEXT NOT NULL,
+    matrix TEXT NOT NULL,
+    inliers INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    PRIMARY KEY (key, reference)
+);
+
+CREATE TABLE IF NOT EXISTS section_references (
+    section TEXT PRIMARY KEY,
+    heat_map_key TEXT NOT NULL,
+    key TEXT NOT NULL
+);
+"""
+
+
+def _normalization(width: int, height: int) -> np.ndarray:
+    return np.diag([1.0 / width, 1.0 / height, 1.0])
+
+
+def to_pixel_homography(normalized: np.ndarray, frame_shape: Tuple[int, int],
+                        reference_shape: Tuple[int, int]) -> np.ndarray:
+    """Prevedie homografiu z normalizovaných súradníc (0..1) na pixely daných rozmerov (výška, šírka)"""
+    frame_norm = _normalization(frame_shape[1], frame_shape[0])
+    reference_norm = _normalization(reference_shape[1], reference_shape[0])
+    return np.linalg.inv(reference_norm) @ normalized @ frame_norm
+
+
+def estimate_homography(reference_gray: np.ndarray, frame_gray: np.ndarray,
+                        reference_features: Optional[Tuple] = None) -> Tuple[Optional[np.ndarray], int]:
+    """
+    Odhadne homografiu, ktorá zobrazí snímku na referenčnú snímku (ORB + RANSAC)
+
+    Returns:
+        Homografia v normalizovaných súradniciach (0..1) alebo None, ak sa
+        snímku nepodarilo spoľahlivo zarovnať, a počet inlierov
+    """
+    orb = cv2.ORB_create(ORB_FEATURES)
+    ref_keypoints, ref_descriptors = reference_features or orb.detectAndCompute(reference_gray, None)
+    keypoints, descriptors = orb.detectAndCompute(frame_gray, None)
+    if ref_descriptors is None or descriptors is None:
+        return None, 0
+
+    matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
+    matches = sorted(matcher.match(descriptors, ref_descriptors), key=lambda m: m.distance)[:MAX_MATCHES]
+    if len(matches) < MIN_INLIERS:
+        return None, len(matches)
+
+    frame_points = np.float32([keypoints[m.queryIdx].pt for m in matches])
+    ref_points = np.float32([ref_keypoints[m.trainIdx].pt for m in matches])
+    homography, mask = cv2.findHomography(frame_points, ref_points, cv2.RANSAC, RANSAC_THRESHOLD)
+    inliers = int(mask.sum()) if mask is not None else 0
+    if homography is None or inliers < MIN_INLIERS:
+        return None, inliers
+
+    # Kontrola, že zarovnanie je len malý posun kamery, nie náhodná zhoda
+    height, width = frame_gray.shape[:2]
+    corners = np.float32([[0, 0], [width, 0], [width, height], [0, height]]).reshape(-1, 1, 2)
+    projected = cv2.perspectiveTransform(corners, homography).reshape(-1, 2)
+    ref_height, ref_width = reference_gray.shape[:2]
+    shift = np.abs(projected - corners.reshape(-1, 2) * [ref_width / width, ref_height / height])
+    if np.any(shift > MAX_CORNER_SHIFT * np.array([ref_width, ref_height])):
+        return None, inliers
+
+    normalized = (_normalization(ref_width, ref_height) @ homography
+                  @ np.linalg.inv(_normalization(width, height)))
+    return normalized / normalized[2, 2], inliers
+
+
+@dataclass
+class DayCube:
+    """
+    Zarovnané heat mapy jedného dňa sekcie ako pamäťovo mapované pole (čas, H, W)
+
+    Súradnice sú v pixeloch referenčnej snímky sekcie. Pixely, ktoré po
+    zarovnaní ležia mimo pôvodnej snímky, sa v radoch vrátia ako NaN.
+    decode_scale je zmenšenie referenčnej snímky voči fotografii.
+    """
+    times: List[str]
+    image_names: List[str]
+    values: np.ndarray
+    scale: float
+    homographies: np.ndarray
+    frame_shapes: List[Tuple[int, int]]
+    statuses: List[str]
+    decode_scale: int = 1
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.values.shape[1], self.values.shape[2]
+
+    def valid_mask(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """Pre každú snímku a bod (x, y) určí, či bod leží vnútri pôvodnej snímky (T, P)"""
+        points = np.stack([xs + 0.5, ys + 0.5, np.ones(len(xs))]).astype(np.float64)
+        valid = np.empty((len(self.times), len(xs)), dtype=bool)
+        for index, (homography, (height, width)) in enumerate(zip(self.homographies, self.frame_shapes)):
+            mapped = np.linalg.inv(homography) @ points
+            x = mapped[0] / mapped[2]
+            y = mapped[1] / mapped[2]
+            valid[index] = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+        return valid
+
+    def pixel_series(self, x: int, y: int) -> np.ndarray:
+        """Priebeh hodnoty jedného pixela počas dňa (T,) – číta len T hodnôt zo súboru"""
+        height, width = self.shape
+        if not (0 <= x < width and 0 <= y < height):
+            raise ValueError(f"Bod ({x}, {y}) je mimo rozmeru {width}x{height}")
+        series = self.values[:, y, x].astype(np.float64) * self.scale
+        series[~self.valid_mask(np.array([x]), np.array([y]))[:, 0]] = np.nan
+        return series
+
+    def region_series(self, mask: np.ndarray) -> np.ndarray:
+        """
+        Priemerná hodnota oblasti (boolovská maska H×W) v každej snímke (T,)
+
+        Zo súboru sa číta len obdĺžnik ohraničujúci oblasť.
+        """
+        ys, xs = np.nonzero(mask)
+        if len(xs) == 0:
+            return np.full(len(self.times), np.nan)
+        y0, y1, x0, x1 = ys.min(), ys.max() + 1, xs.min(), xs.max() + 1
+        window = self.values[:, y0:y1, x0:x1][:, ys - y0, xs - x0].astype(np.float64) * self.scale
+        valid = self.valid_mask(xs, ys)
+        counts = valid.sum(axis=1)
+        sums = np.where(valid, window, 0.0).sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+class RegistrationCache:
+    """
+    Zarovnanie snímok sekcie na referenčnú snímku a dátové kocky (čas, H, W) po dňoch
+
+    Homografia každej snímky sa počíta raz (ORB + RANSAC nad heat mapou)
+    a ukladá sa podľa hashu fotografie – pri zmene súboru sa prepočíta.
+    Kocka dňa je .npy súbor otváraný cez np.memmap, takže priebeh pixela
+    alebo oblasti sa číta bez načítania celých snímok. Kocka sa prebuduje,
+    keď pribudnú alebo sa zmenia heat mapy daného dňa.
+    """
+
+    def __init__(self, data_dir, store: Optional[ResultsStore] = None,
+                 heat_maps: Optional[HeatMapStore] = None):
+        self.data_dir = Path(data_dir)
+        self.root = self.data_dir / REGISTRATION_DIR_NAME
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._own_store = store is None
+        self._own_heat_maps = heat_maps is None
+        self.store = store or ResultsStore.for_data_dir(self.data_dir)
+        self.heat_maps = heat_maps or HeatMapStore(self.data_dir / "heat_maps")
+        self.conn = sqlite3.connect(str(self.root / REGISTRATION_DB_NAME), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+        self.conn.commit()
+        self._reference_cache: Dict[str, Tuple[np.ndarray, Tuple]] = {}
+
+    def close(self):
+        self.conn.close()
+        if self._own_store:
+            self.store.close()
+        if self._own_heat_maps:
+            self.heat_maps.close()
+
+    # --- Referenčné snímky ---
+
+    def _file_hashes(self, section_name: str) -> Dict[str, str]:
+        """Hash fotografií sekcie podľa názvu súboru (z indexu odtlačkov)"""
+        hashes = {}
+        for path, entry in self.store.load_file_index().items():
+            parts = path.split('/')
+            if len(parts) >= 2 and parts[0] == section_name:
+                hashes[parts[-1]] = entry['hash']
+        return hashes
+
+    def _registration_key(self, row: Dict, file_hashes: Dict[str, str]) -> str:
+        """Kľúč homografie – hash fotografie, pri starých dátach verzia uloženej heat mapy"""
+        file_hash = file_hashes.get(row['image_name'])
+        if file_hash:
+            return file_hash
+        version = self.heat_maps.frame_version(row['heat_map_file'])
+        return f"frame:{version[0] if version else row['heat_map_file']}"
+
+    def set_reference(self, section_name: str, heat_map_key: str):
+        """Nastaví referenčnú snímku sekcie (zmena zneplatní všetky kocky sekcie)"""
+        row = next((r for r in self.store.query_measurements([section_name])
+                    if self.heat_maps.normalize_key(r['heat_map_file'] or '') == heat_map_key), None)
+        if row is None:
+            raise KeyError(f"Sekcia {section_name} nemá heat mapu {heat_map_key}")
+        key = self._registration_key(row, self._file_hashes(section_name))
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO section_references (section, heat_map_key, key) "
+                              "VALUES (?, ?, ?)", (section_name, heat_map_key, key))
+        self._reference_cache.pop(section_name, None)
+
+    def reference_for(self, section_name: str) -> Tuple[str, str]:
+        """
+        Referenčná snímka sekcie (kľúč heat mapy, kľúč registrácie)
+
+        Bez nastavenia sa zvolí snímka najbližšia poludniu z prvého dňa
+        a uloží sa, aby ostala stabilná aj po pridaní ďalších dní.
+        """
+        row = self.conn.execute("SELECT heat_map_key, key FROM section_references WHERE section = ?",
+                                (section_name,)).fetchone()
+        if row is not None:
+            return row['heat_map_key'], row['key']
+
+        rows = [r for r in self.store.query_measurements([section_name]) if r['heat_map_file']]
+        if not rows:
+            raise KeyError(f"Sekcia {section_name} nemá žiadne heat mapy")
+        first_day = [r for r in rows if r['date'] == rows[0]['date']]
+        noon = min(first_day, key=lambda r: abs(int(r['datetime'][11:13]) * 60
+                                                + int(r['datetime'][14:16]) - 12 * 60))
+        heat_map_key = self.heat_maps.normalize_key(noon['heat_map_file'])
+        self.set_reference(section_name, heat_map_key)
+        return self.reference_for(section_name)
+
+    def _load_gray(self, heat_map_key: str) -> np.ndarray:
+        frame = self.heat_maps.load(heat_map_key)
+        return np.clip(np.rint(frame * 255), 0, 255).astype(np.uint8)
+
+    def _reference(self, section_name: str):
+        cached = self._reference_cache.get(section_name)
+        if cached is None:
+            heat_map_key, key = self.reference_for(section_name)
+            gray = self._load_gray(heat_map_key)
+            features = cv2.ORB_create(ORB_FEATURES).detectAndCompute(gray, None)
+            cached = self._reference_cache[section_name] = (heat_map_key, key, gray, features)
+        return cached
+
+    # --- Homografie ---
+
+    def homography(self, section_name: str, row: Dict,
+                   file_hashes: Optional[Dict[str, str]] = None) -> Tuple[np.ndarray, str]:
+        """
+        Homografia snímky na referenčnú snímku sekcie (normalizované súradnice)
+
+        Returns:
+            Matica 3×3 a stav: 'reference', 'registered' alebo 'identity'
+            (snímku sa nepodarilo spoľahlivo zarovnať – použije sa bez posunu)
+        """
+        file_hashes = self._file_hashes(section_name) if file_hashes is None else file_hashes
+        reference_heat_map, reference_key, reference_gray, features = self._reference(section_name)
+        key = self._registration_key(row, file_hashes)
+        if key == reference_key:
+            return np.eye(3), 'reference'
+
+        cached = self.conn.execute("SELECT matrix, status FROM homographies WHERE key = ? AND reference = ?",
+                                   (key, reference_key)).fetchone()
+        if cached is not None:
+            return np.array(json.loads(cached['matrix'])).reshape(3, 3), cached['status']
+
+        frame_gray = self._load_gray(row['heat_map_file'])
+        matrix, inliers = estimate_homography(reference_gray, frame_gray, features)
+        status = 'registered' if matrix is not None else 'identity'
+        if matrix is None:
+            matrix = np.eye(3)
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO homographies (key, reference, matrix, inliers, status) "
+                              "VALUES (?, ?, ?, ?, ?)",
+                              (key, reference_key, json.dumps(matrix.ravel().tolist()), inliers, status))
+        return matrix, status
+
+    # --- Kocky ---
+
+    def _cube_paths(self, section_name: str, date_str: str) -> Tuple[Path, Path]:
+        directory = self.root / section_name
+        return directory / f"{date_str}.npy", directory / f"{date_str}.json"
+
+    def _day_rows(self, section_name: str, date_str: str) -> List[Dict]:
+        return [r for r in self.store.query_measurements([section_name], date_str, date_str)
+                if r['heat_map_file'] and self.heat_maps.contains(r['heat_map_file'])]
+
+    def _decode_scale(self, section_name: str) -> int:
+        return self.store.get_decode_scale(section_name) or 1
+
+    def _cube_current(self, meta_path: Path, cube_path: Path, signature: List) -> bool:
+        if not cube_path.exists() or not meta_path.exists():
+            return False
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('signature') == signature
+
+    def _frames_signature(self, rows: List[Dict], reference_key: str, decode_scale: int) -> List:
+        return [reference_key, decode_scale] + [[self.heat_maps.normalize_key(r['heat_map_file']),
+                                                 (self.heat_maps.frame_version(r['heat_map_file']) or ('',))[0]]
+                                                for r in rows]
+
+    def build_cube(self, section_name: str, date_str: str, force: bool = False) -> Path:
+        """
+        Zarovná heat mapy dňa a zapíše ich do kocky <sekcia>/<dátum>.npy
+
+        Kocka sa zapisuje do dočasného súboru a atomicky premenuje. Ak sa
+        heat mapy dňa od posledného zostavenia nezmenili, nič sa nerobí.
+        Zostavenie kocky jedného dňa je chránené zámkom súboru, takže
+        súbežné požiadavky (vlákna aj procesy) ju zostavia len raz.
+        """
+        cube_path, meta_path = self._cube_paths(section_name, date_str)
+        rows = self._day_rows(section_name, date_str)
+        if not rows:
+            raise KeyError(f"Sekcia {section_name} nemá pre deň {date_str} žiadne heat mapy")
+
+        reference_heat_map, reference_key, reference_gray, _ = self._reference(section_name)
+        decode_scale = self._decode_scale(section_name)
+        signature = self._frames_signature(rows, reference_key, decode_scale)
+        if not force and self._cube_current(meta_path, cube_path, signature):
+            return cube_path
+
+        cube_path.parent.mkdir(parents=True, exist_ok=True)
+        with FileLock(cube_path.with_name(f".{date_str}.lock")):
+            # Kým sme čakali na zámok, kocku mohla zostaviť iná požiadavka
+            if not force and self._cube_current(meta_path, cube_path, signature):
+                return cube_path
+            self._write_cube(section_name, date_str, rows, reference_heat_map, reference_gray,
+                             decode_scale, signature)
+        return cube_path
+
+    def _write_cube(self, section_name: str, date_str: str, rows: List[Dict], reference_heat_map: str,
+                    reference_gray: np.ndarray, decode_scale: int, signature: List):
+        cube_path, meta_path = self._cube_paths(section_name, date_str)
+
+        reference_frame = self.heat_maps.load(reference_heat_map, dequantize=False)
+        dtype = reference_frame.dtype if reference_frame.dtype.kind == 'u' else np.dtype(np.uint8)
+        max_value = np.iinfo(dtype).max
+        height, width = reference_gray.shape
+
+        # Dočasné súbory sú jedinečné pre proces aj vlákno – súbežný zápis si ich neprepíše
+        tmp_suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp_path = cube_path.with_name(f".{cube_path.name}.{tmp_suffix}")
+        cube = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=(len(rows), height, width))
+        file_hashes = self._file_hashes(section_name)
+        homographies, frame_shapes, statuses = [], [], []
+        try:
+            for index, row in enumerate(rows):
+                normalized, status = self.homography(section_name, row, file_hashes)
+                frame = self.heat_maps.load(row['heat_map_file'])
+                pixel_homography = to_pixel_homography(normalized, frame.shape, (height, width))
+                warped = cv2.warpPerspective(frame, pixel_homography, (width, height),
+                                             flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+                cube[index] = np.rint(np.clip(warped, 0.0, 1.0) * max_value).astype(dtype)
+                homographies.append(pixel_homography.ravel().tolist())
+                frame_shapes.append(list(frame.shape))
+                statuses.append(status)
+            cube.flush()
+            del cube
+            os.replace(tmp_path, cube_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+        metadata = {
+            'section': section_name,
+            'date': date_str,
+            'reference': reference_heat_map,
+            'times': [r['datetime'] for r in rows],
+            'image_names': [r['image_name'] for r in rows],
+            'scale': 1.0 / max_value,
+            'homographies': homographies,
+            'frame_shapes': frame_shapes,
+            'statuses': statuses,
+            'decode_scale': decode_scale,
+            'signature': signature
+        }
+        tmp_meta = meta_path.with_name(f".{meta_path.name}.{tmp_suffix}")
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, ensure_ascii=False)
+        os.replace(tmp_meta, meta_path)
+
+    def open_cube(self, section_name: str, date_str: str) -> DayCube:
+        """Otvorí (a v prípade potreby zostaví) kocku dňa len na čítanie"""
+        cube_path, meta_path = self._cube_paths(section_name, date_str)
+        self.build_cube(section_name, date_str)
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+        return DayCube(
+            times=metadata['times'],
+            image_names=metadata['image_names'],
+            values=np.load(cube_path, mmap_mode='r'),
+            scale=metadata['scale'],
+            homographies=np.array(metadata['homographies']).reshape(-1, 3, 3),
+            frame_shapes=[tuple(shape) for shape in metadata['frame_shapes']],
+            statuses=metadata['statuses'],
+            decode_scale=metadata.get('decode_scale', 1)
+        )
+
+    def pixel_series(self, section_name: str, date_str: str, x: int, y: int) -> Dict:
+        """Priebeh jedného pixela (súradnice referenčnej snímky) počas dňa"""
+        cube = self.open_cube(section_name, date_str)
+        return {'times': cube.times, 'values': cube.pixel_series(x, y).tolist()}
+
+    def region_series(self, section_name: str, date_str: str, region: Optional[str] = None,
+                      polygon: Optional[Sequence[Tuple[float, float]]] = None,
+                      bbox: Optional[Tuple[int, int, int, int]] = None,
+                      mask: Optional[np.ndarray] = None) -> Dict:
+        """
+        Priemerný priebeh oblasti počas dňa
+
+        Oblasť je názov oblasti sekcie z regions.json, polygón alebo obdĺžnik
+        (x0, y0, x1, y1) v pixeloch referenčnej snímky, prípadne hotová
+        boolovská maska rozmeru kocky.
+        """
+        cube = self.open_cube(section_name, date_str)
+        if mask is None and region is not None:
+            region_set = load_region_config(self.data_dir / REGIONS_CONFIG_NAME).get(section_name)
+            if region_set is None or region not in region_set.names:
+                raise KeyError(f"Sekcia {section_name} nemá oblasť {region}")
+            # Bez image_size sa polygóny preškálujú zmenšením, s ktorým vznikla referenčná heat mapa
+            mask = region_set.region_mask(region, cube.shape, cube.decode_scale)
+        elif mask is None:
+            mask = np.zeros(cube.shape, dtype=np.uint8)
+            if polygon is not None:
+                cv2.fillPoly(mask, [np.rint(np.array(polygon)).astype(np.int32)], 1)
+            elif bbox is not None:
+                x0, y0, x1, y1 = bbox
+                mask[max(y0, 0):y1, max(x0, 0):x1] = 1
+            else:
+                raise ValueError("Chýba polygón, obdĺžnik alebo maska oblasti")
+        values = cube.region_series(mask.astype(bool))
+        return {'times': cube.times, 'values': [None if np.isnan(v) else float(v) for v in values]}
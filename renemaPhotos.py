@@ -1,254 +1,794 @@
 import numpy as np
 import cv2
-from PIL import Image
-from skimage import exposure
 import os
 from datetime import datetime
 from pathlib import Path
 import json
+import re
 import shutil
-from typing import Set, Dict, List
-import hashlib
+from typing import Set, Dict, List, Optional, Tuple, Callable
+from concurrent.futures import ProcessPoolExecutor
+import threading
+import time
+from contextlib import contextmanager
+from fnmatch import fnmatch
+from itertools import islice
+
+from aggregates import refresh_aggregates
+from batch_kernel import analyze_stack
+from columnar_export import COLUMNAR_DIR_NAME, export_columnar
+from file_index import FileFingerprintIndex, file_fingerprint, hash_file
+from file_lock import ANALYSIS_LOCK_NAME, FileLock
+from heatmap_store import HeatMapStore, encode_heat_map
+from metrics import (BYTES_READ_TOTAL, FINGERPRINT_HASHES_TOTAL, IMAGES_PER_SECOND, IMAGES_TOTAL,
+                     STAGE_SECONDS, record_stage_timings)
+from prefetch import DEFAULT_PREFETCH_BYTES, DEFAULT_READS_IN_FLIGHT, FilePrefetcher, PrefetchedFile, read_file
+from regions import REGIONS_CONFIG_NAME, RegionSet, load_region_config, region_statistics
+from result_cache import ResultCache, analysis_params_version, collect_garbage
+from results_store import ResultsStore, migrate_json_results
+from sharding import ShardFilter, merge_shards
+
+# Počet fotografií v jednej dávke – po každej dávke sa uložia výsledky,
+# ohlási priebeh a skontroluje zrušenie analýzy
+DEFAULT_BATCH_SIZE = 32
+
+
+# Dekódovanie JPEG priamo do jasového obrázka v zmenšenom rozlíšení (škálovanie v DCT doméne)
+REDUCED_GRAYSCALE_FLAGS = {
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8
+}
+
+# Ako často (v sekundách) sa počas analýzy prenáša WAL žurnál do databázy
+CHECKPOINT_INTERVAL_SECONDS = 60
+
+ANALYSIS_METRICS = ('average_brightness', 'brightness_variation', 'shadow_percentage')
+
+
+class AnalysisCancelled(Exception):
+    """Analýza bola zrušená; výsledky dokončených dávok ostávajú uložené"""
+
+
+def _analyze_image_task(task: Tuple) -> Optional[Dict]:
+    """
+    Načíta a analyzuje jednu fotografiu a pripraví jej skomprimovanú heat mapu.
+
+    Funkcia je na úrovni modulu, aby ju bolo možné spúšťať v procesoch
+    ProcessPoolExecutor-a. Sériová aj paralelná cesta používajú túto istú
+    funkciu, takže výsledky sú v oboch režimoch zhodné. Heat mapu zapisuje
+    do kontajnerov až hlavný proces.
+
+    Args:
+        task: Dvojica (cesta k fotografii, nastavenia analýzy), voliteľne
+            s treťou položkou – obsahom súboru prečítaným dopredu (PrefetchedFile)
+
+    Returns:
+        Metriky fotografie, zakódovaná heat mapa a informácie o súbore,
+        alebo None ak sa obrázok nepodarilo načítať
+    """
+    img_path, options = Path(task[0]), task[1]
+    prefetched: Optional[PrefetchedFile] = task[2] if len(task) > 2 else None
+    if prefetched is None:
+        prefetched = read_file(img_path)
+    if prefetched.data is None:
+        print(f"Chyba pri načítaní obrázku {img_path.name}: {prefetched.error}")
+        return None
+    # Časy fáz sa vracajú hlavnému procesu, ktorý ich zapíše do metrík
+    timings: Dict[str, float] = {'read': prefetched.read_seconds}
+
+    decode_scale = options.get('decode_scale', 1)
+    img = RoofAnalysisServer._safe_read_image(img_path, decode_scale, timings, prefetched.data)
+    if img is None:
+        return None
+
+    analysis = RoofAnalysisServer._analyze_single_image(img, options.get('regions'), decode_scale,
+                                                        options['heat_map_dtype'], timings)
+
+    started = time.perf_counter()
+    heat_map = encode_heat_map(analysis['heat_map'], options['heat_map_dtype'])
+    timings['encode'] = time.perf_counter() - started
+
+    # Hash sa počíta z tých istých bajtov, z ktorých sa obrázok dekódoval
+    started = time.perf_counter()
+    file_info = prefetched.fingerprint()
+    timings['fingerprint'] = time.perf_counter() - started
+
+    return {
+        'average_brightness': analysis['average_brightness'],
+        'brightness_variation': analysis['brightness_variation'],
+        'shadow_percentage': analysis['shadow_percentage'],
+        'regions': analysis.get('regions', []),
+        'heat_map': heat_map,
+        'file_info': file_info,
+        'timings': timings,
+        # Súbor sa číta jediný raz – pre dekódovanie aj hash
+        'bytes_read': file_info['size']
+    }
+
 
 class RoofAnalysisServer:
-    def __init__(self, data_dir: str):
+    def __init__(self, data_dir: str, heat_map_dtype: str = 'uint8', analysis_scale: int = 1,
+                 reads_in_flight: int = DEFAULT_READS_IN_FLIGHT,
+                 max_prefetch_bytes: int = DEFAULT_PREFETCH_BYTES):
         """
         Inicializácia servera pre analýzu strechy
         
         Args:
             data_dir: Cesta k adresáru pre ukladanie dát
+            heat_map_dtype: Kvantizácia ukladaných heat máp ('uint8' alebo 'uint16')
+            analysis_scale: Zmenšenie rozlíšenia pri analýze (1 = plné rozlíšenie, 2, 4 alebo 8).
+                Pri zmenšení sa JPEG dekóduje priamo do jasového obrázka v DCT doméne;
+                odchýlku metrík oproti plnému rozlíšeniu ukáže compare_resolution_drift().
+            reads_in_flight: Počet fotografií čítaných naraz dopredu (vyšší pri sieťovom disku)
+            max_prefetch_bytes: Najviac bajtov prečítaných dopredu a ešte nespracovaných
         """
+        if analysis_scale != 1 and analysis_scale not in REDUCED_GRAYSCALE_FLAGS:
+            raise ValueError(f"Nepodporované zmenšenie rozlíšenia: {analysis_scale}")
         self.data_dir = Path(data_dir)
         self.analysis_dir = self.data_dir / "analyses"
         self.heat_maps_dir = self.data_dir / "heat_maps"
         self.metadata_file = self.data_dir / "metadata.json"
         
-        # Vytvorenie potrebných adresárov
-        self.analysis_dir.mkdir(parents=True, exist_ok=True)
-        self.heat_maps_dir.mkdir(parents=True, exist_ok=True)
+        self.heat_map_dtype = heat_map_dtype
+        self.analysis_scale = analysis_scale
+        # Čítanie fotografií dopredu – každý súbor sa prečíta raz pre hash aj dekódovanie
+        self.prefetcher = FilePrefetcher(reads_in_flight, max_prefetch_bytes)
+
+        # Úložisko heat máp v skomprimovaných denných kontajneroch
+        self.heat_maps = HeatMapStore(self.heat_maps_dir)
+
+        # SQLite úložisko výsledkov (nahrádza analyses/*.json a metadata.json)
+        self.store = ResultsStore.for_data_dir(self.data_dir)
+        self._migrate_legacy_json()
+
+        # Cache výsledkov podľa obsahu fotografie (presunuté a skopírované súbory sa neanalyzujú znova)
+        self.result_cache = ResultCache(self.store, self.heat_maps)
+        
+        # Oblasti záujmu pre jednotlivé kamery/sekcie (regions.json v adresári s dátami)
+        self.regions = load_region_config(self.data_dir / REGIONS_CONFIG_NAME)
         
         # Načítanie alebo vytvorenie metadát
         self.metadata = self._load_metadata()
+        self.file_index = FileFingerprintIndex(self.metadata.setdefault('analyzed_files', {}))
+        self._last_checkpoint = time.monotonic()
+
+    def close(self):
+        """Zatvorí úložiská výsledkov a heat máp"""
+        self.store.close()
+        self.heat_maps.close()
+
+    def _migrate_legacy_json(self):
+        """Jednorazovo prevedie staré JSON výsledky do SQLite úložiska"""
+        if self.store.get_info('migrated_json') is not None:
+            return
+        has_legacy = self.metadata_file.exists() or any(self.analysis_dir.glob('*_analysis.json'))
+        if has_legacy:
+            counts = migrate_json_results(self.data_dir, self.store)
+            print(f"Prevedené staré JSON výsledky do SQLite: {counts}")
+        else:
+            self.store.set_info('migrated_json', json.dumps({}))
 
     def _load_metadata(self) -> Dict:
         """Načíta metadata o analyzovaných súboroch"""
-        if self.metadata_file.exists():
-            with open(self.metadata_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {'analyzed_files': {}}
+        return {'analyzed_files': self.store.load_file_index()}
+
+    def _changed_file_entries(self) -> Tuple[Dict[str, Dict], List[str]]:
+        """Zmenené a odstránené odtlačky súborov od posledného uloženia"""
+        entries = {key: self.file_index.entries[key] for key in sorted(self.file_index.dirty)}
+        return entries, sorted(self.file_index.removed)
 
     def _save_metadata(self):
-        """Uloží metadata"""
-        with open(self.metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(self.metadata, f, ensure_ascii=False, indent=2)
+        """Uloží zmenené odtlačky súborov"""
+        entries, removed = self._changed_file_entries()
+        if entries or removed:
+            self.store.write_batch(None, [], file_entries=entries, deleted_files=removed)
+        self.file_index.mark_saved()
+
+    def _maybe_checkpoint(self, force: bool = False):
+        """
+        Pravidelne prenesie WAL žurnály do databáz, aby počas dlhého behu nerástli
+
+        Každá dávka je potvrdená už pri zápise; checkpoint len obmedzuje
+        veľkosť žurnálu a čas obnovy po páde.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_checkpoint < CHECKPOINT_INTERVAL_SECONDS:
+            return
+        self.store.checkpoint(truncate=force)
+        self.heat_maps.checkpoint(truncate=force)
+        self._last_checkpoint = now
 
-    def _calculate_file_hash(self, file_path: Path) -> str:
+    @staticmethod
+    def _calculate_file_hash(file_path: Path) -> str:
         """Vypočíta hash súboru pre detekciu zmien"""
-        hasher = hashlib.md5()
-        with open(file_path, 'rb') as f:
-            for chunk in iter(lambda: f.read(4096), b''):
-                hasher.update(chunk)
-        return hasher.hexdigest()
+        return hash_file(file_path)
 
-    def _get_file_info(self, file_path: Path) -> Dict:
+    @staticmethod
+    def _get_file_info(file_path: Path) -> Dict:
         """Získa informácie o súbore"""
-        return {
-            'hash': self._calculate_file_hash(file_path),
-            'size': file_path.stat().st_size,
-            'mtime': file_path.stat().st_mtime
-        }
+        return file_fingerprint(file_path)
 
-    def _should_analyze_file(self, file_path: Path) -> bool:
+    def _should_analyze_file(self, file_path: Path, photos_path: Path) -> bool:
         """Určí, či súbor potrebuje analýzu"""
-        if str(file_path) not in self.metadata['analyzed_files']:
-            return True
-        
-        current_info = self._get_file_info(file_path)
-        stored_info = self.metadata['analyzed_files'][str(file_path)]
-        
-        return (current_info['hash'] != stored_info['hash'] or
-                current_info['size'] != stored_info['size'] or
-                current_info['mtime'] != stored_info['mtime'])
+        key = self.file_index.relative_key(file_path, photos_path)
+        return self.file_index.needs_analysis(key, file_path)
 
     def _parse_datetime_from_filename(self, filename: str) -> datetime:
-        """Extrahuje dátum a čas z názvu súboru"""
-        basename = Path(filename).stem
+        """Extrahuje dátum a čas z názvu súboru (prípona _2, _3, ... pri zhode času sa ignoruje)"""
+        basename = re.sub(r'_\d+$', '', Path(filename).stem)
         try:
             return datetime.strptime(basename, '%Y-%m-%d-%H-%M')
         except ValueError:
             return None
 
-    def _safe_read_image(self, img_path: Path):
-        """Bezpečné načítanie obrázku s podporou Unicode cesty"""
+    @staticmethod
+    def _safe_read_image(img_path: Path, scale: int = 1, timings: Optional[Dict[str, float]] = None,
+                         data: Optional[bytes] = None):
+        """
+        Bezpečné načítanie obrázku s podporou Unicode cesty
+
+        Args:
+            img_path: Cesta k fotografii
+            scale: 1 vráti RGB obrázok v plnom rozlíšení; 2, 4 alebo 8 vráti
+                jasový obrázok dekódovaný priamo v zmenšenom rozlíšení
+            timings: Voliteľný slovník pre časy fáz 'read' a 'decode'
+            data: Obsah súboru, ak už bol prečítaný (súbor sa potom znova nečíta)
+        """
+        timings = {} if timings is None else timings
         try:
-            with open(img_path, 'rb') as f:
-                img_array = np.frombuffer(f.read(), dtype=np.uint8)
-                img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-                if img is not None:
-                    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                else:
-                    print(f"Varovanie: Nepodarilo sa dekódovať obrázok: {img_path.name}")
-                    return None
+            if data is None:
+                started = time.perf_counter()
+                with open(img_path, 'rb') as f:
+                    data = f.read()
+                timings['read'] = time.perf_counter() - started
+            started = time.perf_counter()
+            try:
+                return RoofAnalysisServer._decode_image(img_path, np.frombuffer(data, dtype=np.uint8), scale)
+            finally:
+                timings['decode'] = time.perf_counter() - started
         except Exception as e:
             print(f"Chyba pri načítaní obrázku {img_path.name}: {e}")
             return None
 
-    def _analyze_single_image(self, image: np.ndarray) -> dict:
-        """Analyzuje jednu fotografiu"""
-        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-        
-        avg_brightness = float(np.mean(gray))
-        std_brightness = float(np.std(gray))
-        
-        heat_map = exposure.equalize_hist(gray)
+    @staticmethod
+    def _decode_image(img_path: Path, img_array: np.ndarray, scale: int = 1):
+        """Dekóduje JPEG z bajtov (RGB alebo zmenšený jasový obrázok)"""
+        if scale != 1:
+            img = cv2.imdecode(img_array, REDUCED_GRAYSCALE_FLAGS[scale])
+            if img is not None:
+                return img
+        else:
+            img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+        if img is not None:
+            return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        else:
+            print(f"Varovanie: Nepodarilo sa dekódovať obrázok: {img_path.name}")
+            return None
+
+    @staticmethod
+    def _analyze_single_image(image: np.ndarray, regions: Optional[RegionSet] = None,
+                              decode_scale: int = 1, heat_map_dtype: Optional[str] = None,
+                              timings: Optional[Dict[str, float]] = None) -> dict:
+        """
+        Analyzuje jednu fotografiu
+
+        Args:
+            image: RGB obrázok alebo už jasový obrázok (H, W)
+            regions: Voliteľné oblasti záujmu – ich štatistiky sa vrátia v kľúči 'regions'
+            decode_scale: Zmenšenie, s ktorým bol obrázok dekódovaný (na preškálovanie polygónov)
+            heat_map_dtype: None = heat mapa 0..1 (float64), 'uint8'/'uint16' = rovno kvantizovaná
+            timings: Voliteľný slovník pre časy fáz analýzy
+        """
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
         
-        shadow_map = cv2.adaptiveThreshold(
-            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-            cv2.THRESH_BINARY, 11, 2
-        )
-        shadow_percentage = float((np.sum(shadow_map == 0) / shadow_map.size) * 100)
+        analysis = analyze_stack(gray[None], heat_map_dtype, shadow_masks=regions is not None,
+                                 timings=timings)
         
-        return {
-            'average_brightness': avg_brightness,
-            'brightness_variation': std_brightness,
-            'shadow_percentage': shadow_percentage,
-            'heat_map': heat_map
+        result = {
+            'average_brightness': float(analysis['average_brightness'][0]),
+            'brightness_variation': float(analysis['brightness_variation'][0]),
+            'shadow_percentage': float(analysis['shadow_percentage'][0]),
+            'heat_map': analysis['heat_map'][0]
         }
+        if regions is not None and len(regions):
+            started = time.perf_counter()
+            result['regions'] = region_statistics(regions, gray, analysis['shadow_mask'][0], decode_scale)
+            if timings is not None:
+                timings['regions'] = time.perf_counter() - started
+        return result
 
     def _load_section_data(self, section_name: str) -> Dict:
         """Načíta existujúce dáta sekcie alebo vytvorí novú štruktúru"""
-        section_file = self.analysis_dir / f"{section_name}_analysis.json"
-        if section_file.exists():
-            with open(section_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {
-            'name': section_name,
-            'dates': {}
-        }
+        return self.store.load_section(section_name)
 
     def _save_section_data(self, section_name: str, data: Dict):
         """Uloží dáta sekcie"""
-        section_file = self.analysis_dir / f"{section_name}_analysis.json"
-        with open(section_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        self.store.save_section(section_name, data)
+
+    def _run_image_tasks(self, executor: Optional[ProcessPoolExecutor],
+                         tasks: List[Tuple[str, Dict]], workers: int) -> List[Optional[Dict]]:
+        """
+        Spustí analýzu fotografií sériovo alebo v procesnom poole
+
+        Výsledky sa vždy vracajú v poradí úloh, aby bolo zlúčenie deterministické.
+        """
+        if executor is None:
+            return [_analyze_image_task(task) for task in tasks]
+
+        chunksize = max(1, len(tasks) // (workers * 4))
+        return list(executor.map(_analyze_image_task, tasks, chunksize=chunksize))
+
+    def _analyze_batch(self, executor: Optional[ProcessPoolExecutor], batch: List[Tuple[Path, datetime, str]],
+                       files: List[PrefetchedFile], options: Dict, workers: int,
+                       use_cache: bool) -> List[Optional[Dict]]:
+        """
+        Výsledky dávky – fotografie so známym obsahom z cache, ostatné analýzou
+
+        Args:
+            files: Obsah fotografií dávky prečítaný dopredu (FilePrefetcher), v poradí dávky
+
+        Returns:
+            Výsledky v poradí dávky (výsledok z cache má namiesto heat mapy 'heat_map_ref')
+        """
+        results: List[Optional[Dict]] = [None] * len(batch)
+        if use_cache:
+            for i, prefetched in enumerate(files):
+                if prefetched.data is not None:
+                    results[i] = self.result_cache.lookup(prefetched.path, options['params_version'], prefetched)
+        missing = [i for i, result in enumerate(results) if result is None]
+        tasks = [(str(batch[i][0]), options, files[i]) for i in missing]
+        analyzed = self._run_image_tasks(executor, tasks, workers)
+        for i, result in zip(missing, analyzed):
+            results[i] = result
+        return results
+
+    def _analysis_options(self, section_name: str) -> Dict:
+        """Nastavenia analýzy sekcie (vrátane verzie parametrov pre cache výsledkov)"""
+        options = {'heat_map_dtype': self.heat_map_dtype,
+                   'decode_scale': self.analysis_scale,
+                   'regions': self.regions.get(section_name)}
+        options['params_version'] = analysis_params_version(options)
+        return options
+
+    def _store_batch(self, section_name: str, photos_path: Path,
+                     batch: List[Tuple[Path, datetime, str]], results: List[Optional[Dict]],
+                     params_version: Optional[str] = None) -> int:
+        """
+        Uloží výsledky jednej dávky – heat mapy, merania, odtlačky súborov a záznamy cache výsledkov
+
+        Výsledky prevzaté z cache nezapisujú novú heat mapu, ich kľúč len
+        odkáže na už uloženú snímku.
+
+        Returns:
+            Počet úspešne analyzovaných fotografií
+        """
+        started = time.perf_counter()
+        section_records = []
+        region_records = []
+        heat_maps = []
+        linked_heat_maps = []
+        analyzed = []
+        cached = []
+        for (img_path, img_datetime, heat_map_key), analysis in zip(batch, results):
+            if analysis is None:
+                continue
+
+            record_stage_timings(analysis.get('timings'))
+            BYTES_READ_TOTAL.inc(analysis.get('bytes_read', 0))
+
+            # Pridanie výsledkov analýzy
+            section_records.append({
+                'datetime': img_datetime.isoformat(),
+                'image_name': img_path.name,
+                'average_brightness': analysis['average_brightness'],
+                'brightness_variation': analysis['brightness_variation'],
+                'shadow_percentage': analysis['shadow_percentage'],
+                'heat_map_file': heat_map_key
+            })
+            if 'heat_map_ref' in analysis:
+                print(f"Výsledok prevzatý z cache (rovnaký obsah): {img_path.name}")
+                linked_heat_maps.append((heat_map_key, section_name, img_datetime.date().isoformat(),
+                                         analysis['heat_map_ref']))
+                cached.append((heat_map_key, analysis))
+            else:
+                print(f"Analyzovaná nová fotografia: {img_path.name}")
+                heat_maps.append((heat_map_key, section_name, img_datetime.date().isoformat(),
+                                  analysis['heat_map']))
+                analyzed.append((heat_map_key, analysis))
+            for region_stats in analysis['regions']:
+                region_records.append(dict(region_stats, datetime=img_datetime.isoformat(),
+                                           image_name=img_path.name))
+
+            # Aktualizácia metadát
+            self.file_index.update(self.file_index.relative_key(img_path, photos_path),
+                                   analysis['file_info'])
+
+        # Heat mapy sa zapíšu (a fsync-nú) skôr, ako na ne odkážu merania. Merania,
+        # štatistiky oblastí a odtlačky súborov dávky sa potom potvrdia jednou transakciou.
+        frames = self.heat_maps.put_many(heat_maps)
+        self.heat_maps.link_many(linked_heat_maps)
+        frames.update({key: frame for key, _, _, frame in linked_heat_maps})
+        # Záznamy cache – nové výsledky sa pridajú, použitým sa obnoví čas posledného použitia (LRU)
+        cached_results = []
+        if params_version is not None:
+            cached_results = [self.result_cache.entry(analysis, params_version, frames[key])
+                              for key, analysis in analyzed + cached]
+        file_entries, deleted_files = self._changed_file_entries()
+        self.store.write_batch(section_name, section_records, region_records, file_entries, deleted_files,
+                               cached_results)
+        self.file_index.mark_saved()
+        if section_records:
+            # Heat mapy majú rozmer dekódovaného obrázka – polygóny oblastí sa na ne preškálujú
+            self.store.set_decode_scale(section_name, self.analysis_scale)
+        self._maybe_checkpoint()
+
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage='store')
+        IMAGES_TOTAL.inc(len(analyzed), result='analyzed')
+        IMAGES_TOTAL.inc(len(cached), result='cached')
+        IMAGES_TOTAL.inc(len(batch) - len(section_records), result='failed')
+        return len(section_records)
+
+    def _refresh_aggregates(self):
+        """Prepočíta agregáty dní, ktorých merania sa zmenili"""
+        with STAGE_SECONDS.time(stage='aggregate'):
+            refresh_aggregates(self.store)
+
+    def _refresh_columnar_export(self):
+        """Obnoví stĺpcový export meraní, ak už bol vytvorený (export_columnar)"""
+        if (self.data_dir / COLUMNAR_DIR_NAME).exists():
+            with STAGE_SECONDS.time(stage='export'):
+                export_columnar(self.store, self.data_dir / COLUMNAR_DIR_NAME)
+
+    def _select_pending(self, section_name: str, files: List[Path], photos_path: Path,
+                        force_reanalysis: bool, progress: Dict) -> List[Tuple[Path, datetime, str]]:
+        """
+        Vyberie fotografie sekcie, ktoré potrebujú analýzu
+
+        Preskočené a neplatne pomenované súbory sa započítajú do progress.
 
-    def analyze_and_store(self, photos_dir: str, force_reanalysis: bool = False):
+        Returns:
+            Trojice (cesta, čas z názvu súboru, kľúč heat mapy)
+        """
+        started = time.perf_counter()
+        hashes_before = self.file_index.hashes_computed
+        pending = []
+        for img_path in files:
+            if not force_reanalysis and not self._should_analyze_file(img_path, photos_path):
+                print(f"Preskakujem už analyzovaný súbor: {img_path.name}")
+                progress['files_skipped'] += 1
+                IMAGES_TOTAL.inc(result='skipped')
+                continue
+
+            img_datetime = self._parse_datetime_from_filename(img_path.name)
+            if not img_datetime:
+                progress['files_failed'] += 1
+                IMAGES_TOTAL.inc(result='failed')
+                continue
+
+            heat_map_key = self.heat_maps.key_for(section_name, img_path.stem)
+            pending.append((img_path, img_datetime, heat_map_key))
+
+        FINGERPRINT_HASHES_TOTAL.inc(self.file_index.hashes_computed - hashes_before)
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage='select')
+        return pending
+
+    @contextmanager
+    def analysis_lock(self):
+        """
+        Výlučný prístup k adresáru s dátami počas analýzy (aj medzi procesmi)
+
+        Čaká, kým analýzu v tom istom adresári dokončí iný proces (webový
+        worker, sledovanie adresára, príkazový riadok). Po získaní zámku sa
+        znova načíta index odtlačkov, ktorý mohol medzitým zmeniť iný proces.
+        """
+        lock = FileLock(self.data_dir / ANALYSIS_LOCK_NAME)
+        if not lock.acquire(blocking=False):
+            print("Čakám, kým iný proces dokončí analýzu v tomto adresári...")
+            lock.acquire()
+        try:
+            self.metadata = self._load_metadata()
+            self.file_index = FileFingerprintIndex(self.metadata.setdefault('analyzed_files', {}))
+            yield
+        finally:
+            lock.release()
+
+    def collect_garbage(self, dry_run: bool = False, min_dead_ratio: float = 0.25) -> Dict:
+        """
+        Zmenší cache výsledkov na limit a odstráni heat mapy, na ktoré nič neodkazuje
+
+        Beží pod zámkom analýzy, aby sa nezbierali heat mapy práve
+        zapisovanej dávky. Pozri result_cache.collect_garbage.
+        """
+        with self.analysis_lock():
+            evicted = 0 if dry_run else self.result_cache.evict()
+            result = collect_garbage(self.store, self.heat_maps, dry_run, min_dead_ratio)
+            self._maybe_checkpoint(force=True)
+        return dict(result, cache_entries_evicted=evicted)
+
+    def export_columnar(self, full: bool = False, parquet: Optional[bool] = None) -> Dict:
+        """
+        Zapíše stĺpcový export meraní do <data_dir>/columnar (pozri columnar_export)
+
+        Po vytvorení sa export obnovuje automaticky na konci každej analýzy.
+        """
+        with self.analysis_lock():
+            return export_columnar(self.store, self.data_dir / COLUMNAR_DIR_NAME, full, parquet)
+
+    def merge_shards(self, shard_dirs: List[str]) -> Dict:
+        """
+        Zlúči výsledky shardov (adresáre s dátami z analyze_and_store so shard) do tohto adresára
+
+        Po zlúčení sa prepočítajú agregáty, obnoví stĺpcový export a načíta
+        zlúčený index odtlačkov. Pozri sharding.merge_shard.
+        """
+        with self.analysis_lock():
+            totals = merge_shards(self.store, self.heat_maps, shard_dirs)
+            self._refresh_aggregates()
+            self._refresh_columnar_export()
+            self._maybe_checkpoint(force=True)
+            self.regions = load_region_config(self.data_dir / REGIONS_CONFIG_NAME)
+            self.metadata = self._load_metadata()
+            self.file_index = FileFingerprintIndex(self.metadata.setdefault('analyzed_files', {}))
+        return totals
+
+    def analyze_files(self, photos_dir: str, file_paths: List[Path],
+                      force_reanalysis: bool = False) -> Dict:
+        """
+        Inkrementálne analyzuje len zadané fotografie (napr. nové súbory zo sledovaného adresára)
+
+        Sekcia sa určí podľa prvého podadresára v photos_dir. Súbory mimo
+        sekcií, nie-JPEG súbory a nezmenené fotografie sa preskočia.
+
+        Returns:
+            Počty analyzovaných, preskočených a neúspešných súborov
+        """
+        with self.analysis_lock():
+            return self._analyze_files(Path(photos_dir), file_paths, force_reanalysis)
+
+    def _analyze_pending(self, executor: Optional[ProcessPoolExecutor], section_name: str, photos_path: Path,
+                         pending: List[Tuple[Path, datetime, str]], options: Dict, workers: int,
+                         batch_size: int, force_reanalysis: bool, progress: Dict,
+                         check_cancelled: Optional[Callable[[], None]] = None,
+                         batch_done: Optional[Callable[[int], None]] = None):
+        """
+        Analyzuje vybrané fotografie sekcie po dávkach a uloží ich výsledky
+
+        Počty analyzovaných a chybných súborov sa pripočítajú do progress.
+        check_cancelled sa volá pred každou dávkou, batch_done po jej uložení.
+        """
+        # Súbory sa čítajú dopredu vo vláknach, kým procesy analyzujú aktuálnu dávku
+        prefetched = self.prefetcher.iter_files(img_path for img_path, _, _ in pending)
+        try:
+            for start in range(0, len(pending), batch_size):
+                if check_cancelled is not None:
+                    check_cancelled()
+                batch = pending[start:start + batch_size]
+                started = time.perf_counter()
+                files = list(islice(prefetched, len(batch)))
+                # Pri vynútenej analýze sa cache nepoužije, jej záznamy sa len obnovia
+                results = self._analyze_batch(executor, batch, files, options, workers,
+                                              use_cache=not force_reanalysis)
+
+                analyzed = self._store_batch(section_name, photos_path, batch, results,
+                                             options['params_version'])
+                # Obsah uloženej dávky sa už nepočíta do limitu čítania dopredu
+                self.prefetcher.release(files)
+                del files, results
+                IMAGES_PER_SECOND.observe(len(batch) / max(time.perf_counter() - started, 1e-9))
+                progress['files_analyzed'] += analyzed
+                progress['files_failed'] += len(batch) - analyzed
+                if batch_done is not None:
+                    batch_done(len(batch))
+        finally:
+            prefetched.close()
+
+    def _analyze_files(self, photos_path: Path, file_paths: List[Path], force_reanalysis: bool) -> Dict:
+        progress = {'files_analyzed': 0, 'files_skipped': 0, 'files_failed': 0}
+
+        sections: Dict[str, List[Path]] = {}
+        for img_path in sorted({Path(p) for p in file_paths}):
+            try:
+                relative = img_path.relative_to(photos_path)
+            except ValueError:
+                continue
+            if len(relative.parts) < 2 or not fnmatch(img_path.name, '*.jp*g') or not img_path.is_file():
+                continue
+            sections.setdefault(relative.parts[0], []).append(img_path)
+
+        try:
+            for section_name, files in sections.items():
+                pending = self._select_pending(section_name, files, photos_path, force_reanalysis, progress)
+                if not pending:
+                    continue
+                options = self._analysis_options(section_name)
+                self._analyze_pending(None, section_name, photos_path, pending, options, 1,
+                                      DEFAULT_BATCH_SIZE, force_reanalysis, progress)
+            self._refresh_aggregates()
+            self._refresh_columnar_export()
+        finally:
+            # Odtlačky preskočených súborov (napr. nový mtime po touch) sa uložia aj pri chybe
+            self._save_metadata()
+            self.result_cache.evict()
+            self._maybe_checkpoint(force=True)
+        return progress
+
+    def analyze_and_store(self, photos_dir: str, force_reanalysis: bool = False, workers: int = 1,
+                          progress_callback: Optional[Callable[[Dict], None]] = None,
+                          cancel_event: Optional[threading.Event] = None,
+                          batch_size: int = DEFAULT_BATCH_SIZE,
+                          shard: Optional[ShardFilter] = None) -> Dict:
         """
         Analyzuje fotografie a ukladá výsledky
         
         Args:
             photos_dir: Cesta k adresáru s fotografiami
             force_reanalysis: Vynúti opätovnú analýzu všetkých súborov
+            workers: Počet procesov pre paralelnú analýzu (1 = sériový režim)
+            progress_callback: Volá sa po každej dávke so stavom priebehu
+            cancel_event: Nastavením udalosti sa analýza zastaví po aktuálnej dávke
+            batch_size: Počet fotografií v jednej dávke
+            shard: Analyzovať len fotografie tohto shardu (výsledky shardov spojí merge_shards)
+
+        Returns:
+            Počty analyzovaných, preskočených a neúspešných súborov
+
+        Raises:
+            AnalysisCancelled: Ak bola analýza zrušená cez cancel_event
         """
-        photos_path = Path(photos_dir)
-        files_analyzed = 0
-        files_skipped = 0
+        with self.analysis_lock():
+            return self._analyze_and_store(Path(photos_dir), force_reanalysis, workers,
+                                           progress_callback, cancel_event, batch_size, shard)
+
+    def _analyze_and_store(self, photos_path: Path, force_reanalysis: bool, workers: int,
+                           progress_callback: Optional[Callable[[Dict], None]],
+                           cancel_event: Optional[threading.Event], batch_size: int,
+                           shard: Optional[ShardFilter] = None) -> Dict:
+        # Dávka musí stačiť na vyťaženie všetkých procesov
+        batch_size = max(batch_size, workers * 4)
+
+        # Prevod starých záznamov s absolútnymi cestami na relatívne kľúče
+        migrated = self.file_index.migrate_absolute_keys(photos_path)
+        if migrated:
+            print(f"Prevedené záznamy metadát na relatívne cesty: {migrated}")
+
+        # Zoznam sekcií a ich fotografií (zoradené kvôli deterministickému výstupu)
+        sections = [(section_dir, sorted(section_dir.rglob('*.jp*g')))
+                    for section_dir in sorted(photos_path.iterdir()) if section_dir.is_dir()]
+        if shard is not None:
+            print(f"Analyzujem shard {shard}")
+            sections = [(section_dir, [f for f in files if shard.accepts(f, photos_path)])
+                        for section_dir, files in sections]
+            sections = [(section_dir, files) for section_dir, files in sections if files]
+        progress = {
+            'files_total': sum(len(files) for _, files in sections),
+            'files_done': 0,
+            'files_analyzed': 0,
+            'files_skipped': 0,
+            'files_failed': 0,
+            'section': None
+        }
+
+        def report():
+            if progress_callback is not None:
+                progress_callback(dict(progress))
+
+        def check_cancelled():
+            if cancel_event is not None and cancel_event.is_set():
+                raise AnalysisCancelled("Analýza bola zrušená")
+
+        def batch_done(batch_len: int):
+            progress['files_done'] += batch_len
+            report()
+
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            report()
+            # Prechádzanie všetkých sekcií strechy
+            for section_dir, files in sections:
+                check_cancelled()
+                section_name = section_dir.name
+                progress['section'] = section_name
+                print(f"\nAnalyzujem sekciu: {section_name}")
+
+                # Výber fotografií, ktoré potrebujú analýzu
+                pending = self._select_pending(section_name, files, photos_path, force_reanalysis, progress)
+                progress['files_done'] = (progress['files_analyzed'] + progress['files_skipped']
+                                          + progress['files_failed'])
+                report()
+
+                # Analýza fotografií po dávkach (sériovo alebo v procesnom poole)
+                self._analyze_pending(executor, section_name, photos_path, pending,
+                                      self._analysis_options(section_name), workers, batch_size,
+                                      force_reanalysis, progress, check_cancelled, batch_done)
+
+                # Odtlačky preskočených súborov (napr. nový mtime) sa uložia po každej sekcii
+                self._save_metadata()
+                # Prepočet denných a mesačných agregátov dní s novými meraniami
+                self._refresh_aggregates()
+            # Stĺpcový export sa obnoví len o dni zmenené v tomto behu
+            self._refresh_columnar_export()
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            # Uloženie metadát (aj pri prerušení)
+            self._save_metadata()
+            self.result_cache.evict()
+            self._maybe_checkpoint(force=True)
         
-        # Prechádzanie všetkých sekcií strechy
-        for section_dir in photos_path.iterdir():
-            if not section_dir.is_dir():
+        print(f"\nAnalýza dokončená:")
+        print(f"Analyzované súbory: {progress['files_analyzed']}")
+        print(f"Preskočené súbory: {progress['files_skipped']}")
+        return {
+            'files_analyzed': progress['files_analyzed'],
+            'files_skipped': progress['files_skipped'],
+            'files_failed': progress['files_failed']
+        }
+
+    def compare_resolution_drift(self, photos_dir: str, scales: Tuple[int, ...] = (2, 4, 8),
+                                 sample_size: int = 50) -> Dict:
+        """
+        Porovná metriky pri zmenšenom dekódovaní s plným rozlíšením
+
+        Z fotografií sa rovnomerne vyberie vzorka, každá sa analyzuje v plnom
+        rozlíšení a v každom zo zmenšení. Pre každú metriku sa vráti priemerná
+        a maximálna absolútna odchýlka a priemerný čas dekódovania a analýzy,
+        aby sa dalo zvoliť vhodné analysis_scale.
+
+        Returns:
+            {'sample_size': n, 'scales': {mierka: {'seconds_per_image', metrika: {'mean_abs', 'max_abs'}}}}
+        """
+        files = sorted(Path(photos_dir).rglob('*.jp*g'))
+        if len(files) > sample_size:
+            step = len(files) / sample_size
+            files = [files[int(i * step)] for i in range(sample_size)]
+
+        def measure(img_path: Path, scale: int):
+            started = time.perf_counter()
+            img = self._safe_read_image(img_path, scale)
+            if img is None:
+                return None, 0.0
+            analysis = self._analyze_single_image(img, decode_scale=scale)
+            return analysis, time.perf_counter() - started
+
+        all_scales = (1,) + tuple(scale for scale in scales if scale != 1)
+        durations = {scale: [] for scale in all_scales}
+        diffs = {scale: {metric: [] for metric in ANALYSIS_METRICS} for scale in all_scales[1:]}
+        measured = 0
+        for img_path in files:
+            reference, elapsed = measure(img_path, 1)
+            if reference is None:
                 continue
-                
-            section_name = section_dir.name
-            print(f"\nAnalyzujem sekciu: {section_name}")
-            
-            # Načítanie existujúcich dát sekcie
-            section_data = self._load_section_data(section_name)
-            
-            # Prechádzanie všetkých fotografií v sekcii
-            for img_path in section_dir.rglob('*.jp*g'):
-                if not force_reanalysis and not self._should_analyze_file(img_path):
-                    print(f"Preskakujem už analyzovaný súbor: {img_path.name}")
-                    files_skipped += 1
-                    continue
-                
-                img_datetime = self._parse_datetime_from_filename(img_path.name)
-                if not img_datetime:
+            measured += 1
+            durations[1].append(elapsed)
+            for scale in all_scales[1:]:
+                analysis, elapsed = measure(img_path, scale)
+                if analysis is None:
                     continue
-                
-                date_str = img_datetime.date().isoformat()
-                if date_str not in section_data['dates']:
-                    section_data['dates'][date_str] = []
-                
-                # Analýza fotografie
-                img = self._safe_read_image(img_path)
-                if img is None:
-                    continue
-                
-                print(f"Analyzujem novú fotografiu: {img_path.name}")
-                analysis = self._analyze_single_image(img)
-                
-                # Uloženie heat mapy
-                heat_map_filename = f"{section_name}_{img_path.stem}_heat_map.npy"
-                heat_map_path = self.heat_maps_dir / heat_map_filename
-                np.save(heat_map_path, analysis['heat_map'])
-                
-                # Pridanie výsledkov analýzy
-                analysis_result = {
-                    'datetime': img_datetime.isoformat(),
-                    'image_name': img_path.name,
-                    'average_brightness': analysis['average_brightness'],
-                    'brightness_variation': analysis['brightness_variation'],
-                    'shadow_percentage': analysis['shadow_percentage'],
-                    'heat_map_file': heat_map_filename
+                durations[scale].append(elapsed)
+                for metric in ANALYSIS_METRICS:
+                    diffs[scale][metric].append(abs(analysis[metric] - reference[metric]))
+
+        report = {'sample_size': measured, 'scales': {}}
+        for scale in all_scales:
+            times = durations[scale]
+            entry = {'seconds_per_image': float(np.mean(times)) if times else None}
+            for metric in ANALYSIS_METRICS:
+                values = diffs[scale][metric] if scale != 1 else [0.0] * len(times)
+                entry[metric] = {
+                    'mean_abs': float(np.mean(values)) if values else None,
+                    'max_abs': float(np.max(values)) if values else None
                 }
-                
-                # Aktualizácia alebo pridanie nového záznamu
-                existing_records = [i for i, r in enumerate(section_data['dates'][date_str]) 
-                                 if r['image_name'] == img_path.name]
-                if existing_records:
-                    section_data['dates'][date_str][existing_records[0]] = analysis_result
-                else:
-                    section_data['dates'][date_str].append(analysis_result)
-                
-                # Aktualizácia metadát
-                self.metadata['analyzed_files'][str(img_path)] = self._get_file_info(img_path)
-                files_analyzed += 1
-            
-            # Zoradenie meraní podľa času
-            for date_str in section_data['dates']:
-                section_data['dates'][date_str].sort(key=lambda x: x['datetime'])
-            
-            # Uloženie výsledkov sekcie
-            self._save_section_data(section_name, section_data)
-        
-        # Uloženie metadát
-        self._save_metadata()
-        
-        print(f"\nAnalýza dokončená:")
-        print(f"Analyzované súbory: {files_analyzed}")
-        print(f"Preskočené súbory: {files_skipped}")
+            report['scales'][scale] = entry
+        return report
 
     def get_analysis_summary(self) -> dict:
         """Získa prehľad všetkých analýz"""
-        summary = {}
-        
-        for analysis_file in self.analysis_dir.glob('*_analysis.json'):
-            with open(analysis_file, 'r', encoding='utf-8') as f:
-                section_data = json.load(f)
-                section_name = section_data['name']
-                
-                summary[section_name] = {
-                    'dates': list(section_data['dates'].keys()),
-                    'total_measurements': sum(len(measurements) 
-                                           for measurements in section_data['dates'].values())
-                }
-        
-        return summary
+        return self.store.summary()
 
-# Príklad použitia
 if __name__ == "__main__":
-    # Inicializácia servera
-    server = RoofAnalysisServer(r"D:\napady\fotky\AnalysisData")
-    
-    # Analýza fotografií s inkrementálnou aktualizáciou
-    server.analyze_and_store(r"D:\napady\fotky\Photos")
-    
-    # Výpis prehľadu
-    summary = server.get_analysis_summary()
-    print("\nPrehľad analýz:")
-    for section_name, data in summary.items():
-        print(f"\nSekcia: {section_name}")
-        print(f"Počet analyzovaných dní: {len(data['dates'])}")
-        print(f"Celkový počet meraní: {data['total_measurements']}")
-        print(f"Analyzované dátumy: {', '.join(sorted(data['dates']))}")
\ No newline at end of file
+    # Príkazový riadok (analyze, rename, summary, export, gc, merge) je v cli.py
+    import sys
+    from cli import main
+
+    sys.exit(main(["analyze"] + sys.argv[1:]))
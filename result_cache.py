@@ -0,0 +1,185 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from file_index import hash_file
+from heatmap_render import RENDER_CACHE_DIR_NAME, prune_render_cache
+from heatmap_store import HeatMapStore
+from prefetch import PrefetchedFile
+from results_store import ResultsStore
+
+# Verzia výpočtu metrík – zvýšiť pri každej zmene analýzy, ktorá mení výsledky
+# (staré záznamy cache sa potom prestanú používať a vytlačí ich LRU)
+ANALYSIS_VERSION = 2
+
+# Najväčšia veľkosť cache výsledkov (záznamy + heat mapy, na ktoré odkazujú)
+DEFAULT_CACHE_MAX_BYTES = int(os.environ.get("ROOF_RESULT_CACHE_BYTES", 512 * 1024 * 1024))
+
+# Pevná réžia jedného záznamu cache v databáze (kľúče, indexy)
+_ENTRY_OVERHEAD_BYTES = 256
+
+
+def analysis_params_version(options: Dict) -> str:
+    """
+    Verzia parametrov analýzy – výsledok z cache sa použije len pri zhode
+
+    Zahŕňa verziu výpočtu, kvantizáciu heat mapy, zmenšenie pri dekódovaní
+    a oblasti záujmu sekcie (RegionSet.key).
+    """
+    regions = options.get('regions')
+    token = json.dumps({
+        'analysis': ANALYSIS_VERSION,
+        'heat_map_dtype': options['heat_map_dtype'],
+        'decode_scale': options.get('decode_scale', 1),
+        'regions': regions.key if regions is not None else None
+    }, sort_keys=True)
+    return hashlib.blake2b(token.encode('utf-8'), digest_size=8).hexdigest()
+
+
+class ResultCache:
+    """
+    Cache výsledkov analýzy podľa obsahu fotografie
+
+    Záznam je kľúčovaný hashom obsahu súboru a verziou parametrov analýzy,
+    takže presunutá, premenovaná alebo do inej sekcie skopírovaná fotografia
+    sa znova nedekóduje – prevezmú sa jej metriky aj heat mapa (nový kľúč
+    heat mapy odkáže na tú istú snímku v kontajneri). Hash sa počíta len pre
+    súbory, ktorých veľkosť sa zhoduje s niektorým záznamom, takže nové
+    fotografie nestoja navyše ani jedno čítanie.
+
+    Záznamy sú v tabuľke result_cache úložiska výsledkov a zapisujú sa
+    v transakcii dávky (ResultsStore.write_batch). Veľkosť cache je
+    obmedzená; pri prekročení sa odstránia najdlhšie nepoužité záznamy.
+    """
+
+    def __init__(self, store: ResultsStore, heat_maps: HeatMapStore,
+                 max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        self.store = store
+        self.heat_maps = heat_maps
+        self.max_bytes = max_bytes
+
+    def lookup(self, img_path: Path, params_version: str,
+               prefetched: Optional[PrefetchedFile] = None) -> Optional[Dict]:
+        """
+        Výsledok analýzy z cache v tvare výsledku _analyze_image_task
+
+        Namiesto zakódovanej heat mapy obsahuje 'heat_map_ref' (deskriptor
+        uloženej snímky). Vráti None, ak výsledok v cache nie je. Ak je
+        obsah súboru už prečítaný (prefetched), hash sa počíta z neho a ostane
+        v ňom pre analýzu pri chýbajúcom výsledku.
+        """
+        if prefetched is not None:
+            size, mtime_ns = prefetched.size, prefetched.mtime_ns
+        else:
+            stat = os.stat(img_path)
+            size, mtime_ns = stat.st_size, stat.st_mtime_ns
+        if not self.store.has_cached_size(params_version, size):
+            return None
+
+        started = time.perf_counter()
+        content_hash = prefetched.fingerprint()['hash'] if prefetched is not None else hash_file(img_path)
+        fingerprint_seconds = time.perf_counter() - started
+        entry = self.store.get_cached_result(content_hash, params_version)
+        if entry is None:
+            return None
+        if not self.heat_maps.has_frame(entry['frame']):
+            # Kontajner s heat mapou bol medzitým zmazaný – záznam je neplatný
+            self.store.delete_cached_results([(content_hash, params_version)])
+            return None
+
+        result = entry['result']
+        return {
+            'average_brightness': result['average_brightness'],
+            'brightness_variation': result['brightness_variation'],
+            'shadow_percentage': result['shadow_percentage'],
+            'regions': result.get('regions', []),
+            'heat_map_ref': entry['frame'],
+            'file_info': {'hash': content_hash, 'size': size, 'mtime_ns': mtime_ns},
+            'timings': {'fingerprint': fingerprint_seconds,
+                        **({'read': prefetched.read_seconds} if prefetched is not None else {})},
+            'bytes_read': size
+        }
+
+    @staticmethod
+    def entry(analysis: Dict, params_version: str, frame: Dict) -> Dict:
+        """Záznam cache pre výsledok analýzy a deskriptor jeho uloženej heat mapy"""
+        result = {
+            'average_brightness': analysis['average_brightness'],
+            'brightness_variation': analysis['brightness_variation'],
+            'shadow_percentage': analysis['shadow_percentage'],
+            'regions': analysis.get('regions', [])
+        }
+        return {
+            'content_hash': analysis['file_info']['hash'],
+            'params_version': params_version,
+            'file_size': analysis['file_info']['size'],
+            'result': result,
+            'frame': frame,
+            'size_bytes': frame['length'] + len(json.dumps(result)) + _ENTRY_OVERHEAD_BYTES,
+            'last_used': time.time()
+        }
+
+    def evict(self) -> int:
+        """Odstráni najdlhšie nepoužité záznamy nad limit veľkosti"""
+        evicted = self.store.evict_cached_results(self.max_bytes)
+        if evicted:
+            print(f"Z cache výsledkov odstránených {evicted} najdlhšie nepoužitých záznamov")
+        return evicted
+
+
+def collect_garbage(store: ResultsStore, heat_maps: HeatMapStore, dry_run: bool = False,
+                    min_dead_ratio: float = 0.25) -> Dict:
+    """
+    Odstráni heat mapy, na ktoré neodkazuje žiadne meranie ani cache výsledkov
+
+    Záznamy indexu heat máp bez merania (a staré súbory .npy) sa zmažú,
+    kontajnery sa potom zhutnia (HeatMapStore.compact). Snímky, na ktoré
+    odkazuje cache, ostanú zachované, kým ich nevytlačí LRU. Volá sa pod
+    zámkom analýzy (RoofAnalysisServer.collect_garbage). Nakoniec sa z diskovej
+    cache vykreslených obrázkov odstránia obrázky snímok, ktoré už neexistujú.
+
+    Returns:
+        Počty odstránených heat máp, zmazaných a zhutnených kontajnerov,
+        odstránených vykreslených obrázkov a uvoľnené bajty
+    """
+    referenced = {HeatMapStore.normalize_key(key) for key in store.referenced_heat_maps()}
+    unreferenced = [key for key in heat_maps.keys() + heat_maps.legacy_keys() if key not in referenced]
+    if not dry_run:
+        heat_maps.delete_keys(unreferenced)
+
+    stats, relocations, obsolete = heat_maps.compact(store.cached_frames(), min_dead_ratio, dry_run)
+    if not dry_run:
+        # Cache sa prepne na nové kontajnery skôr, ako sa staré zmažú
+        store.relocate_cached_frames(relocations)
+        heat_maps.remove_containers(obsolete)
+
+    # Verzie snímok po zhutnení (pri dry_run ostávajú aj snímky, ktoré by sa zmazali)
+    versions = (heat_maps.frame_version(key) for key in heat_maps.keys() + heat_maps.legacy_keys())
+    live_versions = [version[0] for version in versions if version is not None]
+    renders = prune_render_cache(heat_maps.root / RENDER_CACHE_DIR_NAME, live_versions, dry_run)
+    return dict(stats, **renders, heat_maps_removed=len(unreferenced), dry_run=dry_run)
+
+
+if __name__ == "__main__":
+    from renemaPhotos import RoofAnalysisServer
+
+    parser = argparse.ArgumentParser(description="Údržba cache výsledkov analýzy a heat máp")
+    parser.add_argument("data_dir", help="Adresár s výsledkami analýzy")
+    parser.add_argument("--dry-run", action="store_true", help="Len vypísať, čo by sa odstránilo")
+    parser.add_argument("--min-dead-ratio", type=float, default=0.25,
+                        help="Podiel nepoužitých dát, od ktorého sa kontajner zhutní")
+    parser.add_argument("--max-cache-bytes", type=int, help="Zmenšiť cache výsledkov na túto veľkosť")
+    args = parser.parse_args()
+
+    server = RoofAnalysisServer(args.data_dir)
+    try:
+        if args.max_cache_bytes is not None:
+            server.result_cache.max_bytes = args.max_cache_bytes
+        result = server.collect_garbage(dry_run=args.dry_run, min_dead_ratio=args.min_dead_ratio)
+    finally:
+        server.close()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
@@ -0,0 +1,722 @@
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+RESULTS_DB_NAME = "results.sqlite3"
+
+MEASUREMENT_FIELDS = (
+    'datetime',
+    'image_name',
+    'average_brightness',
+    'brightness_variation',
+    'shadow_percentage',
+    'heat_map_file'
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS measurements (
+    id INTEGER PRIMARY KEY,
+    section TEXT NOT NULL,
+    date TEXT NOT NULL,
+    datetime TEXT NOT NULL,
+    image_name TEXT NOT NULL,
+    average_brightness REAL,
+    brightness_variation REAL,
+    shadow_percentage REAL,
+    heat_map_file TEXT,
+    UNIQUE (section, date, image_name)
+);
+CREATE INDEX IF NOT EXISTS idx_measurements_section_datetime ON measurements (section, datetime);
+CREATE INDEX IF NOT EXISTS idx_measurements_date ON measurements (date);
+CREATE INDEX IF NOT EXISTS idx_measurements_image_name ON measurements (image_name);
+
+CREATE TABLE IF NOT EXISTS region_measurements (
+    id INTEGER PRIMARY KEY,
+    section TEXT NOT NULL,
+    region TEXT NOT NULL,
+    date TEXT NOT NULL,
+    datetime TEXT NOT NULL,
+    image_name TEXT NOT NULL,
+    pixel_count INTEGER NOT NULL,
+    average_brightness REAL,
+    brightness_variation REAL,
+    shadow_percentage REAL,
+    UNIQUE (section, region, date, image_name)
+);
+CREATE INDEX IF NOT EXISTS idx_region_measurements_section_region_datetime
+    ON region_measurements (section, region, datetime);
+
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS aggregates (
+    section TEXT NOT NULL,
+    period TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    brightness_mean REAL,
+    brightness_min REAL,
+    brightness_max REAL,
+    brightness_p10 REAL,
+    brightness_p50 REAL,
+    brightness_p90 REAL,
+    shadow_mean REAL,
+    shadow_min REAL,
+    shadow_max REAL,
+    shadow_p10 REAL,
+    shadow_p50 REAL,
+    shadow_p90 REAL,
+    sun_hours REAL,
+    PRIMARY KEY (section, period, bucket)
+);
+
+-- version sa zvýši pri každom ďalšom zaradení dňa, takže prepočet odstráni
+-- z fronty len deň, ktorý sa odvtedy znova nezmenil
+CREATE TABLE IF NOT EXISTS aggregate_queue (
+    section TEXT NOT NULL,
+    date TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (section, date)
+);
+
+-- Dni so zmenenými meraniami od posledného stĺpcového exportu (columnar_export.py)
+CREATE TABLE IF NOT EXISTS export_queue (
+    section TEXT NOT NULL,
+    date TEXT NOT NULL,
+    PRIMARY KEY (section, date)
+);
+
+-- Cache výsledkov analýzy podľa obsahu súboru a verzie parametrov analýzy
+-- (frame je JSON s umiestnením heat mapy v kontajneri, result metriky a oblasti)
+CREATE TABLE IF NOT EXISTS result_cache (
+    content_hash TEXT NOT NULL,
+    params_version TEXT NOT NULL,
+    file_size INTEGER NOT NULL,
+    result TEXT NOT NULL,
+    frame TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (content_hash, params_version)
+);
+CREATE INDEX IF NOT EXISTS idx_result_cache_size ON result_cache (params_version, file_size);
+CREATE INDEX IF NOT EXISTS idx_result_cache_last_used ON result_cache (last_used);
+
+CREATE TABLE IF NOT EXISTS store_info (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_UPSERT_MEASUREMENT = """
+INSERT INTO measurements (section, date, datetime, image_name, average_brightness,
+                          brightness_variation, shadow_percentage, heat_map_file)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (section, date, image_name) DO UPDATE SET
+    datetime = excluded.datetime,
+    average_brightness = excluded.average_brightness,
+    brightness_variation = excluded.brightness_variation,
+    shadow_percentage = excluded.shadow_percentage,
+    heat_map_file = excluded.heat_map_file
+"""
+
+_UPSERT_REGION_MEASUREMENT = """
+INSERT INTO region_measurements (section, region, date, datetime, image_name, pixel_count,
+                                 average_brightness, brightness_variation, shadow_percentage)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (section, region, date, image_name) DO UPDATE SET
+    datetime = excluded.datetime,
+    pixel_count = excluded.pixel_count,
+    average_brightness = excluded.average_brightness,
+    brightness_variation = excluded.brightness_variation,
+    shadow_percentage = excluded.shadow_percentage
+"""
+
+# Obdobia agregátov a ich stĺpce (kľúč obdobia: hodina 'RRRR-MM-DDTHH', deň, mesiac 'RRRR-MM')
+AGGREGATE_PERIODS = ('hour', 'day', 'month')
+AGGREGATE_FIELDS = (
+    'count',
+    'brightness_mean', 'brightness_min', 'brightness_max',
+    'brightness_p10', 'brightness_p50', 'brightness_p90',
+    'shadow_mean', 'shadow_min', 'shadow_max',
+    'shadow_p10', 'shadow_p50', 'shadow_p90',
+    'sun_hours'
+)
+
+_UPSERT_CACHED_RESULT = """
+INSERT INTO result_cache (content_hash, params_version, file_size, result, frame, size_bytes, last_used)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (content_hash, params_version) DO UPDATE SET
+    file_size = excluded.file_size,
+    result = excluded.result,
+    frame = excluded.frame,
+    size_bytes = excluded.size_bytes,
+    last_used = excluded.last_used
+"""
+
+_UPSERT_FILE = """
+INSERT INTO files (path, hash, size, mtime_ns) VALUES (?, ?, ?, ?)
+ON CONFLICT (path) DO UPDATE SET
+    hash = excluded.hash, size = excluded.size, mtime_ns = excluded.mtime_ns
+"""
+
+
+class ResultsStore:
+    """
+    SQLite úložisko výsledkov analýzy
+
+    Nahrádza súbory <sekcia>_analysis.json a metadata.json. Merania sú
+    indexované podľa sekcie, dátumu a názvu fotografie, takže vkladanie
+    (upsert) aj dotazy na rozsah dátumov ostávajú rýchle aj pri miliónoch meraní.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # Pri viacerých workeroch sa čaká na zápis iného procesu namiesto chyby "database is locked"
+        self.conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self._upgrade_schema()
+        self.conn.commit()
+
+    def _upgrade_schema(self):
+        """Doplní stĺpce pridané do existujúcich tabuliek starších databáz"""
+        columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(aggregate_queue)")}
+        if 'version' not in columns:
+            self.conn.execute("ALTER TABLE aggregate_queue ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+    @classmethod
+    def for_data_dir(cls, data_dir) -> 'ResultsStore':
+        """Otvorí úložisko v adresári s dátami analýzy"""
+        return cls(Path(data_dir) / RESULTS_DB_NAME)
+
+    def close(self):
+        self.conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """Spojí viac zápisov do jednej transakcie"""
+        try:
+            yield self.conn
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def get_info(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM store_info WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else None
+
+    def get_revision(self) -> int:
+        """Číslo revízie meraní – zvyšuje sa pri každom zápise (na invalidáciu cache)"""
+        value = self.get_info('revision')
+        return int(value) if value is not None else 0
+
+    def _bump_revision(self, conn):
+        conn.execute(
+            "INSERT INTO store_info (key, value) VALUES ('revision', '1') "
+            "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+
+    def set_info(self, key: str, value: str):
+        with self.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO store_info (key, value) VALUES (?, ?)", (key, value))
+
+    def get_decode_scale(self, section_name: str) -> Optional[int]:
+        """Zmenšenie pri dekódovaní, s ktorým boli naposledy analyzované fotografie sekcie"""
+        value = self.get_info(f"decode_scale:{section_name}")
+        return int(value) if value is not None else None
+
+    def set_decode_scale(self, section_name: str, decode_scale: int):
+        """Zapamätá zmenšenie pri dekódovaní sekcie (rozmer heat máp voči fotografiám)"""
+        if self.get_decode_scale(section_name) != decode_scale:
+            self.set_info(f"decode_scale:{section_name}", str(decode_scale))
+
+    # --- Merania ---
+
+    @staticmethod
+    def _upsert_measurement_rows(conn, section_name: str, records: List[Dict]):
+        rows = [
+            (section_name, r['datetime'][:10], r['datetime'], r['image_name'],
+             r['average_brightness'], r['brightness_variation'],
+             r['shadow_percentage'], r.get('heat_map_file'))
+            for r in records
+        ]
+        conn.executemany(_UPSERT_MEASUREMENT, rows)
+        # Dni so zmenenými meraniami – ich agregáty sa prepočítajú v refresh_aggregates
+        # a ich riadky sa obnovia v stĺpcovom exporte
+        changed_days = sorted({(row[0], row[1]) for row in rows})
+        conn.executemany("INSERT INTO aggregate_queue (section, date) VALUES (?, ?) "
+                         "ON CONFLICT (section, date) DO UPDATE SET version = version + 1", changed_days)
+        conn.executemany("INSERT OR IGNORE INTO export_queue (section, date) VALUES (?, ?)", changed_days)
+
+    @staticmethod
+    def _upsert_region_rows(conn, section_name: str, records: List[Dict]):
+        rows = [
+            (section_name, r['region'], r['datetime'][:10], r['datetime'], r['image_name'],
+             r['pixel_count'], r['average_brightness'], r['brightness_variation'],
+             r['shadow_percentage'])
+            for r in records
+        ]
+        conn.executemany(_UPSERT_REGION_MEASUREMENT, rows)
+
+    def upsert_measurements(self, section_name: str, records: List[Dict]):
+        """Vloží alebo aktualizuje merania sekcie"""
+        with self.transaction() as conn:
+            self._upsert_measurement_rows(conn, section_name, records)
+            self._bump_revision(conn)
+
+    def upsert_region_measurements(self, section_name: str, records: List[Dict]):
+        """Vloží alebo aktualizuje štatistiky oblastí záujmu sekcie"""
+        with self.transaction() as conn:
+            self._upsert_region_rows(conn, section_name, records)
+            self._bump_revision(conn)
+
+    def write_batch(self, section_name: Optional[str], records: List[Dict], region_records: List[Dict] = (),
+                    file_entries: Optional[Dict[str, Dict]] = None, deleted_files: List[str] = (),
+                    cached_results: List[Dict] = ()):
+        """
+        Zapíše výsledky jednej dávky analýzy v jedinej transakcii
+
+        Merania a odtlačky analyzovaných súborov sa potvrdia naraz – po páde
+        procesu je v úložisku buď celá dávka, alebo nič, a ďalší beh pokračuje
+        presne od prvej neuloženej fotografie. V tej istej transakcii sa
+        zapíšu aj záznamy cache výsledkov (pozri result_cache.ResultCache.entry).
+        """
+        with self.transaction() as conn:
+            if records:
+                self._upsert_measurement_rows(conn, section_name, records)
+            if region_records:
+                self._upsert_region_rows(conn, section_name, region_records)
+            if deleted_files:
+                conn.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in deleted_files])
+            if file_entries:
+                conn.executemany(_UPSERT_FILE, [(path, e['hash'], e['size'], e.get('mtime_ns'))
+                                                for path, e in file_entries.items()])
+            if cached_results:
+                self._upsert_cached_rows(conn, cached_results)
+            if records or region_records:
+                self._bump_revision(conn)
+
+    # --- Cache výsledkov analýzy ---
+
+    @staticmethod
+    def _upsert_cached_rows(conn, entries: List[Dict]):
+        conn.executemany(_UPSERT_CACHED_RESULT, [
+            (e['content_hash'], e['params_version'], e['file_size'], json.dumps(e['result']),
+             json.dumps(e['frame']), e['size_bytes'], e['last_used'])
+            for e in entries
+        ])
+
+    def has_cached_size(self, params_version: str, file_size: int) -> bool:
+        """Či cache obsahuje výsledok súboru tejto veľkosti (hash sa inak nemusí počítať)"""
+        row = self.conn.execute(
+            "SELECT 1 FROM result_cache WHERE params_version = ? AND file_size = ? LIMIT 1",
+            (params_version, file_size)).fetchone()
+        return row is not None
+
+    def get_cached_result(self, content_hash: str, params_version: str) -> Optional[Dict]:
+        """Záznam cache pre obsah súboru a verziu parametrov (result a frame ako slovníky)"""
+        row = self.conn.execute(
+            "SELECT * FROM result_cache WHERE content_hash = ? AND params_version = ?",
+            (content_hash, params_version)).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        entry['result'] = json.loads(entry['result'])
+        entry['frame'] = json.loads(entry['frame'])
+        return entry
+
+    def iter_cached_results(self) -> Iterator[Dict]:
+        """Všetky záznamy cache (result a frame ako slovníky)"""
+        for row in self.conn.execute("SELECT * FROM result_cache ORDER BY content_hash, params_version"):
+            entry = dict(row)
+            entry['result'] = json.loads(entry['result'])
+            entry['frame'] = json.loads(entry['frame'])
+            yield entry
+
+    def delete_cached_results(self, keys: List[Tuple[str, str]]):
+        """Odstráni záznamy cache podľa dvojíc (hash obsahu, verzia parametrov)"""
+        with self.transaction() as conn:
+            conn.executemany("DELETE FROM result_cache WHERE content_hash = ? AND params_version = ?", keys)
+
+    def cache_usage(self) -> Tuple[int, int]:
+        """Počet záznamov cache a ich celková veľkosť v bajtoch"""
+        row = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM result_cache").fetchone()
+        return row[0], row[1]
+
+    def evict_cached_results(self, max_bytes: int) -> int:
+        """
+        Odstráni najdlhšie nepoužité záznamy cache, kým sa nezmestí do max_bytes
+
+        Returns:
+            Počet odstránených záznamov
+        """
+        _, total = self.cache_usage()
+        if total <= max_bytes:
+            return 0
+        evicted = []
+        cursor = self.conn.execute(
+            "SELECT content_hash, params_version, size_bytes FROM result_cache ORDER BY last_used")
+        for row in cursor:
+            if total <= max_bytes:
+                break
+            evicted.append((row['content_hash'], row['params_version']))
+            total -= row['size_bytes']
+        cursor.close()
+        self.delete_cached_results(evicted)
+        return len(evicted)
+
+    def cached_frames(self) -> List[Dict]:
+        """Umiestnenia heat máp, na ktoré odkazuje cache (pre zber nepoužitých heat máp)"""
+        return [json.loads(row['frame']) for row in self.conn.execute("SELECT frame FROM result_cache")]
+
+    def relocate_cached_frames(self, relocations: Dict[Tuple[str, int], Tuple[str, int]]):
+        """Prepíše umiestnenia heat máp v cache po zhutnení kontajnerov"""
+        if not relocations:
+            return
+        with self.transaction() as conn:
+            rows = conn.execute("SELECT content_hash, params_version, frame FROM result_cache").fetchall()
+            for row in rows:
+                frame = json.loads(row['frame'])
+                target = relocations.get((frame['container'], frame['offset']))
+                if target is None:
+                    continue
+                frame['container'], frame['offset'] = target
+                conn.execute("UPDATE result_cache SET frame = ? WHERE content_hash = ? AND params_version = ?",
+                             (json.dumps(frame), row['content_hash'], row['params_version']))
+
+    def referenced_heat_maps(self) -> List[str]:
+        """Kľúče heat máp, na ktoré odkazujú merania"""
+        rows = self.conn.execute("SELECT DISTINCT heat_map_file FROM measurements WHERE heat_map_file IS NOT NULL")
+        return [row['heat_map_file'] for row in rows]
+
+    # --- Údržba ---
+
+    def checkpoint(self, truncate: bool = False) -> Tuple[int, int, int]:
+        """
+        Prenesie zápisy z WAL žurnálu do hlavného súboru databázy
+
+        Args:
+            truncate: Po prenesení skráti WAL na nulu (čaká na dokončenie čítaní)
+
+        Returns:
+            Trojica (zablokované, stránky vo WAL, prenesené stránky) podľa SQLite
+        """
+        mode = 'TRUNCATE' if truncate else 'PASSIVE'
+        return tuple(self.conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone())
+
+    def compact(self):
+        """Zmenší súbor databázy (VACUUM je v SQLite atomický – pri páde ostane pôvodný stav)"""
+        self.checkpoint(truncate=True)
+        self.conn.execute("VACUUM")
+        self.checkpoint(truncate=True)
+
+    def snapshot(self, target_path) -> Path:
+        """
+        Zapíše konzistentnú a zhutnenú kópiu databázy atomicky (zápis do dočasného súboru a premenovanie)
+
+        Kópiu je možné vytvoriť aj počas behu analýzy; na cieľovej ceste
+        nikdy neostane nedopísaný súbor.
+        """
+        target_path = Path(target_path)
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target_path.with_name(f".{target_path.name}.{os.getpid()}.tmp")
+        if tmp_path.exists():
+            tmp_path.unlink()
+        try:
+            self.conn.execute("VACUUM INTO ?", (str(tmp_path),))
+            with open(tmp_path, 'rb') as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_path, target_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        return target_path
+
+    def iter_region_measurements(self, section_name: Optional[str] = None, region: Optional[str] = None,
+                                 start: Optional[str] = None, end: Optional[str] = None) -> Iterator[Dict]:
+        """Postupne vracia štatistiky oblastí zoradené podľa sekcie, oblasti a času"""
+        conditions, params = [], []
+        if section_name is not None:
+            conditions.append("section = ?")
+            params.append(section_name)
+        if region is not None:
+            conditions.append("region = ?")
+            params.append(region)
+        if start:
+            conditions.append("datetime >= ?")
+            params.append(start)
+        if end:
+            conditions.append("datetime <= ?" if 'T' in end else "date <= ?")
+            params.append(end)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        cursor = self.conn.execute(
+            "SELECT section, region, date, datetime, image_name, pixel_count, average_brightness, "
+            f"brightness_variation, shadow_percentage FROM region_measurements {where} "
+            "ORDER BY section, region, datetime", params)
+        for row in cursor:
+            yield dict(row)
+
+    def section_names(self) -> List[str]:
+        rows = self.conn.execute("SELECT DISTINCT section FROM measurements ORDER BY section")
+        return [row['section'] for row in rows]
+
+    def query_measurements(self, sections: Optional[List[str]] = None,
+                           start: Optional[str] = None, end: Optional[str] = None,
+                           time_from: Optional[str] = None, time_to: Optional[str] = None,
+                           after: Optional[Tuple[str, str, int]] = None,
+                           limit: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Postupne vracia merania zoradené podľa sekcie, času a id
+
+        Args:
+            sections: Obmedzenie na vybrané sekcie
+            start: Začiatok rozsahu (ISO dátum alebo dátum a čas, vrátane)
+            end: Koniec rozsahu (ISO dátum alebo dátum a čas, vrátane)
+            time_from: Začiatok denného okna 'HH:MM' (vrátane)
+            time_to: Koniec denného okna 'HH:MM' (vrátane)
+            after: Kurzor (sekcia, datetime, id) posledného už vráteného merania
+            limit: Maximálny počet meraní
+        """
+        conditions, params = [], []
+        if sections:
+            conditions.append(f"section IN ({', '.join('?' * len(sections))})")
+            params.extend(sections)
+        if start:
+            conditions.append("datetime >= ?")
+            params.append(start)
+        if end:
+            # Samotný dátum zahŕňa celý deň
+            conditions.append("datetime <= ?" if 'T' in end else "date <= ?")
+            params.append(end)
+        if time_from:
+            conditions.append("substr(datetime, 12, 5) >= ?")
+            params.append(time_from)
+        if time_to:
+            conditions.append("substr(datetime, 12, 5) <= ?")
+            params.append(time_to)
+        if after is not None:
+            conditions.append("(section, datetime, id) > (?, ?, ?)")
+            params.extend(after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        limit_clause = "LIMIT ?" if limit is not None else ""
+        if limit is not None:
+            params.append(limit)
+        cursor = self.conn.execute(
+            f"SELECT id, section, date, {', '.join(MEASUREMENT_FIELDS)} FROM measurements "
+            f"{where} ORDER BY section, datetime, id {limit_clause}", params)
+        for row in cursor:
+            yield dict(row)
+
+    def iter_measurements(self, section_name: Optional[str] = None,
+                          start: Optional[str] = None, end: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Postupne vracia merania zoradené podľa sekcie a času
+
+        Args:
+            section_name: Obmedzenie na jednu sekciu
+            start: Začiatok rozsahu (ISO dátum alebo dátum a čas, vrátane)
+            end: Koniec rozsahu (ISO dátum alebo dátum a čas, vrátane)
+        """
+        sections = [section_name] if section_name is not None else None
+        for row in self.query_measurements(sections, start, end):
+            del row['id']
+            yield row
+
+    def load_section(self, section_name: str) -> Dict:
+        """Vráti dáta sekcie v pôvodnom formáte {'name', 'dates': {dátum: [merania]}}"""
+        data = {'name': section_name, 'dates': {}}
+        for row in self.iter_measurements(section_name):
+            date_str = row.pop('date')
+            row.pop('section')
+            data['dates'].setdefault(date_str, []).append(row)
+        return data
+
+    def load_all_sections(self, **filters) -> Dict[str, Dict[str, List[Dict]]]:
+        """
+        Vráti merania všetkých sekcií vo formáte {sekcia: {dátum: [merania]}}
+
+        Args:
+            filters: Filtre ako v query_measurements (bez kurzora a limitu)
+        """
+        report = {}
+        for row in self.query_measurements(**filters):
+            del row['id']
+            section_name = row.pop('section')
+            date_str = row.pop('date')
+            report.setdefault(section_name, {}).setdefault(date_str, []).append(row)
+        return report
+
+    def save_section(self, section_name: str, data: Dict):
+        """Uloží merania sekcie v pôvodnom formáte (upsert všetkých záznamov)"""
+        records = [r for measurements in data['dates'].values() for r in measurements]
+        self.upsert_measurements(section_name, records)
+
+    def summary(self) -> Dict:
+        """Prehľad sekcií – analyzované dni a počet meraní"""
+        summary = {}
+        rows = self.conn.execute(
+            "SELECT section, date, COUNT(*) AS n FROM measurements "
+            "GROUP BY section, date ORDER BY section, date")
+        for row in rows:
+            section = summary.setdefault(row['section'], {'dates': [], 'total_measurements': 0})
+            section['dates'].append(row['date'])
+            section['total_measurements'] += row['n']
+        return summary
+
+    # --- Agregáty ---
+
+    def pending_aggregate_days(self) -> List[Tuple[str, str, int]]:
+        """Dni (sekcia, dátum, verzia zaradenia), ktorých agregáty treba prepočítať"""
+        rows = self.conn.execute("SELECT section, date, version FROM aggregate_queue ORDER BY section, date")
+        return [(row['section'], row['date'], row['version']) for row in rows]
+
+    def enqueue_all_aggregate_days(self):
+        """Zaradí na prepočet všetky dni s meraniami (napr. po zmene parametrov agregácie)"""
+        with self.transaction() as conn:
+            conn.execute("INSERT INTO aggregate_queue (section, date) "
+                         "SELECT DISTINCT section, date FROM measurements WHERE true "
+                         "ON CONFLICT (section, date) DO UPDATE SET version = version + 1")
+
+    def replace_aggregates(self, rows: List[Dict], done_days: List[Tuple[str, str, int]]):
+        """
+        Uloží prepočítané agregáty a odstráni spracované dni z fronty (jedna transakcia)
+
+        Deň, ktorý sa počas prepočtu znova zaradil (iná verzia), vo fronte
+        ostane a prepočíta sa pri ďalšom behu.
+
+        Args:
+            rows: Agregáty s kľúčmi section, period, bucket a AGGREGATE_FIELDS
+            done_days: Spracované dni (sekcia, dátum, verzia z pending_aggregate_days);
+                ich staré hodinové agregáty sa zmažú
+        """
+        columns = ('section', 'period', 'bucket') + AGGREGATE_FIELDS
+        with self.transaction() as conn:
+            for section_name, date_str, version in done_days:
+                conn.execute("DELETE FROM aggregates WHERE section = ? AND period = 'hour' "
+                             "AND bucket LIKE ?", (section_name, f"{date_str}T%"))
+                conn.execute("DELETE FROM aggregate_queue WHERE section = ? AND date = ? AND version = ?",
+                             (section_name, date_str, version))
+            conn.executemany(
+                f"INSERT OR REPLACE INTO aggregates ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))})",
+                [tuple(row.get(column) for column in columns) for row in rows])
+            self._bump_revision(conn)
+
+    def query_aggregates(self, period: str, sections: Optional[List[str]] = None,
+                         start: Optional[str] = None, end: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Vráti agregáty daného obdobia zoradené podľa sekcie a kľúča obdobia
+
+        Args:
+            period: 'hour', 'day' alebo 'month'
+            sections: Obmedzenie na vybrané sekcie
+            start: Začiatok rozsahu (dátum, vrátane; porovnáva sa s kľúčom obdobia)
+            end: Koniec rozsahu (dátum, vrátane)
+        """
+        if period not in AGGREGATE_PERIODS:
+            raise ValueError(f"Neznáme obdobie agregátov: {period}")
+        conditions, params = ["period = ?"], [period]
+        if sections:
+            conditions.append(f"section IN ({', '.join('?' * len(sections))})")
+            params.extend(sections)
+        if start:
+            conditions.append("bucket >= ?")
+            params.append(start[:7] if period == 'month' else start)
+        if end:
+            # Kľúč hodiny začína dátumom – '~' je za všetkými znakmi kľúča
+            conditions.append("bucket <= ?")
+            params.append(end[:7] if period == 'month' else f"{end}~")
+        cursor = self.conn.execute(
+            f"SELECT section, bucket, {', '.join(AGGREGATE_FIELDS)} FROM aggregates "
+            f"WHERE {' AND '.join(conditions)} ORDER BY section, bucket", params)
+        for row in cursor:
+            yield dict(row)
+
+    # --- Stĺpcový export ---
+
+    def pending_export_days(self) -> List[Tuple[str, str]]:
+        """Dni (sekcia, dátum), ktorých merania sa zmenili od posledného exportu"""
+        rows = self.conn.execute("SELECT section, date FROM export_queue ORDER BY section, date")
+        return [(row['section'], row['date']) for row in rows]
+
+    def clear_export_days(self, days: Optional[List[Tuple[str, str]]] = None):
+        """Odstráni exportované dni z fronty (None = celú frontu po úplnom exporte)"""
+        with self.transaction() as conn:
+            if days is None:
+                conn.execute("DELETE FROM export_queue")
+            else:
+                conn.executemany("DELETE FROM export_queue WHERE section = ? AND date = ?", days)
+
+    # --- Index odtlačkov súborov ---
+
+    def load_file_index(self) -> Dict[str, Dict]:
+        """Načíta odtlačky analyzovaných súborov"""
+        rows = self.conn.execute("SELECT path, hash, size, mtime_ns FROM files")
+        return {row['path']: {'hash': row['hash'], 'size': row['size'], 'mtime_ns': row['mtime_ns']}
+                for row in rows}
+
+    def save_file_entries(self, entries: Dict[str, Dict]):
+        """Uloží (upsert) odtlačky súborov"""
+        rows = [(path, e['hash'], e['size'], e.get('mtime_ns')) for path, e in entries.items()]
+        with self.transaction() as conn:
+            conn.executemany(_UPSERT_FILE, rows)
+
+    def delete_file_entries(self, paths: List[str]):
+        with self.transaction() as conn:
+            conn.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in paths])
+
+
+def migrate_json_results(data_dir, store: Optional[ResultsStore] = None) -> Dict:
+    """
+    Jednorazovo prevedie staré výsledky (analyses/*.json a metadata.json) do SQLite
+
+    Pôvodné súbory sa nemažú. Opakované spustenie je bezpečné – záznamy sa
+    vkladajú ako upsert a migrácia sa zaznamená v store_info.
+
+    Returns:
+        Počet prevedených sekcií, meraní a súborov
+    """
+    data_dir = Path(data_dir)
+    own_store = store is None
+    if own_store:
+        store = ResultsStore.for_data_dir(data_dir)
+
+    counts = {'sections': 0, 'measurements': 0, 'files': 0}
+    try:
+        for section_file in sorted((data_dir / "analyses").glob("*_analysis.json")):
+            with open(section_file, 'r', encoding='utf-8') as f:
+                section_data = json.load(f)
+            section_name = section_data.get('name', section_file.stem[:-len('_analysis')])
+            records = [r for measurements in section_data.get('dates', {}).values() for r in measurements]
+            store.upsert_measurements(section_name, records)
+            counts['sections'] += 1
+            counts['measurements'] += len(records)
+
+        metadata_file = data_dir / "metadata.json"
+        if metadata_file.exists():
+            with open(metadata_file, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            entries = {}
+            for path, info in metadata.get('analyzed_files', {}).items():
+                entry = dict(info)
+                if 'mtime_ns' not in entry and 'mtime' in entry:
+                    entry['mtime_ns'] = int(round(entry.pop('mtime') * 1e9))
+                entries[path] = entry
+            store.save_file_entries(entries)
+            counts['files'] = len(entries)
+
+        store.set_info('migrated_json', json.dumps(counts))
+    finally:
+        if own_store:
+            store.close()
+    return counts
@@ -3,10 +3,11 @@ from datetime import datetime
 from dataclasses import dataclass
 import cv2
 import numpy as np
-from PIL import Image
-from PIL.ExifTags import TAGS
-import matplotlib.pyplot as plt
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
+
+from aggregates import group_statistics
+from exif_reader import read_exif_datetimes
+from regions import RegionSet, region_statistics
 
 @dataclass
 class PhotoMetadata:
@@ -24,6 +25,7 @@ class PhotoAnalyzer:
         self.photo_directory = photo_directory
         self.photos: List[PhotoMetadata] = []
         self.roof_sections: Dict[str, RoofSection] = {}
+        self._region_set: Optional[RegionSet] = None
         
     def load_photos(self) -> None:
         """Načíta všetky fotografie z adresára a extrahuje ich metadata."""
@@ -37,12 +39,7 @@ class PhotoAnalyzer:
     def _extract_metadata(self, filepath: str) -> PhotoMetadata:
         """Extrahuje metadata z fotografie vrátane času vytvorenia."""
         try:
-            image = Image.open(filepath)
-            exif = {
-                TAGS[k]: v
-                for k, v in image._getexif().items()
-                if k in TAGS
-            }
+            exif = read_exif_datetimes(filepath) or {}
             
             # Extrakcia času vytvorenia fotografie
             if 'DateTime' in exif:
@@ -67,6 +64,28 @@ class PhotoAnalyzer:
     def define_roof_section(self, name: str, coordinates: List[Tuple[int, int]]) -> None:
         """Definuje sekciu strechy pomocou polygónu."""
         self.roof_sections[name] = RoofSection(name=name, coordinates=coordinates)
+        self._region_set = None
+
+    def _get_region_set(self) -> RegionSet:
+        """Sada polygónov všetkých sekcií – vrstvy štítkov sa rasterizujú raz pre každý rozmer obrázka."""
+        if self._region_set is None:
+            self._region_set = RegionSet(
+                names=list(self.roof_sections),
+                polygons=[section.coordinates for section in self.roof_sections.values()]
+            )
+        return self._region_set
+
+    def _analyze_all_sections(self, image: np.ndarray) -> Dict[str, Optional[float]]:
+        """
+        Vypočíta priemernú intenzitu osvetlenia všetkých sekcií naraz.
+
+        Každá sekcia sa vyhodnotí na celom svojom polygóne aj vtedy, keď sa
+        prekrýva s inou (RegionSet.label_layers). Sekcia mimo obrázka má None.
+        """
+        # V kanál HSV je maximum z kanálov B, G, R – netreba konvertovať celý obrázok
+        value = image.max(axis=2)
+        stats = region_statistics(self._get_region_set(), value)
+        return {s['region']: s['average_brightness'] for s in stats}
 
     def analyze_illumination(self, photo_path: str, section_name: str) -> float:
         """Analyzuje intenzitu osvetlenia pre danú sekciu strechy."""
@@ -78,47 +97,52 @@ class PhotoAnalyzer:
         if image is None:
             raise ValueError(f"Nepodarilo sa načítať fotografiu: {photo_path}")
             
-        # Vytvorenie masky pre sekciu strechy
-        mask = np.zeros(image.shape[:2], dtype=np.uint8)
-        points = np.array(self.roof_sections[section_name].coordinates, dtype=np.int32)
-        cv2.fillPoly(mask, [points], 255)
-        
-        # Výpočet priemernej intenzity osvetlenia v sekcii
-        masked_image = cv2.bitwise_and(image, image, mask=mask)
-        hsv = cv2.cvtColor(masked_image, cv2.COLOR_BGR2HSV)
-        average_brightness = np.mean(hsv[mask > 0][:, 2])
-        
-        return average_brightness
+        return self._analyze_all_sections(image)[section_name]
 
     def generate_illumination_report(self) -> Dict:
         """Generuje report o osvetlení pre všetky sekcie strechy."""
         report = {
-            'sections': {},
+            'sections': {section_name: [] for section_name in self.roof_sections},
             'timeline': {},
             'daily_patterns': {},
             'seasonal_patterns': {}
         }
         
-        for section_name in self.roof_sections:
-            section_data = []
-            for photo in self.photos:
-                photo_path = os.path.join(self.photo_directory, photo.filename)
-                try:
-                    illumination = self.analyze_illumination(photo_path, section_name)
-                    section_data.append({
-                        'datetime': photo.datetime,
-                        'illumination': illumination,
-                        'position': photo.position
-                    })
-                except Exception as e:
-                    print(f"Chyba pri analýze {photo_path}: {str(e)}")
-                    
-            report['sections'][section_name] = section_data
+        # Každá fotografia sa načíta iba raz a vyhodnotia sa v nej všetky sekcie
+        for photo in self.photos:
+            photo_path = os.path.join(self.photo_directory, photo.filename)
+            try:
+                image = cv2.imread(photo_path)
+                if image is None:
+                    raise ValueError(f"Nepodarilo sa načítať fotografiu: {photo_path}")
+                illuminations = self._analyze_all_sections(image)
+            except Exception as e:
+                print(f"Chyba pri analýze {photo_path}: {str(e)}")
+                continue
+
+            for section_name, illumination in illuminations.items():
+                if illumination is None:
+                    # Polygón sekcie nezasahuje do fotografie
+                    continue
+                report['sections'][section_name].append({
+                    'datetime': photo.datetime,
+                    'illumination': illumination,
+                    'position': photo.position
+                })
+        
+        # Denný profil (podľa hodiny dňa) a sezónny profil (podľa mesiaca) každej sekcie
+        for section_name, entries in report['sections'].items():
+            report['daily_patterns'][section_name] = group_statistics(
+                entries, key=lambda e: e['datetime'].strftime('%H'), value=lambda e: e['illumination'])
+            report['seasonal_patterns'][section_name] = group_statistics(
+                entries, key=lambda e: e['datetime'].strftime('%Y-%m'), value=lambda e: e['illumination'])
             
         return report
 
     def visualize_results(self, report: Dict) -> None:
         """Vizualizuje výsledky analýzy."""
+        import matplotlib.pyplot as plt
+
         plt.figure(figsize=(15, 10))
         
         for section_name, data in report['sections'].items():
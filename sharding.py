@@ -0,0 +1,187 @@
+import hashlib
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from file_index import hash_file
+from heatmap_store import HeatMapStore
+from regions import REGIONS_CONFIG_NAME
+from results_store import ResultsStore
+
+SHARD_KEYS = ('section', 'date', 'hash')
+
+# Algoritmus pre delenie podľa obsahu – pevný, aby sa hostitelia zhodli aj bez balíka xxhash
+SHARD_HASH_ALGORITHM = 'blake2b'
+
+# Počet heat máp kopírovaných pri zlúčení naraz
+MERGE_HEAT_MAP_BATCH = 256
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """
+    Rozloží zápis 'i/N' (číslovanie od 0)
+
+    Raises:
+        ValueError: Pri neplatnom zápise alebo i mimo 0..N-1
+    """
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ValueError(f"Neplatný shard '{value}', očakáva sa i/N")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Neplatný shard '{value}', musí platiť 0 <= i < N")
+    return index, count
+
+
+def shard_of(token: str, count: int) -> int:
+    """Deterministické číslo shardu pre reťazec (nezávislé od procesu aj platformy)"""
+    digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % count
+
+
+@dataclass(frozen=True)
+class ShardFilter:
+    """
+    Výber fotografií jedného shardu archívu
+
+    Delenie podľa sekcie alebo dňa (priečinok alebo dátum v názve fotografie)
+    nestojí žiadne čítanie navyše. Delenie podľa obsahu rozloží fotografie
+    najrovnomernejšie, ale každý hostiteľ musí prečítať celý archív.
+    """
+    index: int
+    count: int
+    by: str = 'section'
+
+    def __post_init__(self):
+        if self.by not in SHARD_KEYS:
+            raise ValueError(f"Nepodporované delenie: {self.by} (možnosti: {', '.join(SHARD_KEYS)})")
+
+    @classmethod
+    def parse(cls, value: str, by: str = 'section') -> 'ShardFilter':
+        index, count = parse_shard(value)
+        return cls(index, count, by)
+
+    def key(self, file_path: Path, photos_dir: Path) -> str:
+        """Kľúč, podľa ktorého sa fotografia priradí shardu"""
+        relative = Path(file_path).relative_to(photos_dir)
+        if self.by == 'section':
+            return relative.parts[0]
+        if self.by == 'date':
+            # Dátum z názvu fotografie (RRRR-MM-DD-HH-MM), inak z priečinka dňa
+            stem = relative.stem
+            date_str = stem[:10] if len(stem) >= 10 and stem[4] == '-' and stem[7] == '-' else None
+            return f"{relative.parts[0]}/{date_str or relative.parent.as_posix()}"
+        return hash_file(file_path, SHARD_HASH_ALGORITHM)
+
+    def accepts(self, file_path: Path, photos_dir: Path) -> bool:
+        return self.count == 1 or shard_of(self.key(file_path, photos_dir), self.count) == self.index
+
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count} podľa {self.by}"
+
+
+def _copy_heat_maps(source: HeatMapStore, target: HeatMapStore) -> Dict[Tuple[str, int], Dict]:
+    """
+    Skopíruje heat mapy shardu (bez dekomprimovania) do cieľových kontajnerov
+
+    Snímky, ktoré v cieli už sú s rovnakým obsahom, sa nekopírujú, takže
+    opakované zlúčenie nezväčšuje kontajnery. Kľúče zdieľajúce jednu snímku
+    (výsledky z cache) zdieľajú snímku aj v cieli.
+
+    Returns:
+        Nové umiestnenie snímky podľa (kontajner, offset) v shardu
+    """
+    copied: Dict[Tuple[str, int], Dict] = {}
+    rows = source.conn.execute("SELECT * FROM frames ORDER BY container, offset").fetchall()
+    for start in range(0, len(rows), MERGE_HEAT_MAP_BATCH):
+        new_frames, links, pending = [], [], set()
+        for row in rows[start:start + MERGE_HEAT_MAP_BATCH]:
+            location = (row['container'], row['offset'])
+            if location in copied or location in pending:
+                links.append((row['key'], row['section'], row['date'], location))
+                continue
+            encoded = source.read_encoded(row['key'])
+            existing = target.frame(row['key'])
+            if existing is not None and target.read_encoded(row['key']).data == encoded.data:
+                copied[location] = existing
+                continue
+            pending.add(location)
+            new_frames.append((row['key'], row['section'], row['date'], encoded, location))
+        frames = target.put_many([item[:4] for item in new_frames])
+        for key, _, _, _, location in new_frames:
+            copied[location] = frames[key]
+        target.link_many([(key, section_name, date_str, copied[location])
+                          for key, section_name, date_str, location in links])
+    for legacy_key in source.legacy_keys():
+        target_path = target.root / f"{legacy_key}.npy"
+        if not target_path.exists():
+            shutil.copy2(source.root / f"{legacy_key}.npy", target_path)
+    return copied
+
+
+def merge_shard(store: ResultsStore, heat_maps: HeatMapStore, shard_dir) -> Dict:
+    """
+    Zlúči výsledky jedného shardu do cieľového úložiska
+
+    Najprv sa skopírujú (a fsync-nú) heat mapy, potom sa merania,
+    štatistiky oblastí a záznamy cache každej sekcie zapíšu jednou
+    transakciou a nakoniec index odtlačkov. Zlúčenie je idempotentné –
+    po páde ho stačí zopakovať. Pri zhode (sekcia, deň, fotografia)
+    vyhrá shard zlúčený neskôr. Volá sa pod zámkom analýzy cieľa
+    (RoofAnalysisServer.merge_shards).
+
+    Returns:
+        Počty zlúčených meraní, štatistík oblastí, heat máp, odtlačkov a záznamov cache
+    """
+    shard_dir = Path(shard_dir)
+    if not (shard_dir / "results.sqlite3").exists():
+        raise FileNotFoundError(f"V {shard_dir} nie sú výsledky analýzy")
+    source = ResultsStore.for_data_dir(shard_dir)
+    source_heat_maps = HeatMapStore(shard_dir / "heat_maps")
+    try:
+        copied = _copy_heat_maps(source_heat_maps, heat_maps)
+
+        cached_results = []
+        for entry in source.iter_cached_results():
+            frame = copied.get((entry['frame']['container'], entry['frame']['offset']))
+            if frame is not None:
+                cached_results.append(dict(entry, frame=frame))
+
+        counts = {'measurements': 0, 'region_measurements': 0, 'heat_maps': len(copied),
+                  'files': 0, 'cached_results': len(cached_results)}
+        for section_name in source.section_names():
+            records = list(source.iter_measurements(section_name))
+            region_records = list(source.iter_region_measurements(section_name))
+            store.write_batch(section_name, records, region_records)
+            decode_scale = source.get_decode_scale(section_name)
+            if decode_scale is not None:
+                store.set_decode_scale(section_name, decode_scale)
+            counts['measurements'] += len(records)
+            counts['region_measurements'] += len(region_records)
+
+        file_entries = source.load_file_index()
+        store.write_batch(None, [], file_entries=file_entries, cached_results=cached_results)
+        counts['files'] = len(file_entries)
+
+        regions_path = shard_dir / REGIONS_CONFIG_NAME
+        target_regions = store.db_path.parent / REGIONS_CONFIG_NAME
+        if regions_path.exists() and not target_regions.exists():
+            shutil.copy2(regions_path, target_regions)
+        return counts
+    finally:
+        source_heat_maps.close()
+        source.close()
+
+
+def merge_shards(store: ResultsStore, heat_maps: HeatMapStore, shard_dirs: List,
+                 log: Optional[Callable[[str], None]] = None) -> Dict:
+    """Zlúči výsledky viacerých shardov (v zadanom poradí) a vráti súčty"""
+    log = log or print
+    totals: Dict[str, int] = {}
+    for shard_dir in shard_dirs:
+        counts = merge_shard(store, heat_maps, shard_dir)
+        log(f"Zlúčený shard {shard_dir}: {counts['measurements']} meraní, {counts['files']} súborov")
+        for name, value in counts.items():
+            totals[name] = totals.get(name, 0) + value
+    return totals
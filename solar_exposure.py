@@ -0,0 +1,263 @@
+import argparse
+import json
+import os
+from datetime import datetime
+from itertools import groupby
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from aggregates import DEFAULT_MAX_GAP_MINUTES, interval_hours, summarize_values
+from batch_kernel import shadow_mask
+from heatmap_store import HeatMapStore
+from registration import RegistrationCache, to_pixel_homography
+from renemaPhotos import RoofAnalysisServer
+from results_store import ResultsStore
+
+EXPOSURE_DIR_NAME = "solar_exposure"
+
+RASTER_PERCENTILES = (10, 50, 90)
+
+
+class ExposureReducer:
+    """
+    Postupne sčíta hodiny priameho slnka pre každý pixel
+
+    Snímky sa pridávajú v časovom poradí po jednej, v pamäti sú len tri
+    rastre (celkové slnečné hodiny, hodiny pozorovania a slnečné hodiny
+    aktuálneho dňa). Za každý deň sa uloží len súhrn, nie celý raster.
+    """
+
+    def __init__(self, shape: Tuple[int, int]):
+        self.shape = tuple(shape)
+        self.sun_hours = np.zeros(self.shape, dtype=np.float32)
+        self.observed_hours = np.zeros(self.shape, dtype=np.float32)
+        self.frames = 0
+        self.daily: List[Dict] = []
+        self._day: Optional[str] = None
+        self._day_sun = np.zeros(self.shape, dtype=np.float32)
+        self._day_frames = 0
+
+    def add(self, date_str: str, hours: float, sunlit: np.ndarray, valid: Optional[np.ndarray] = None):
+        """
+        Pridá jednu snímku
+
+        Args:
+            date_str: Deň snímky (ISO dátum)
+            hours: Interval, ktorý snímka reprezentuje (hodiny)
+            sunlit: Boolovská maska priameho slnka rozmeru shape
+            valid: Maska pixelov, ktoré snímka pokrýva (None = všetky)
+        """
+        if date_str != self._day:
+            self.finish_day()
+            self._day = date_str
+        sunlit = sunlit if valid is None else sunlit & valid
+        self._day_sun[sunlit] += hours
+        if valid is None:
+            self.observed_hours += hours
+        else:
+            self.observed_hours[valid] += hours
+        self.frames += 1
+        self._day_frames += 1
+
+    def finish_day(self):
+        """Uzavrie aktuálny deň – pripočíta ho k celku a uloží jeho súhrn"""
+        if self._day is None:
+            return
+        self.sun_hours += self._day_sun
+        self.daily.append({'date': self._day, 'frames': self._day_frames,
+                           **raster_statistics(self._day_sun)})
+        self._day_sun[:] = 0
+        self._day = None
+        self._day_frames = 0
+
+
+def raster_statistics(raster: np.ndarray, mask: Optional[np.ndarray] = None) -> Dict[str, Optional[float]]:
+    """Priemer, minimum, maximum a percentily hodnôt rastra (voliteľne len v maske)"""
+    values = raster[mask] if mask is not None else raster.ravel()
+    if values.size == 0:
+        return summarize_values([])
+    percentiles = np.percentile(values, RASTER_PERCENTILES)
+    return {
+        'mean': float(values.mean()),
+        'min': float(values.min()),
+        'max': float(values.max()),
+        **{f'p{p}': float(value) for p, value in zip(RASTER_PERCENTILES, percentiles)}
+    }
+
+
+def _photo_paths(store: ResultsStore, photos_dir: Path, section_name: str) -> Dict[str, Path]:
+    """Cesty k fotografiám sekcie podľa názvu súboru (z indexu odtlačkov)"""
+    paths = {}
+    for relative_path in store.load_file_index():
+        parts = relative_path.split('/')
+        if len(parts) >= 2 and parts[0] == section_name:
+            paths[parts[-1]] = photos_dir / relative_path
+    return paths
+
+
+def _load_gray(img_path: Path, scale: int) -> Optional[np.ndarray]:
+    image = RoofAnalysisServer._safe_read_image(img_path, scale)
+    if image is not None and image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    return image
+
+
+def compute_section_exposure(data_dir, photos_dir, section_name: str, scale: int = 1,
+                             align: bool = True, max_gap_minutes: float = DEFAULT_MAX_GAP_MINUTES,
+                             start: Optional[str] = None, end: Optional[str] = None) -> Dict:
+    """
+    Mapa hodín priameho slnka pre jednu sekciu (stranu strechy)
+
+    Fotografie sa prechádzajú v časovom poradí po jednej. Každá snímka
+    reprezentuje interval do nasledujúcej snímky (najviac max_gap_minutes,
+    rovnako ako slnečné hodiny v agregátoch); pixely mimo tieňovej masky
+    (adaptívne prahovanie ako pri analýze) dostanú celý interval. Pri
+    align=True sa masky zarovnajú na referenčnú snímku sekcie cez
+    RegistrationCache, takže posun kamery nerozmaže výsledok.
+
+    Výsledok sa uloží do <data_dir>/solar_exposure/<sekcia>.npz (rastre
+    sun_hours a observed_hours, float32) a <sekcia>.json (súhrn).
+
+    Args:
+        data_dir: Adresár s výsledkami analýzy
+        photos_dir: Adresár s fotografiami (podadresáre sekcií)
+        section_name: Názov sekcie
+        scale: Zmenšenie pri dekódovaní fotografií (1, 2, 4 alebo 8)
+        align: Zarovnať snímky na referenčnú snímku sekcie
+        max_gap_minutes: Najdlhší započítaný interval medzi snímkami
+        start: Prvý započítaný deň (ISO dátum, vrátane)
+        end: Posledný započítaný deň (ISO dátum, vrátane)
+
+    Returns:
+        Súhrn výsledku (rovnaký ako uložený JSON)
+    """
+    data_dir = Path(data_dir)
+    photos_dir = Path(photos_dir)
+    store = ResultsStore.for_data_dir(data_dir)
+    heat_maps = HeatMapStore(data_dir / "heat_maps")
+    registration = RegistrationCache(data_dir, store=store, heat_maps=heat_maps) if align else None
+    try:
+        photo_paths = _photo_paths(store, photos_dir, section_name)
+        file_hashes = registration._file_hashes(section_name) if registration else None
+        reference_shape = None
+        if registration is not None:
+            try:
+                reference_shape = registration._reference(section_name)[2].shape
+            except KeyError:
+                print(f"Varovanie: Sekcia {section_name} nemá heat mapy, snímky sa nezarovnajú")
+                registration = None
+
+        reducer = None
+        missing = 0
+        rows = store.query_measurements([section_name], start, end)
+        for date_str, day_rows in groupby(rows, key=lambda r: r['date']):
+            day_rows = list(day_rows)
+            durations = interval_hours([datetime.fromisoformat(r['datetime']) for r in day_rows],
+                                       max_gap_minutes)
+            for row, hours in zip(day_rows, durations):
+                img_path = photo_paths.get(row['image_name'], photos_dir / section_name / date_str / row['image_name'])
+                gray = _load_gray(img_path, scale) if img_path.exists() else None
+                if gray is None:
+                    missing += 1
+                    continue
+                sunlit = ~shadow_mask(gray)
+
+                if reducer is None:
+                    reducer = ExposureReducer(reference_shape or gray.shape)
+                valid = None
+                if registration is not None and row['heat_map_file']:
+                    normalized, _ = registration.homography(section_name, row, file_hashes)
+                    homography = to_pixel_homography(normalized, gray.shape, reducer.shape)
+                    size = (reducer.shape[1], reducer.shape[0])
+                    sunlit = cv2.warpPerspective(sunlit.astype(np.uint8), homography, size,
+                                                 flags=cv2.INTER_NEAREST).astype(bool)
+                    valid = cv2.warpPerspective(np.ones(gray.shape, dtype=np.uint8), homography, size,
+                                                flags=cv2.INTER_NEAREST).astype(bool)
+                elif gray.shape != reducer.shape:
+                    sunlit = cv2.resize(sunlit.astype(np.uint8), (reducer.shape[1], reducer.shape[0]),
+                                        interpolation=cv2.INTER_NEAREST).astype(bool)
+                reducer.add(date_str, hours, sunlit, valid)
+
+        if reducer is None:
+            raise KeyError(f"Sekcia {section_name} nemá žiadne dostupné fotografie")
+        reducer.finish_day()
+        if missing:
+            print(f"Varovanie: {missing} fotografií sekcie {section_name} sa nenašlo alebo nedalo načítať")
+
+        observed = reducer.observed_hours > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sun_fraction = np.where(observed, reducer.sun_hours / reducer.observed_hours, 0.0)
+        summary = {
+            'section': section_name,
+            'start': reducer.daily[0]['date'],
+            'end': reducer.daily[-1]['date'],
+            'days': len(reducer.daily),
+            'frames': reducer.frames,
+            'missing_frames': missing,
+            'shape': list(reducer.shape),
+            'aligned': registration is not None,
+            'scale': scale,
+            'max_gap_minutes': max_gap_minutes,
+            'sun_hours': raster_statistics(reducer.sun_hours, observed),
+            'sun_fraction': raster_statistics(sun_fraction, observed),
+            'daily': reducer.daily
+        }
+        _save_exposure(data_dir / EXPOSURE_DIR_NAME, section_name, reducer, summary)
+        return summary
+    finally:
+        if registration is not None:
+            registration.close()
+        heat_maps.close()
+        store.close()
+
+
+def _save_exposure(output_dir: Path, section_name: str, reducer: ExposureReducer, summary: Dict):
+    """Zapíše raster a súhrn atomicky (dočasný súbor a premenovanie)"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    raster_path = output_dir / f"{section_name}.npz"
+    tmp_path = output_dir / f".{section_name}.npz.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(f, sun_hours=reducer.sun_hours, observed_hours=reducer.observed_hours)
+    os.replace(tmp_path, raster_path)
+
+    summary_path = output_dir / f"{section_name}.json"
+    tmp_path = output_dir / f".{section_name}.json.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, summary_path)
+
+
+def load_exposure(data_dir, section_name: str) -> Tuple[Dict[str, np.ndarray], Dict]:
+    """Načíta uložené rastre (sun_hours, observed_hours) a súhrn sekcie"""
+    output_dir = Path(data_dir) / EXPOSURE_DIR_NAME
+    with np.load(output_dir / f"{section_name}.npz") as rasters:
+        arrays = {name: rasters[name] for name in rasters.files}
+    with open(output_dir / f"{section_name}.json", 'r', encoding='utf-8') as f:
+        return arrays, json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mapa hodín priameho slnka pre strany strechy")
+    parser.add_argument("photos_dir", help="Adresár s fotografiami (podadresáre sekcií)")
+    parser.add_argument("data_dir", help="Adresár s výsledkami analýzy")
+    parser.add_argument("--section", action="append", help="Sekcia (predvolene všetky)")
+    parser.add_argument("--scale", type=int, default=1, choices=(1, 2, 4, 8))
+    parser.add_argument("--no-align", action="store_true", help="Nezarovnávať snímky na referenčnú snímku")
+    parser.add_argument("--start", help="Prvý deň (ISO dátum)")
+    parser.add_argument("--end", help="Posledný deň (ISO dátum)")
+    args = parser.parse_args()
+
+    if args.section:
+        section_names = args.section
+    else:
+        results_store = ResultsStore.for_data_dir(args.data_dir)
+        section_names = results_store.section_names()
+        results_store.close()
+    for name in section_names:
+        result = compute_section_exposure(args.data_dir, args.photos_dir, name, args.scale,
+                                          align=not args.no_align, start=args.start, end=args.end)
+        print(f"{name}: {result['frames']} snímok, {result['days']} dní, "
+              f"priemerne {result['sun_hours']['mean']:.2f} h slnka na pixel")
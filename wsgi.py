@@ -0,0 +1,14 @@
+"""
+WSGI vstupný bod pre produkčný beh s viacerými procesmi
+
+    ROOF_DATA_DIR=/srv/strecha/data gunicorn -w 4 -b 0.0.0.0:5000 wsgi:app
+
+Každý worker má vlastnú inštanciu aplikácie. Úlohy analýzy a logy sú
+zdieľané cez SQLite v ROOF_STATE_DIR (predvolene <ROOF_DATA_DIR>/state),
+zápis výsledkov do jedného adresára s dátami chráni súborový zámok, takže
+súbežné požiadavky z rôznych workerov ani hostiteľov so spoločným diskom
+nepoškodia úložisko. Konfigurácia pozri BE_app.default_config.
+"""
+from BE_app import create_app
+
+app = create_app()